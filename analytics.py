@@ -0,0 +1,156 @@
+# analytics.py
+"""
+Circulation reports for the dashboard and the JSON API.
+
+A report answers, for a window of recent days: the most borrowed books,
+demand per author, how much of the time books spent on loan, how long
+loans lasted, and how many loans ran late, month by month. Reports are
+computed with the vectorized aggregations of catalog_snapshot over a
+snapshot of the books and borrowed tables.
+
+Both the snapshot and the reports are cached per process. Before a
+cached value is used, the change counters of books and borrowed
+(database.table_versions, one small query) are compared with those it
+was computed from: any change made since, by this process or another,
+invalidates it. Reports also expire after ANALYTICS_CACHE_TTL seconds,
+since windows and overdue figures move with the clock even when the
+tables do not; they are then recomputed from the same snapshot, which is
+only reloaded after a change. Reloading reads both tables again, and its
+cost is paid by the first request after the change.
+
+Reports only read the live borrowed table, so windows are limited to
+ANALYTICS_MAX_WINDOW_DAYS, the archive horizon: every loan started
+within it is still live, as archive.py only moves loans returned before
+the horizon.
+
+Reports need NumPy; without it, available() is False and the dashboard
+shows none.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import catalog_snapshot
+import config
+import database
+
+def available():
+    """Return True if reports can be computed (NumPy is installed)."""
+    return catalog_snapshot.available()
+
+def _utc(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def build_report(snapshot, window_days=config.ANALYTICS_WINDOW_DAYS, top=config.ANALYTICS_TOP_N, now=None):
+    """
+    Compute every report over a snapshot.
+
+    Args:
+        snapshot (catalog_snapshot.CatalogSnapshot): Snapshot to aggregate
+        window_days (int): Only loans started in the last window_days count
+        top (int): Length of the book and author rankings
+        now (int): Time the window ends (epoch seconds); defaults to when
+                   the snapshot was taken. A snapshot of unchanged tables
+                   stays exact at any later time.
+
+    Returns:
+        dict: JSON-serializable reports
+    """
+    now = snapshot.taken_at if now is None else now
+    since = now - window_days * catalog_snapshot.SECONDS_PER_DAY
+    usage = catalog_snapshot.utilization(snapshot, top, since, now)
+    return {
+        'generated_at': _utc(now),
+        'window_days': window_days,
+        'since': _utc(since),
+        'loans': int((snapshot.loan_borrowed >= since).sum()),
+        'top_books': [{'title': title, 'author': author, 'loans': loans}
+                      for title, author, loans in catalog_snapshot.top_books(snapshot, top, since)],
+        'author_demand': [{'author': author, 'loans': loans, 'books': books}
+                          for author, loans, books in catalog_snapshot.author_demand(snapshot, top, since)
+                          if loans],
+        'utilization': {
+            'mean': usage['utilization'],
+            'idle_books': usage['idle_books'],
+            'busiest': [{'title': title, 'author': author, 'utilization': fraction}
+                        for title, author, fraction in usage['busiest']],
+        },
+        'loan_duration': catalog_snapshot.loan_duration_stats(snapshot, since=since),
+        'overdue_by_month': [{'month': month, 'loans': loans, 'overdue': overdue, 'rate': rate}
+                             for month, loans, overdue, rate
+                             in catalog_snapshot.overdue_by_month(snapshot, since=since, now=now)],
+    }
+
+# Reports kept per cache, one per (window, top) combination asked for
+MAX_CACHED_REPORTS = 64
+
+class ReportCache:
+    """Reports for one database, cached until its tables change or they expire."""
+
+    def __init__(self, ttl=config.ANALYTICS_CACHE_TTL, clock=time.time):
+        self.ttl = ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._reports = {}  # (window_days, top) -> (versions, expires at, report)
+
+    def _current_snapshot(self, conn, versions):
+        # Called with the lock held
+        snapshot = self._snapshot
+        if snapshot is None or versions is None or snapshot.versions != versions:
+            snapshot = self._snapshot = catalog_snapshot.load_snapshot(conn)
+            self._reports.clear()
+        return snapshot
+
+    def report(self, conn, window_days=config.ANALYTICS_WINDOW_DAYS, top=config.ANALYTICS_TOP_N):
+        """
+        Return the reports for a window, computing them only if the cached ones are stale.
+
+        Args:
+            conn (sqlite3.Connection): Open connection with no transaction in progress
+            window_days (int): Only loans started in the last window_days count
+            top (int): Length of the book and author rankings
+
+        Raises:
+            RuntimeError: If NumPy is not installed
+
+        Returns:
+            dict: As returned by build_report
+        """
+        versions = database.table_versions(conn, database.VERSIONED_TABLES)
+        key = (window_days, top)
+        now = self.clock()
+        with self._lock:
+            cached = self._reports.get(key)
+            if cached is not None and versions is not None and cached[0] == versions and now < cached[1]:
+                return cached[2]
+            snapshot = self._current_snapshot(conn, versions)
+            report = build_report(snapshot, window_days, top, max(int(now), snapshot.taken_at))
+            if len(self._reports) >= MAX_CACHED_REPORTS:
+                self._reports.clear()
+            self._reports[key] = (snapshot.versions, now + self.ttl, report)
+            return report
+
+    def clear(self):
+        """Drop the cached snapshot and reports."""
+        with self._lock:
+            self._snapshot = None
+            self._reports.clear()
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_report_cache(path=config.DATABASE_NAME):
+    """Return this process's report cache for a database file."""
+    with _caches_lock:
+        entry = _caches.get(path)
+        if entry is None or entry[0] != os.getpid():
+            entry = _caches[path] = (os.getpid(), ReportCache())
+        return entry[1]
+
+def app_report_cache():
+    """Return the report cache of the current Flask app's database."""
+    from flask import current_app
+    return get_report_cache(current_app.config['DATABASE'])
@@ -0,0 +1,266 @@
+# api.py
+"""
+Versioned JSON API over the catalog and circulation tables.
+
+    GET /api/v1/books   ?after=<id>&limit=<n>&available=1&fields=id,title
+    GET /api/v1/loans   ?after=<id>&limit=<n>&active=1&fields=id,book_title
+    GET /api/v1/stats   ?fields=total_books,overdue_loans
+    GET /api/v1/reports ?window=<days>&top=<n>
+    GET /api/v1/daily   ?since=YYYY-MM-DD&until=YYYY-MM-DD&title=<book title>
+    POST /api/v1/loans:batch   {"operations": [{"op": "borrow", ...}, ...]}
+    POST /api/v1/tokens        {"username": "...", "password": "..."}
+
+Lists are paginated by id: pass the returned "next" value as after to get
+the following page. Only the requested fields are selected from the
+database. Responses carry an ETag built from the change counters of the
+tables they read, so unchanged data is answered with 304 Not Modified
+before any query runs, and large bodies are gzip-compressed when the
+client accepts it.
+
+Requests are authorized by a logged-in session or by "Authorization:
+Bearer <token>" carrying a session token from /api/v1/tokens or, when
+SMARTLIB_API_TOKEN is set, that token. Session tokens are checked against
+their signature, not the users table.
+"""
+
+import gzip
+import hashlib
+import math
+import time
+from datetime import date
+from functools import wraps
+
+from flask import Blueprint, current_app, jsonify, request, session
+
+import analytics
+import auth
+import config
+import circulation
+import database
+import rollups
+from database import get_db
+from login_throttle import get_login_throttle
+from write_queue import db_write
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+class APIError(Exception):
+    """An error answered with a JSON body and the given status code."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+def handle_api_error(error):
+    return jsonify({'error': error.message}), error.status
+
+def _bearer_authorized():
+    """Return True for the configured API token or a valid session token."""
+    return auth.bearer_authorized(request.headers.get('Authorization', ''),
+                                  current_app.config.get('API_TOKEN'), current_app.config['SECRET_KEY'])
+
+def is_authorized():
+    """Return True for a logged-in session, the configured API token or a valid session token."""
+    return 'user_id' in session or _bearer_authorized()
+
+def api_auth_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not is_authorized():
+            raise APIError(401, 'Authentication required')
+        return f(*args, **kwargs)
+    return decorated_function
+
+def _fields(allowed):
+    """Return the requested fields, in request order, or all allowed fields."""
+    value = request.args.get('fields')
+    if not value:
+        return tuple(allowed)
+    fields = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in allowed]
+    if unknown or not fields:
+        raise APIError(400, f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}")
+    return fields
+
+def _page_args():
+    """Return the (after, limit) keyset pagination arguments."""
+    try:
+        after = request.args.get('after', type=int)
+        limit = int(request.args.get('limit', config.API_PAGE_SIZE))
+    except ValueError:
+        raise APIError(400, 'after and limit must be integers')
+    if not 1 <= limit <= config.API_MAX_PAGE_SIZE:
+        raise APIError(400, f'limit must be between 1 and {config.API_MAX_PAGE_SIZE}')
+    return after, limit
+
+def _etag(conn, tables, extra=''):
+    """
+    Return an ETag for the current request over the given tables.
+
+    Returns None if the database has no change counters.
+    """
+    versions = database.table_versions(conn, tables)
+    if versions is None:
+        return None
+    key = f"{request.full_path}|{versions}|{extra}"
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+def _conditional(tables, build, extra=''):
+    """
+    Answer a GET with 304 if the client's ETag is current, else build it.
+
+    The counters are read before the data: if a write lands in between,
+    the response is tagged as older than it is and will simply be fetched
+    again, never cached as newer than it is.
+    """
+    conn = get_db()
+    etag = _etag(conn, tables, extra)
+    if etag and request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build(conn))
+    if etag:
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def compress_response(response):
+    """Gzip a response body when the client accepts it and it is large enough."""
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or 'gzip' not in request.accept_encodings):
+        return response
+    data = response.get_data()
+    if len(data) < config.API_GZIP_MIN_SIZE:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=6))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+def _rows(fields, rows):
+    return [dict(zip(fields, row)) for row in rows]
+
+@api_auth_required
+def books():
+    fields = _fields(circulation.BOOK_COLUMNS)
+    after, limit = _page_args()
+    available_only = request.args.get('available') == '1'
+
+    def build(conn):
+        rows, next_after = circulation.page_books(conn, fields, after, limit, available_only)
+        return {'books': _rows(fields, rows), 'next': next_after}
+
+    return _conditional(('books',), build)
+
+@api_auth_required
+def loans():
+    fields = _fields(circulation.LOAN_COLUMNS)
+    after, limit = _page_args()
+    active_only = request.args.get('active') == '1'
+
+    def build(conn):
+        rows, next_after = circulation.page_loans(conn, fields, after, limit, active_only)
+        return {'loans': _rows(fields, rows), 'next': next_after}
+
+    return _conditional(('borrowed',), build)
+
+@api_auth_required
+def stats():
+    fields = _fields(circulation.STATS_FIELDS)
+
+    def build(conn):
+        counts = circulation.library_stats(conn)
+        return {name: counts[name] for name in fields}
+
+    # Overdue counts change with the clock as well as with the tables
+    return _conditional(('books', 'borrowed'), build, extra=int(time.time() // 60))
+
+@api_auth_required
+def reports():
+    if not analytics.available():
+        raise APIError(503, 'Reports require NumPy on the server')
+    try:
+        window_days = int(request.args.get('window', config.ANALYTICS_WINDOW_DAYS))
+        top = int(request.args.get('top', config.ANALYTICS_TOP_N))
+    except ValueError:
+        raise APIError(400, 'window and top must be integers')
+    if not 1 <= window_days <= config.ANALYTICS_MAX_WINDOW_DAYS:
+        raise APIError(400, f'window must be between 1 and {config.ANALYTICS_MAX_WINDOW_DAYS} days')
+    if not 1 <= top <= config.API_MAX_PAGE_SIZE:
+        raise APIError(400, f'top must be between 1 and {config.API_MAX_PAGE_SIZE}')
+
+    def build(conn):
+        return analytics.get_report_cache(current_app.config['DATABASE']).report(conn, window_days, top)
+
+    # Like the report cache, the ETag also changes as the report expires
+    return _conditional(('books', 'borrowed'), build, extra=int(time.time() // config.ANALYTICS_CACHE_TTL))
+
+def _day_arg(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise APIError(400, f'{name} must be a date, YYYY-MM-DD')
+
+@api_auth_required
+def daily():
+    since, until = _day_arg('since'), _day_arg('until')
+    title = request.args.get('title')
+
+    def build(conn):
+        days = rollups.daily_counts(conn, since, until, title)
+        return {'days': [{'day': day, 'borrows': borrows, 'returns': returns}
+                         for day, borrows, returns in days]}
+
+    # The rollups change only with the borrowed table
+    return _conditional(('borrowed',), build)
+
+def tokens():
+    data = request.get_json(silent=True) if request.is_json else None
+    if not isinstance(data, dict) or not data.get('username') or not data.get('password'):
+        raise APIError(400, 'Request body must be a JSON object with username and password')
+    username = str(data['username'])
+    throttle = get_login_throttle(current_app.config['DATABASE'])
+    wait = throttle.retry_after(username, request.remote_addr)
+    if wait:
+        response = jsonify({'error': 'Too many failed login attempts'})
+        response.headers['Retry-After'] = str(math.ceil(wait))
+        return response, 429
+
+    conn = get_db()
+    user = auth.authenticate(conn, username, str(data['password']))
+    conn.commit()  # keeps a rehashed legacy password
+    if user is None:
+        throttle.record_failure(username, request.remote_addr)
+        raise APIError(401, 'Invalid username or password')
+    throttle.reset(username)
+    return jsonify({'token': auth.issue_token(user, current_app.config['SECRET_KEY']),
+                    'expires_in': config.SESSION_TIMEOUT}), 201
+
+@api_auth_required
+def loans_batch():
+    data = request.get_json(silent=True) if request.is_json else None
+    if not isinstance(data, dict) or not isinstance(data.get('operations'), list):
+        raise APIError(400, 'Request body must be a JSON object with an operations list')
+    operations = data['operations']
+    if len(operations) > config.API_MAX_BATCH_SIZE:
+        raise APIError(413, f'At most {config.API_MAX_BATCH_SIZE} operations per batch')
+
+    results = db_write(circulation.apply_loan_batch, operations)
+    succeeded = sum(1 for result in results if result['ok'])
+    return jsonify({'results': results, 'succeeded': succeeded,
+                    'failed': len(results) - succeeded})
+
+api.register_error_handler(APIError, handle_api_error)
+api.after_request(compress_response)
+api.add_url_rule('/books', view_func=books)
+api.add_url_rule('/loans', view_func=loans)
+api.add_url_rule('/stats', view_func=stats)
+api.add_url_rule('/reports', view_func=reports)
+api.add_url_rule('/daily', view_func=daily)
+api.add_url_rule('/loans:batch', view_func=loans_batch, methods=['POST'])
+api.add_url_rule('/tokens', view_func=tokens, methods=['POST'])
@@ -1,67 +1,28 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, current_app, render_template, request, redirect, url_for, session, flash, jsonify, Response
 import sqlite3
 import os
-from datetime import datetime
-import hashlib
+import math
 from functools import wraps
-import qrcode
-from io import BytesIO
-import base64
-
-app = Flask(__name__)
-app.secret_key = 'your-secret-key-change-this'  # Change this in production
+import auth
+import config
+import database
+import analytics
+import circulation
+import queries
+from database import get_db, close_db
+from api import api, is_authorized
+from write_queue import db_write
+from availability_cache import app_availability_cache
+from change_feed import get_change_feed
+from login_throttle import get_login_throttle
+from session_store import session_interface
+from qr_labels import catalog_qr_png, render_catalog_qr, add_book_with_qr
+import request_metrics
 
 # Database initialization
-def initialize_database():
+def initialize_database(path=config.DATABASE_NAME):
     """Initialize the database with required tables"""
-    conn = sqlite3.connect("library.db")
-    c = conn.cursor()
-    
-    # Create users table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL UNIQUE,
-            password TEXT NOT NULL,
-            email TEXT,
-            is_admin INTEGER DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create books table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS books (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL UNIQUE,
-            author TEXT,
-            isbn TEXT,
-            available INTEGER DEFAULT 1,
-            date_added TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create borrowed books table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS borrowed (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            student_name TEXT NOT NULL,
-            book_title TEXT NOT NULL,
-            borrow_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            return_date TIMESTAMP,
-            FOREIGN KEY (book_title) REFERENCES books (title)
-        )
-    ''')
-    
-    # Create default admin user if not exists
-    admin_password = hashlib.sha256('admin123'.encode()).hexdigest()
-    c.execute('''
-        INSERT OR IGNORE INTO users (username, password, is_admin) 
-        VALUES (?, ?, 1)
-    ''', ('admin', admin_password))
-    
-    conn.commit()
-    conn.close()
+    database.initialize_database(path)
 
 # Authentication decorator
 def login_required(f):
@@ -72,14 +33,25 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def handle_database_error(error):
+    """Answer SQLite lock timeouts with 503 so clients know to retry."""
+    message = str(error)
+    if 'locked' in message or 'busy' in message:
+        return 'The database is busy, please try again.', 503, {'Retry-After': '1'}
+    raise error
+
+def poll_change_feed():
+    """Apply changes committed by other processes, at most once per feed interval."""
+    feed = get_change_feed(current_app.config['DATABASE'])
+    if feed.poll_due():
+        feed.poll()
+
 # Routes
-@app.route('/')
 def index():
     if 'user_id' in session:
         return redirect(url_for('dashboard'))
     return redirect(url_for('login'))
 
-@app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
@@ -89,28 +61,32 @@ def login():
             flash('Please enter both username and password', 'error')
             return render_template('login.html')
         
-        # Hash password for comparison
-        hashed_password = hashlib.sha256(password.encode()).hexdigest()
+        # Refuse throttled attempts before spending time on the password hash
+        throttle = get_login_throttle(current_app.config['DATABASE'])
+        wait = throttle.retry_after(username, request.remote_addr)
+        if wait:
+            flash(f'Too many failed login attempts. Try again in {math.ceil(wait)} seconds.', 'error')
+            return render_template('login.html'), 429
         
-        conn = sqlite3.connect('library.db')
-        c = conn.cursor()
-        c.execute('SELECT id, username, is_admin FROM users WHERE username = ? AND password = ?', 
-                 (username, hashed_password))
-        user = c.fetchone()
-        conn.close()
+        conn = get_db()
+        user = auth.authenticate(conn, username, password)
+        conn.commit()  # keeps a rehashed legacy password
         
         if user:
-            session['user_id'] = user[0]
-            session['username'] = user[1]
-            session['is_admin'] = user[2]
+            throttle.reset(username)
+            session.clear()
+            session.permanent = True  # expires after SESSION_TIMEOUT idle seconds
+            session['user_id'] = user['id']
+            session['username'] = user['username']
+            session['is_admin'] = user['is_admin']
             flash('Login successful!', 'success')
             return redirect(url_for('dashboard'))
         else:
+            throttle.record_failure(username, request.remote_addr)
             flash('Invalid username or password', 'error')
     
     return render_template('login.html')
 
-@app.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form['username']
@@ -135,16 +111,10 @@ def register():
             flash('Passwords do not match', 'error')
             return render_template('register.html')
         
-        # Hash password
-        hashed_password = hashlib.sha256(password.encode()).hexdigest()
-        
         try:
-            conn = sqlite3.connect('library.db')
-            c = conn.cursor()
-            c.execute('INSERT INTO users (username, password, email) VALUES (?, ?, ?)',
-                     (username, hashed_password, email))
+            conn = get_db()
+            auth.create_user(conn, username, password, email)
             conn.commit()
-            conn.close()
             
             flash('Registration successful! Please login.', 'success')
             return redirect(url_for('login'))
@@ -153,50 +123,43 @@ def register():
     
     return render_template('register.html')
 
-@app.route('/logout')
 def logout():
     session.clear()
     flash('You have been logged out', 'info')
     return redirect(url_for('login'))
 
-@app.route('/dashboard')
 @login_required
 def dashboard():
-    conn = sqlite3.connect('library.db')
+    conn = get_db()
     c = conn.cursor()
     
     # Get statistics
-    c.execute('SELECT COUNT(*) FROM books')
+    c.execute(queries.COUNT_BOOKS)
     total_books = c.fetchone()[0]
     
-    c.execute('SELECT COUNT(*) FROM books WHERE available = 1')
+    c.execute(queries.COUNT_AVAILABLE_BOOKS)
     available_books = c.fetchone()[0]
     
-    c.execute('SELECT COUNT(*) FROM borrowed WHERE return_date IS NULL')
+    c.execute(queries.COUNT_ACTIVE_LOANS)
     borrowed_books = c.fetchone()[0]
     
-    conn.close()
-    
     stats = {
         'total_books': total_books,
         'available_books': available_books,
         'borrowed_books': borrowed_books
     }
     
-    return render_template('dashboard.html', stats=stats)
+    # Circulation reports, recomputed only after the tables change
+    reports = analytics.app_report_cache().report(conn) if analytics.available() else None
+    
+    return render_template('dashboard.html', stats=stats, reports=reports)
 
-@app.route('/books')
 @login_required
 def books():
-    conn = sqlite3.connect('library.db')
-    c = conn.cursor()
-    c.execute('SELECT * FROM books ORDER BY date_added DESC')
-    books = c.fetchall()
-    conn.close()
+    books = circulation.list_books(get_db())
     
     return render_template('books.html', books=books)
 
-@app.route('/add_book', methods=['GET', 'POST'])
 @login_required
 def add_book():
     if request.method == 'POST':
@@ -220,12 +183,8 @@ def add_book():
             return render_template('add_book.html')
         
         try:
-            conn = sqlite3.connect('library.db')
-            c = conn.cursor()
-            c.execute('INSERT INTO books (title, author, isbn) VALUES (?, ?, ?)',
-                     (title, author, isbn))
-            conn.commit()
-            conn.close()
+            book_id = db_write(add_book_with_qr, title, author, isbn, render_catalog_qr(title))
+            app_availability_cache().add(book_id, title, author, isbn)
             
             flash('Book added successfully!', 'success')
             return redirect(url_for('books'))
@@ -236,7 +195,6 @@ def add_book():
     
     return render_template('add_book.html')
 
-@app.route('/borrow', methods=['GET', 'POST'])
 @login_required
 def borrow():
     if request.method == 'POST':
@@ -247,114 +205,130 @@ def borrow():
             flash('Student name and book title are required', 'error')
             return redirect(url_for('borrow'))
         
-        conn = sqlite3.connect('library.db')
-        c = conn.cursor()
-        
-        # Check if book is available
-        c.execute('SELECT available FROM books WHERE title = ?', (book_title,))
-        book = c.fetchone()
-        
-        if not book or book[0] == 0:
-            flash('Book is not available for borrowing', 'error')
-            conn.close()
+        try:
+            db_write(circulation.borrow_book, student_name, book_title)
+        except circulation.CirculationError as e:
+            flash(str(e), 'error')
             return redirect(url_for('borrow'))
-        
-        # Record the borrowing
-        c.execute('INSERT INTO borrowed (student_name, book_title) VALUES (?, ?)',
-                 (student_name, book_title))
-        
-        # Update book availability
-        c.execute('UPDATE books SET available = 0 WHERE title = ?', (book_title,))
-        
-        conn.commit()
-        conn.close()
+        app_availability_cache().set_available(book_title, False)
         
         flash('Book borrowed successfully!', 'success')
         return redirect(url_for('borrowed_books'))
     
-    # Get available books for the form
-    conn = sqlite3.connect('library.db')
-    c = conn.cursor()
-    c.execute('SELECT title FROM books WHERE available = 1 ORDER BY title')
-    available_books = [row[0] for row in c.fetchall()]
-    conn.close()
+    # Book records of the available books, in title order, for the form and its details panel
+    available_books = app_availability_cache().available_books()
     
     return render_template('borrow.html', available_books=available_books)
 
-@app.route('/return_book', methods=['GET', 'POST'])
 @login_required
 def return_book():
     if request.method == 'POST':
         borrow_id = request.form['borrow_id']
         
-        conn = sqlite3.connect('library.db')
-        c = conn.cursor()
-        
-        # Get the borrowed book details
-        c.execute('SELECT book_title FROM borrowed WHERE id = ? AND return_date IS NULL', (borrow_id,))
-        book = c.fetchone()
-        
-        if not book:
-            flash('Invalid borrow record', 'error')
-            conn.close()
+        try:
+            book_title = db_write(circulation.return_book, borrow_id)
+        except circulation.CirculationError as e:
+            flash(str(e), 'error')
             return redirect(url_for('borrowed_books'))
-        
-        # Update return date
-        c.execute('UPDATE borrowed SET return_date = ? WHERE id = ?',
-                 (datetime.now(), borrow_id))
-        
-        # Make book available again
-        c.execute('UPDATE books SET available = 1 WHERE title = ?', (book[0],))
-        
-        conn.commit()
-        conn.close()
+        app_availability_cache().set_available(book_title, True)
         
         flash('Book returned successfully!', 'success')
         return redirect(url_for('borrowed_books'))
     
     return redirect(url_for('borrowed_books'))
 
-@app.route('/borrowed_books')
 @login_required
 def borrowed_books():
-    conn = sqlite3.connect('library.db')
-    c = conn.cursor()
-    c.execute('''
-        SELECT id, student_name, book_title, borrow_date, return_date 
-        FROM borrowed 
-        ORDER BY borrow_date DESC
-    ''')
-    borrowed = c.fetchall()
-    conn.close()
+    loans = circulation.list_loans(get_db(), active_only=True)
     
-    return render_template('borrowed_books.html', borrowed=borrowed)
+    return render_template('borrowed_books.html', borrowed_books=loans)
 
-@app.route('/generate_qr/<book_title>')
 @login_required
 def generate_qr(book_title):
-    # Generate QR code
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(f"Book: {book_title}")
-    qr.make(fit=True)
+    conn = get_db()
+    c = conn.cursor()
+    c.execute(queries.BOOK_ID_BY_TITLE, (book_title,))
+    book = c.fetchone()
+    
+    if not book:
+        return jsonify({'error': 'Book not found'}), 404
     
-    img = qr.make_image(fill_color="black", back_color="white")
+    # Served from the qr_blobs table, filled in when the book was added
+    png = catalog_qr_png(conn, book[0], book_title)
     
-    # Convert to base64 for display
-    buffer = BytesIO()
-    img.save(buffer, format='PNG')
-    buffer.seek(0)
+    if request.args.get('format') == 'png':
+        return Response(png, mimetype='image/png')
     
-    qr_code_data = base64.b64encode(buffer.getvalue()).decode()
+    import base64
+    qr_code_data = base64.b64encode(png).decode()
     
     return jsonify({'qr_code': qr_code_data})
 
+def register_routes(app):
+    """Register the web views on an application."""
+    app.add_url_rule('/', view_func=index)
+    app.add_url_rule('/login', view_func=login, methods=['GET', 'POST'])
+    app.add_url_rule('/register', view_func=register, methods=['GET', 'POST'])
+    app.add_url_rule('/logout', view_func=logout)
+    app.add_url_rule('/dashboard', view_func=dashboard)
+    app.add_url_rule('/books', view_func=books)
+    app.add_url_rule('/add_book', view_func=add_book, methods=['GET', 'POST'])
+    app.add_url_rule('/borrow', view_func=borrow, methods=['GET', 'POST'])
+    app.add_url_rule('/return_book', view_func=return_book, methods=['GET', 'POST'])
+    app.add_url_rule('/borrowed_books', view_func=borrowed_books)
+    app.add_url_rule('/generate_qr/<book_title>', view_func=generate_qr)
+
+def create_app(config_mapping=None):
+    """
+    Create and configure the web application.
+    
+    No database connection is opened here, so the app can be created in a
+    pre-fork server's master process; each worker fills its own connection
+    pool on first use.
+    
+    Args:
+        config_mapping (dict): Optional settings overriding the defaults
+    
+    Returns:
+        Flask: The configured application
+    """
+    app = Flask(__name__)
+    app.config.from_mapping(
+        DATABASE=config.DATABASE_NAME,
+        DATABASE_POOL_SIZE=config.DATABASE_POOL_SIZE,
+        API_TOKEN=os.environ.get('SMARTLIB_API_TOKEN'),
+        PERMANENT_SESSION_LIFETIME=config.SESSION_TIMEOUT,
+        SESSION_BACKEND=config.SESSION_BACKEND,
+        REQUEST_METRICS=config.REQUEST_METRICS,
+        SLOW_QUERY_THRESHOLD=config.SLOW_QUERY_THRESHOLD,
+        LOG_FILE=config.LOG_FILE,
+    )
+    if config_mapping:
+        app.config.from_mapping(config_mapping)
+    if not app.config.get('SECRET_KEY'):
+        app.config['SECRET_KEY'] = database.load_secret_key()
+    interface = session_interface(app.config['SESSION_BACKEND'], app.config['DATABASE'])
+    if interface is not None:
+        app.session_interface = interface
+    
+    app.before_request(poll_change_feed)
+    app.teardown_appcontext(close_db)
+    app.register_error_handler(sqlite3.OperationalError, handle_database_error)
+    if app.config['REQUEST_METRICS']:
+        request_metrics.install(app, authorize=is_authorized)
+    register_routes(app)
+    app.register_blueprint(api)
+    return app
+
+app = create_app()
+
 if __name__ == '__main__':
     # Create QR codes directory if it doesn't exist
     if not os.path.exists("qr_codes"):
         os.makedirs("qr_codes")
     
     # Initialize database
-    initialize_database()
+    initialize_database(app.config['DATABASE'])
     
-    # Run the app
+    # Run the development server (use wsgi.py for multi-worker deployment)
     app.run(debug=True, host='0.0.0.0', port=8080)
\ No newline at end of file
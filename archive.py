@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# archive.py
+"""
+Archiving of old loan history.
+
+Returned loans are never needed at the circulation desk again, yet they
+stay in borrowed next to the loans still out: full listings, counts and
+pages read past them, and their pages compete with the live loans for
+the page cache. archive_loans moves the loans returned more than
+ARCHIVE_HORIZON_DAYS ago into an archive database, library_archive.db
+next to library.db, whose borrowed table has the same columns and keeps
+the loans' ids.
+
+The archive is ATTACHed to the connection doing the work, and loans are
+moved in id order, ARCHIVE_BATCH_SIZE at a time: each chunk is copied
+with INSERT ... SELECT and deleted from the live table in one
+transaction, so the write lock is only held briefly and the desk keeps
+working while a large backlog is archived. In WAL mode SQLite commits
+each attached database atomically, but not both together: a crash in
+between can leave a chunk in both databases, and the next run finishes
+moving it.
+
+Loans leaving borrowed stay counted in the daily rollups, which have no
+delete trigger. Queries over the whole history read the loan_history view
+created by attach_archive. It is a TEMP view, as a view stored in either
+database cannot refer to the other one. Circulation reports (analytics.py)
+only read the live loans, and their window is limited to
+ARCHIVE_HORIZON_DAYS; archiving with a shorter horizon leaves loans out
+of the longest reports.
+
+Usage:
+    python archive.py [--database library.db] [--archive library_archive.db]
+                      [--days N] [--vacuum]
+"""
+
+import argparse
+import os
+import sys
+
+import config
+import database
+from queries import LOAN_COLUMNS
+
+# Name the archive database is attached under
+ARCHIVE_SCHEMA = 'archive'
+
+_COLUMNS = ', '.join(LOAN_COLUMNS)
+
+# Last id of the next chunk of loans to archive
+CHUNK_END = f'''
+    SELECT MAX(id) FROM (
+        SELECT id FROM main.borrowed WHERE id > ? AND return_date < ? ORDER BY id LIMIT ?
+    )
+'''
+# The live row replaces a copy left in the archive by an interrupted run
+COPY_CHUNK = (f"INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}.borrowed ({_COLUMNS}) "
+              f"SELECT {_COLUMNS} FROM main.borrowed WHERE id > ? AND id <= ? AND return_date < ?")
+DELETE_CHUNK = "DELETE FROM main.borrowed WHERE id > ? AND id <= ? AND return_date < ?"
+
+def archive_path(path=config.DATABASE_NAME):
+    """Return the archive database of a live database: library.db -> library_archive.db."""
+    root, extension = os.path.splitext(path)
+    return f"{root}_archive{extension}"
+
+def attach_archive(conn, path):
+    """
+    Attach an archive database, creating its table if needed, and create
+    the loan_history view over the live and archived loans.
+
+    Args:
+        conn (sqlite3.Connection): Open connection with no transaction in progress
+        path (str): Path of the archive database
+    """
+    attached = {row[1] for row in conn.execute("PRAGMA database_list")}
+    if ARCHIVE_SCHEMA not in attached:
+        conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (path,))
+        conn.execute(f"PRAGMA {ARCHIVE_SCHEMA}.journal_mode = WAL")
+    # Same columns as the live table; the books it refers to stay in the live database
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.borrowed (
+            id INTEGER PRIMARY KEY,
+            student_name TEXT NOT NULL,
+            book_title TEXT NOT NULL,
+            borrow_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            return_date TIMESTAMP
+        )
+    ''')
+    conn.execute(f'''
+        CREATE TEMP VIEW IF NOT EXISTS loan_history AS
+        SELECT {_COLUMNS} FROM main.borrowed
+        UNION ALL
+        SELECT {_COLUMNS} FROM {ARCHIVE_SCHEMA}.borrowed
+    ''')
+    conn.commit()
+
+def detach_archive(conn):
+    """Drop the loan_history view and detach the archive database, if attached."""
+    conn.execute("DROP VIEW IF EXISTS temp.loan_history")
+    attached = {row[1] for row in conn.execute("PRAGMA database_list")}
+    if ARCHIVE_SCHEMA in attached:
+        conn.execute(f"DETACH DATABASE {ARCHIVE_SCHEMA}")
+
+def archive_loans(conn, path, horizon_days=config.ARCHIVE_HORIZON_DAYS, batch_size=config.ARCHIVE_BATCH_SIZE):
+    """
+    Move the loans returned more than horizon_days ago to the archive database.
+
+    Commits after each chunk of batch_size loans, then trims the change
+    log, which receives one row per archived loan. The archive stays
+    attached.
+
+    Args:
+        conn (sqlite3.Connection): Open connection with no transaction in progress
+        path (str): Path of the archive database
+        horizon_days (int): Loans returned within this many days stay live
+        batch_size (int): Loans moved per transaction
+
+    Returns:
+        int: Number of loans moved
+    """
+    attach_archive(conn, path)
+    cutoff = conn.execute("SELECT datetime('now', ?)", (f'-{int(horizon_days)} days',)).fetchone()[0]
+    moved = 0
+    last_id = 0
+    while True:
+        chunk_end = conn.execute(CHUNK_END, (last_id, cutoff, batch_size)).fetchone()[0]
+        if chunk_end is None:
+            break
+        bounds = (last_id, chunk_end, cutoff)
+        conn.execute(COPY_CHUNK, bounds)
+        moved += conn.execute(DELETE_CHUNK, bounds).rowcount
+        conn.commit()
+        last_id = chunk_end
+    if moved:
+        database.prune_changes(conn)
+        conn.commit()
+    return moved
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old returned loans to the archive database")
+    parser.add_argument('--database', default=config.DATABASE_NAME, help="Path of the library database")
+    parser.add_argument('--archive', help="Path of the archive database (default: <database>_archive.db)")
+    parser.add_argument('--days', type=int, default=config.ARCHIVE_HORIZON_DAYS,
+                        help="Archive loans returned more than this many days ago")
+    parser.add_argument('--vacuum', action='store_true',
+                        help="Shrink the live database file afterwards (locks it while running)")
+    args = parser.parse_args()
+    if args.days < config.ANALYTICS_MAX_WINDOW_DAYS:
+        print(f"Warning: reports over more than {args.days} days will leave out the archived loans")
+
+    database.initialize_database(args.database)
+    conn = database.connect(args.database)
+    try:
+        moved = archive_loans(conn, args.archive or archive_path(args.database), args.days)
+        remaining = conn.execute("SELECT COUNT(*) FROM main.borrowed").fetchone()[0]
+        detach_archive(conn)
+        if args.vacuum:
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+    print(f"Archived {moved} loans; {remaining} remain in {args.database}")
+    return True
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,256 @@
+# asgi.py
+"""
+Asynchronous JSON API for circulation, for kiosks and other pollers.
+
+A dependency-free ASGI application exposing the same operations as the
+Flask views, through the shared circulation module:
+
+    GET  /books[?available=1]     list books
+    GET  /borrowed[?active=1]     list loans
+    GET  /availability?title=...  is a book on the shelf (also ?id=...)
+    POST /borrow                  {"student_name": ..., "book_title": ...}
+    POST /return                  {"borrow_id": ...}
+
+Blocking sqlite3 reads run on a small thread pool, one pooled connection
+per thread, and writes go through the group-commit write queue, so the
+event loop keeps accepting requests while queries run.
+
+    uvicorn asgi:application --workers 4
+
+Uses the same environment variables as wsgi.py. Like the Flask views,
+every route needs authentication: requests must send "Authorization:
+Bearer <token>" carrying SMARTLIB_API_TOKEN or a session token from the
+web app's /api/v1/tokens, which is checked against the shared secret key.
+An app with neither a token nor a secret key configured refuses every
+request.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import auth
+import config
+import database
+import circulation
+from write_queue import get_write_queue, close_write_queues
+from availability_cache import get_availability_cache
+
+MAX_BODY_SIZE = 64 * 1024
+
+class HTTPError(Exception):
+    """An error answered with a JSON body and the given status code."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class CirculationAPI:
+    """ASGI application serving the circulation API."""
+
+    def __init__(self, database_path=config.DATABASE_NAME, pool_size=config.DATABASE_POOL_SIZE,
+                 api_token=None, secret_key=None):
+        self.database_path = database_path
+        self.pool_size = pool_size
+        self.api_token = api_token
+        self.secret_key = secret_key
+        self._executor = None
+        self.routes = {
+            ('GET', '/books'): self.books,
+            ('GET', '/borrowed'): self.borrowed,
+            ('GET', '/availability'): self.availability,
+            ('POST', '/borrow'): self.borrow,
+            ('POST', '/return'): self.return_book,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await asyncio.get_running_loop().run_in_executor(
+                    None, database.initialize_database, self.database_path)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def close(self):
+        """Stop the worker threads and close their connections."""
+        close_write_queues(self.database_path)
+        get_availability_cache(self.database_path).close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        database.get_pool(self.database_path, self.pool_size).close()
+
+    async def _http(self, scope, receive, send):
+        try:
+            handler = self.routes.get((scope['method'], scope['path']))
+            if handler is None:
+                if any(path == scope['path'] for _, path in self.routes):
+                    raise HTTPError(405, 'Method not allowed')
+                raise HTTPError(404, 'Not found')
+            self._check_token(scope)
+            if scope['method'] == 'POST':
+                body = await self._read_json(receive)
+            else:
+                body = None
+            query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+            status, payload = await handler(query, body)
+        except HTTPError as e:
+            status, payload = e.status, {'error': e.message}
+        except sqlite3.Error as e:
+            status, payload = 503, {'error': f'Database error: {e}'}
+
+        data = json.dumps(payload, default=str).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'),
+                        (b'content-length', str(len(data)).encode())],
+        })
+        await send({'type': 'http.response.body', 'body': data})
+
+    def _check_token(self, scope):
+        if not self.api_token and not self.secret_key:
+            raise HTTPError(503, 'No API token configured')
+        headers = dict(scope.get('headers', []))
+        header = headers.get(b'authorization', b'').decode('latin-1')
+        if not auth.bearer_authorized(header, self.api_token, self.secret_key):
+            raise HTTPError(401, 'Invalid or missing API token')
+
+    async def _read_json(self, receive):
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if len(body) > MAX_BODY_SIZE:
+                raise HTTPError(413, 'Request body too large')
+            if not message.get('more_body'):
+                break
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            raise HTTPError(400, 'Request body must be JSON')
+        if not isinstance(data, dict):
+            raise HTTPError(400, 'Request body must be a JSON object')
+        return data
+
+    async def _run(self, func, *args, commit=False):
+        """
+        Run a circulation function off the event loop.
+
+        Writes (commit=True) are handed to the write queue; reads run on a
+        worker thread with a pooled connection.
+        """
+        if commit:
+            return await asyncio.wrap_future(get_write_queue(self.database_path).submit(func, *args))
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_size,
+                                                thread_name_prefix='circulation')
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, func, args)
+
+    def _call(self, func, args):
+        with database.get_pool(self.database_path, self.pool_size).connection() as conn:
+            return func(conn, *args)
+
+    async def books(self, query, body):
+        available_only = query.get('available', ['0'])[0] == '1'
+        rows = await self._run(circulation.list_books, available_only)
+        return 200, {'books': [dict(zip(circulation.BOOK_COLUMNS, row)) for row in rows]}
+
+    async def borrowed(self, query, body):
+        active_only = query.get('active', ['0'])[0] == '1'
+        rows = await self._run(circulation.list_loans, active_only)
+        return 200, {'loans': [dict(zip(circulation.LOAN_COLUMNS, row)) for row in rows]}
+
+    async def availability(self, query, body):
+        cache = get_availability_cache(self.database_path)
+        if cache.refresh_due():
+            await asyncio.get_running_loop().run_in_executor(None, cache.refresh)
+        if 'id' in query:
+            try:
+                key = int(query['id'][0])
+            except ValueError:
+                raise HTTPError(400, 'id must be an integer')
+        elif 'title' in query:
+            key = query['title'][0]
+        else:
+            raise HTTPError(400, 'Pass a book title or id')
+        available = cache.is_available(key)
+        if available is None:
+            raise HTTPError(404, 'Book not found')
+        return 200, {'book': key, 'available': available, 'version': cache.version}
+
+    async def borrow(self, query, body):
+        student_name = str(body.get('student_name') or '').strip()
+        book_title = str(body.get('book_title') or '').strip()
+        if not student_name or not book_title:
+            raise HTTPError(400, 'Student name and book title are required')
+        try:
+            loan_id = await self._run(circulation.borrow_book, student_name, book_title, commit=True)
+        except circulation.CirculationError as e:
+            raise HTTPError(409, str(e))
+        get_availability_cache(self.database_path).set_available(book_title, False)
+        return 201, {'id': loan_id, 'student_name': student_name, 'book_title': book_title}
+
+    async def return_book(self, query, body):
+        borrow_id = body.get('borrow_id')
+        if not isinstance(borrow_id, int):
+            raise HTTPError(400, 'borrow_id must be an integer')
+        try:
+            book_title = await self._run(circulation.return_book, borrow_id, commit=True)
+        except circulation.CirculationError as e:
+            raise HTTPError(404, str(e))
+        get_availability_cache(self.database_path).set_available(book_title, True)
+        return 200, {'id': borrow_id, 'book_title': book_title}
+
+async def call_asgi(app, method, path, body=None, headers=()):
+    """
+    Send one request to an ASGI application in-process.
+
+    Used by the tests and the load benchmark in place of an HTTP server.
+
+    Returns:
+        tuple: (status, decoded JSON body)
+    """
+    path, _, query_string = path.partition('?')
+    data = json.dumps(body).encode() if body is not None else b''
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': method, 'path': path, 'query_string': query_string.encode(),
+        'headers': [(b'content-type', b'application/json')] + list(headers),
+    }
+    messages = [{'type': 'http.request', 'body': data, 'more_body': False}]
+    response = {}
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        else:
+            response['body'] = response.get('body', b'') + message.get('body', b'')
+
+    await app(scope, receive, send)
+    return response['status'], json.loads(response['body'])
+
+application = CirculationAPI(
+    os.environ.get('SMARTLIB_DATABASE', config.DATABASE_NAME),
+    int(os.environ.get('SMARTLIB_POOL_SIZE', config.DATABASE_POOL_SIZE)),
+    os.environ.get('SMARTLIB_API_TOKEN'),
+    database.load_secret_key(),
+)
@@ -0,0 +1,254 @@
+# auth.py
+"""
+Password hashing, login and signed session tokens for the web and Tk apps.
+
+Passwords are stored as "scrypt:<n>:<r>:<p>$<salt>$<hash>" (or
+"pbkdf2:sha256:<iterations>$<salt>$<hash>" where OpenSSL lacks scrypt),
+with a random salt per user and a cost set in config.py; measure it with
+benchmarks/bench_password_hash.py. Users are looked up by their unique,
+indexed username only, and the hash is checked in Python. Hashes written
+by earlier versions (bare SHA-256 hex digests) still verify and are
+replaced with a current hash the first time their owner logs in, as are
+hashes made with an older cost.
+
+Session tokens let API clients prove who they are without a users lookup
+on every request: a token carries the user id, name, admin flag and issue
+time, signed with the app's secret key. Verified tokens are kept in a
+small in-process cache so repeat requests skip even the HMAC.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import config
+import queries
+
+SALT_BYTES = 16
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+def _method():
+    """Return the configured hash method, falling back to PBKDF2 without scrypt."""
+    if config.PASSWORD_HASH_METHOD == 'scrypt' and hasattr(hashlib, 'scrypt'):
+        return f'scrypt:{config.PASSWORD_SCRYPT_N}:{config.PASSWORD_SCRYPT_R}:{config.PASSWORD_SCRYPT_P}'
+    return f'pbkdf2:sha256:{config.PASSWORD_PBKDF2_ITERATIONS}'
+
+def _derive(method, password, salt):
+    name, *params = method.split(':')
+    if name == 'scrypt':
+        n, r, p = (int(value) for value in params)
+        # scrypt needs 128 * n * r bytes; allow that plus headroom
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r + 1024 * 1024)
+    if name == 'pbkdf2':
+        digest, iterations = params
+        return hashlib.pbkdf2_hmac(digest, password.encode(), salt, int(iterations))
+    raise ValueError(f"Unknown password hash method: {method}")
+
+def hash_password(password, method=None):
+    """
+    Hash a password with a new random salt.
+
+    Args:
+        password (str): Plain-text password
+        method (str): Method and cost, e.g. "scrypt:16384:8:1";
+                      defaults to the cost configured in config.py
+
+    Returns:
+        str: Encoded hash to store in users.password
+    """
+    method = method or _method()
+    salt = os.urandom(SALT_BYTES)
+    return f'{method}${_b64encode(salt)}${_b64encode(_derive(method, password, salt))}'
+
+def _is_legacy(stored):
+    return len(stored) == 64 and '$' not in stored
+
+def verify_password(password, stored):
+    """Return True if password matches a stored hash, current or legacy."""
+    if not stored:
+        return False
+    if _is_legacy(stored):
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+    try:
+        method, salt, expected = stored.split('$')
+        return hmac.compare_digest(_derive(method, password, _b64decode(salt)), _b64decode(expected))
+    except ValueError:
+        return False
+
+def needs_rehash(stored):
+    """Return True if a stored hash is legacy or made with another cost than configured."""
+    return _is_legacy(stored) or stored.split('$', 1)[0] != _method()
+
+# Verified against when a username does not exist, so unknown and known
+# users take the same time to reject
+_dummy_hash = None
+
+def _dummy():
+    global _dummy_hash
+    if _dummy_hash is None or needs_rehash(_dummy_hash):
+        _dummy_hash = hash_password(os.urandom(16).hex())
+    return _dummy_hash
+
+def authenticate(conn, username, password):
+    """
+    Check a username and password.
+
+    A legacy or outdated hash is replaced after a successful check; the
+    caller commits.
+
+    Args:
+        conn (sqlite3.Connection): Open database connection
+        username (str): Login name
+        password (str): Plain-text password
+
+    Returns:
+        dict or None: id, username and is_admin of the user, or None
+    """
+    row = conn.execute(queries.USER_BY_USERNAME, (username,)).fetchone()
+    if row is None:
+        verify_password(password, _dummy())
+        return None
+    user_id, username, stored, is_admin = row
+    if not verify_password(password, stored):
+        return None
+    if needs_rehash(stored):
+        conn.execute(queries.UPDATE_PASSWORD, (hash_password(password), user_id))
+    return {'id': user_id, 'username': username, 'is_admin': bool(is_admin)}
+
+def create_user(conn, username, password, email=None, is_admin=False):
+    """
+    Add a user with a hashed password. The caller commits.
+
+    Returns:
+        int: The new user's id
+
+    Raises:
+        sqlite3.IntegrityError: If the username is taken
+    """
+    cursor = conn.execute(queries.INSERT_USER,
+                          (username, hash_password(password), email, int(is_admin)))
+    return cursor.lastrowid
+
+def initialize_users_table(conn):
+    """
+    Create the users table and the default admin, and bring tables made by
+    older Tk clients (password_hash and role columns) to the shared layout.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            password TEXT NOT NULL,
+            email TEXT,
+            is_admin INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+    if 'password' not in columns and 'password_hash' in columns:
+        conn.execute("ALTER TABLE users RENAME COLUMN password_hash TO password")
+    if 'is_admin' not in columns:
+        conn.execute("ALTER TABLE users ADD COLUMN is_admin INTEGER DEFAULT 0")
+        if 'role' in columns:
+            conn.execute("UPDATE users SET is_admin = 1 WHERE role = 'admin'")
+
+    # Hash only when the admin is missing: hashing is deliberately slow
+    if conn.execute(queries.USER_EXISTS, (config.ADMIN_USERNAME,)).fetchone() is None:
+        create_user(conn, config.ADMIN_USERNAME, config.ADMIN_PASSWORD, is_admin=True)
+
+def _sign(payload, secret_key):
+    key = secret_key.encode() if isinstance(secret_key, str) else secret_key
+    return _b64encode(hmac.new(key, payload.encode(), hashlib.sha256).digest())
+
+def issue_token(user, secret_key, now=None):
+    """
+    Return a signed session token for an authenticated user.
+
+    Args:
+        user (dict): As returned by authenticate()
+        secret_key (str or bytes): The app's secret key
+        now (float): Issue time, defaults to the current time
+    """
+    issued = int(time.time() if now is None else now)
+    payload = f"{user['id']}.{_b64encode(user['username'].encode())}.{int(user['is_admin'])}.{issued}"
+    return f"{payload}.{_sign(payload, secret_key)}"
+
+class TokenCache:
+    """Recently verified session tokens, so repeat requests skip verification."""
+
+    def __init__(self, size=config.SESSION_TOKEN_CACHE_SIZE):
+        self.size = size
+        self._tokens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def verify(self, token, secret_key, max_age=config.SESSION_TIMEOUT, now=None):
+        """
+        Return the user a token was issued to, or None if it is forged or expired.
+
+        Returns:
+            dict or None: id, username and is_admin of the user
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._tokens.get(token)
+            if entry is not None:
+                user, issued, key = entry
+                if key == secret_key and now - issued <= max_age:
+                    self._tokens.move_to_end(token)
+                    return dict(user)
+                del self._tokens[token]
+                return None
+
+        try:
+            payload, signature = token.rsplit('.', 1)
+            user_id, username, is_admin, issued = payload.split('.')
+            issued = int(issued)
+            if not hmac.compare_digest(signature, _sign(payload, secret_key)) or now - issued > max_age:
+                return None
+            user = {'id': int(user_id), 'username': _b64decode(username).decode(), 'is_admin': is_admin == '1'}
+        except (ValueError, UnicodeDecodeError):
+            return None
+
+        with self._lock:
+            self._tokens[token] = (user, issued, secret_key)
+            while len(self._tokens) > self.size:
+                self._tokens.popitem(last=False)
+        return dict(user)
+
+    def clear(self):
+        with self._lock:
+            self._tokens.clear()
+
+token_cache = TokenCache()
+
+def verify_token(token, secret_key, max_age=config.SESSION_TIMEOUT):
+    """Verify a session token using the process-wide token cache."""
+    return token_cache.verify(token, secret_key, max_age)
+
+def bearer_authorized(header, api_token, secret_key):
+    """
+    Return True if an Authorization header carries the static API token or
+    a valid session token.
+
+    Args:
+        header (str): Value of the Authorization header, '' if absent
+        api_token (str): Configured API token, or None
+        secret_key (str): Key session tokens are signed with, or None
+    """
+    if not header.startswith('Bearer '):
+        return False
+    bearer = header[len('Bearer '):]
+    # Bytes, as compare_digest refuses non-ASCII str
+    if api_token and hmac.compare_digest(bearer.encode(), api_token.encode()):
+        return True
+    return bool(secret_key) and verify_token(bearer, secret_key) is not None
@@ -0,0 +1,178 @@
+# availability_cache.py
+"""
+In-process cache of which books are on the shelf.
+
+The borrow form, the Tk borrow window and kiosks all ask the same question
+many times a second. The cache keeps every book's record (records.Book)
+in memory and answers from there, so the borrow form can list the
+available books with their authors and ISBNs without a query:
+
+- Borrow and return code paths in this process update the affected entry
+  right after their commit, so readers here never see their own writes late.
+- Changes committed by other processes (other workers, the Tk client)
+  arrive through the change feed, which reads are allowed to poll at most
+  every feed interval; in between, reads run no SQL at all. Only the books
+  named in the change log are re-read.
+
+Every change to the cached data increments version, so callers can tell
+whether anything changed since they last looked. Availability shown from
+the cache is advisory: borrow_book's conditional UPDATE remains the
+authority on whether a copy can still be lent.
+"""
+
+import os
+import threading
+
+import config
+import database
+import queries
+from change_feed import get_change_feed, changed_rows
+from circulation import fetch_records
+from records import book_factory
+from tree_rows import select_by_ids
+
+class AvailabilityCache:
+    """Book availability for one database, kept current by its change feed."""
+
+    def __init__(self, path=config.DATABASE_NAME, feed=None):
+        self.path = path
+        self.feed = feed if feed is not None else get_change_feed(path)
+        self.version = 0
+        self._lock = threading.RLock()
+        self._conn = None
+        self._loaded = False
+        self._books = {}
+        self._ids_by_title = {}
+        self._available_books = None
+        self._subscribed = False
+
+    def _check(self):
+        # Called without holding the cache lock: the feed takes its own lock
+        # and then calls back into the cache, which takes the cache lock
+        if not self._subscribed:
+            self.feed.subscribe(self._apply_changes, ('books',))
+            self._subscribed = True
+        if not self._loaded:
+            # Fix the feed's position first: changes after it are re-read
+            # on the next poll, which is harmless if the load already saw them
+            self.feed.poll(force=True)
+            self._load()
+        elif self.feed.poll_due():
+            self.feed.poll()
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = database.connect(self.path)
+        return self._conn
+
+    def _load(self):
+        with self._lock:
+            books = fetch_records(self._connection(), book_factory, queries.ALL_BOOKS)
+            self._books = {book.id: book for book in books}
+            self._ids_by_title = {book.title: book.id for book in books}
+            self._loaded = True
+            self._changed()
+
+    def _apply_changes(self, changes):
+        """Change feed callback: re-read the books that changed."""
+        if not self._loaded:
+            return
+        if changes is None:
+            self._load()
+            return
+        upserts, deletes = changed_rows(changes, 'books')
+        with self._lock:
+            for book_id in deletes | upserts:
+                book = self._books.pop(book_id, None)
+                if book is not None:
+                    self._ids_by_title.pop(book.title, None)
+            for book in select_by_ids(self._connection(), queries.BOOKS_BY_IDS, upserts, book_factory):
+                self._books[book.id] = book
+                self._ids_by_title[book.title] = book.id
+            self._changed()
+
+    def _changed(self):
+        self.version += 1
+        self._available_books = None
+
+    def refresh_due(self):
+        """Return True if the next read will query the database."""
+        return not self._loaded or self.feed.poll_due()
+
+    def refresh(self):
+        """Apply changes from other processes now."""
+        self._check()
+
+    def is_available(self, key):
+        """
+        Return whether a book is on the shelf.
+
+        Args:
+            key (int or str): Book id or title
+
+        Returns:
+            bool or None: Availability, or None for an unknown book
+        """
+        self._check()
+        with self._lock:
+            book = self._books.get(key if isinstance(key, int) else self._ids_by_title.get(key))
+            return bool(book.available) if book else None
+
+    def available_books(self):
+        """Return the records.Book records of all books on the shelf, by title."""
+        self._check()
+        with self._lock:
+            if self._available_books is None:
+                self._available_books = sorted((book for book in self._books.values() if book.available),
+                                               key=lambda book: book.title)
+            return list(self._available_books)
+
+    def available_titles(self):
+        """Return the titles of all books on the shelf, alphabetically."""
+        return [book.title for book in self.available_books()]
+
+    def set_available(self, title, available):
+        """Record a committed borrow (False) or return (True) made in this process."""
+        with self._lock:
+            book = self._books.get(self._ids_by_title.get(title))
+            if book is not None and bool(book.available) != available:
+                self._books[book.id] = book._replace(available=int(available))
+                self._changed()
+
+    def add(self, book_id, title, author=None, isbn=None, available=True):
+        """
+        Record a committed new book made in this process.
+
+        The record lacks date_added until the change feed re-reads the row.
+        """
+        with self._lock:
+            self._books[book_id] = book_factory(None, (book_id, title, author, isbn, int(available), None))
+            self._ids_by_title[title] = book_id
+            self._changed()
+
+    def close(self):
+        """Stop following the feed and close the cache's connection."""
+        self.feed.unsubscribe(self._apply_changes)
+        self._subscribed = False
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._loaded = False
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_availability_cache(path=config.DATABASE_NAME):
+    """Return this process's availability cache for a database file."""
+    with _caches_lock:
+        entry = _caches.get(path)
+        # Never share the cache's connection with a forked child
+        if entry is None or entry[0] != os.getpid():
+            entry = _caches[path] = (os.getpid(), AvailabilityCache(path))
+        return entry[1]
+
+def app_availability_cache():
+    """Return the availability cache of the current Flask app's database."""
+    from flask import current_app
+    return get_availability_cache(current_app.config['DATABASE'])
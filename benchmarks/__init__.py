@@ -0,0 +1 @@
+# benchmarks package - performance measurement scripts for SmartLib Manager
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Loan Archive Benchmark for SmartLib Manager
+
+Generates a library with several years of loan history, then times the
+queries that read the live borrowed table before and after archive.py
+moves the loans returned more than --days ago to the archive database.
+Reports the size of the live database file (after VACUUM) and the time
+the archive run took, and checks that no loan was lost or counted twice
+and that the daily rollups are unchanged.
+
+Usage:
+    python benchmarks/bench_archive.py [--books N] [--loans N] [--years N] [--days N]
+                                       [--min-time S] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import archive
+import circulation
+import database
+import rollups
+from benchmarks.bench_suite import measure
+from benchmarks.datagen import generate
+
+# Queries of the web app and the Tk client that read the borrowed table
+WORKLOAD = {
+    'library_stats': circulation.library_stats,
+    'list_loans': circulation.list_loans,
+    'list_active_loans': lambda conn: circulation.list_loans(conn, active_only=True),
+    'page_loans': lambda conn: circulation.page_loans(conn, limit=50),
+}
+
+def time_workload(conn, min_time):
+    return {name: measure(lambda: query(conn), min_time)['median_ms'] for name, query in WORKLOAD.items()}
+
+def file_size_mb(conn, path):
+    conn.execute("VACUUM")
+    return round(os.path.getsize(path) / 1e6, 1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the live database before and after archiving old loans")
+    parser.add_argument('--books', type=int, default=20000, help="Books to generate")
+    parser.add_argument('--loans', type=int, default=1000000, help="Loans to generate")
+    parser.add_argument('--years', type=int, default=5, help="Years of loan history")
+    parser.add_argument('--days', type=int, default=365, help="Archive loans returned more than this many days ago")
+    parser.add_argument('--min-time', type=float, default=0.5, help="Seconds to repeat each measurement")
+    parser.add_argument('--json', help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "library_bench.db")
+        today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        print(generate(path, books=args.books, loans=args.loans, years=args.years, end=today))
+        conn = database.connect(path)
+        counts = rollups.daily_counts(conn)
+        size_before = file_size_mb(conn, path)
+        before = time_workload(conn, args.min_time)
+
+        start = time.perf_counter()
+        moved = archive.archive_loans(conn, archive.archive_path(path), args.days)
+        archive_seconds = time.perf_counter() - start
+        live, total, distinct = conn.execute(
+            "SELECT (SELECT COUNT(*) FROM main.borrowed), COUNT(*), COUNT(DISTINCT id) FROM loan_history").fetchone()
+        success = total == distinct == args.loans and rollups.daily_counts(conn) == counts
+        archive.detach_archive(conn)
+        size_after = file_size_mb(conn, path)
+        after = time_workload(conn, args.min_time)
+        conn.close()
+
+    print(f"\nArchived {moved} of {args.loans} loans in {archive_seconds:.2f} s; {live} remain live")
+    print(f"Live database: {size_before} MB -> {size_after} MB")
+    print(f"\n{'query':<20} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for name in WORKLOAD:
+        print(f"{name:<20} {before[name]:10.2f} {after[name]:10.2f} {before[name] / after[name]:7.1f}x")
+    if not success:
+        print("\nFAILED: the live and archived loans do not add up, or the rollups changed")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'moved': moved, 'live': live, 'archive_seconds': round(archive_seconds, 3),
+                       'size_mb': {'before': size_before, 'after': size_after},
+                       'before_ms': before, 'after_ms': after, 'success': success}, f, indent=2)
+    return success
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Batch Circulation Benchmark for SmartLib Manager
+
+Checks out the same set of books twice on a fresh database: once with a
+commit per loan, as the borrow form does, and once with a single call to
+circulation.apply_loan_batch in one transaction, as the write queue runs
+it for /api/v1/loans:batch.
+
+Usage:
+    python benchmarks/bench_batch.py [--loans N] [--synchronous FULL|NORMAL] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import circulation
+import database
+
+def make_connection(path, loans, synchronous):
+    """Create a database with one book per loan and return a connection to it."""
+    database.initialize_database(path)
+    conn = database.connect(path)
+    conn.execute(f"PRAGMA synchronous = {synchronous}")
+    conn.executemany("INSERT INTO books (title, author, isbn) VALUES (?, ?, ?)",
+                     ((f"Book {i:05d}", "Author", str(i)) for i in range(loans)))
+    conn.commit()
+    return conn
+
+def run_individual(conn, loans):
+    start = time.perf_counter()
+    for i in range(loans):
+        circulation.borrow_book(conn, f"Student {i}", f"Book {i:05d}")
+        conn.commit()
+    return time.perf_counter() - start
+
+def run_batch(conn, loans):
+    operations = [{'op': 'borrow', 'student_name': f"Student {i}", 'book_title': f"Book {i:05d}"}
+                  for i in range(loans)]
+    start = time.perf_counter()
+    conn.execute("BEGIN IMMEDIATE")
+    results = circulation.apply_loan_batch(conn, operations)
+    conn.commit()
+    elapsed = time.perf_counter() - start
+    if not all(result['ok'] for result in results):
+        raise RuntimeError("Batch had failed operations")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-loan commits with one batched transaction")
+    parser.add_argument('--loans', type=int, default=500, help="Loans to record")
+    parser.add_argument('--synchronous', default='FULL', choices=['FULL', 'NORMAL'],
+                        help="SQLite synchronous setting; FULL syncs on every commit")
+    parser.add_argument('--json', help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, runner in (('individual', run_individual), ('batch', run_batch)):
+            conn = make_connection(os.path.join(tmp, f"{name}.db"), args.loans, args.synchronous)
+            elapsed = runner(conn, args.loans)
+            conn.close()
+            results[name] = {'loans': args.loans, 'seconds': round(elapsed, 4),
+                             'loans_per_second': round(args.loans / elapsed, 1)}
+            print(f"{name:<10} {elapsed * 1000:9.1f} ms   {args.loans / elapsed:10.1f} loans/s")
+
+    print(f"Speed-up: {results['individual']['seconds'] / results['batch']['seconds']:.1f}x")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return True
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
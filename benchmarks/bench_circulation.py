@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Circulation Load Benchmark for SmartLib Manager
+
+Runs the kiosk workload against the Flask app (app.py) and the ASGI API
+(asgi.py) in-process: every simulated client polls the list of available
+books and, every few requests, borrows and returns its own book. Reports
+requests per second and latency percentiles for both.
+
+Flask clients are threads using the Flask test client; ASGI clients are
+asyncio tasks calling the application directly. Both use a fresh WAL
+database in a temporary directory.
+
+Usage:
+    python benchmarks/bench_circulation.py [--clients N] [--requests N] [--books N] [--json results.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import database
+from app import create_app
+from asgi import CirculationAPI, call_asgi
+
+BENCH_TOKEN = 'bench'
+
+def make_database(path, books):
+    """Create a library database with the given number of books."""
+    database.initialize_database(path)
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO books (title, author, isbn) VALUES (?, ?, ?)",
+                     ((f"Book {i:05d}", f"Author {i % 50}", f"{i:013d}") for i in range(books)))
+    conn.commit()
+    conn.close()
+
+def summarize(name, latencies, errors, elapsed):
+    """Return throughput and latency percentiles (in ms) of one run."""
+    latencies = sorted(latencies)
+    def percentile(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] * 1000, 2)
+    return {
+        'app': name,
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2),
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'p99_ms': percentile(99),
+    }
+
+def run_flask(path, clients, requests, write_every):
+    """Run the workload against the Flask app with one thread per client."""
+    app = create_app({'DATABASE': path, 'SECRET_KEY': 'benchmark', 'TESTING': True})
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def client(n):
+        test_client = app.test_client()
+        test_client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+        title = f"Book {n:05d}"
+        lookup = sqlite3.connect(path)
+        own = []
+        for i in range(requests):
+            start = time.perf_counter()
+            if i % write_every == write_every - 1:
+                loan = lookup.execute("SELECT id FROM borrowed WHERE book_title = ? AND return_date IS NULL",
+                                      (title,)).fetchone()
+                start = time.perf_counter()
+                if loan:
+                    rv = test_client.post('/return_book', data={'borrow_id': loan[0]})
+                else:
+                    rv = test_client.post('/borrow', data={'student_name': f"Student {n}", 'book_title': title})
+            else:
+                rv = test_client.get('/borrow')
+            own.append(time.perf_counter() - start)
+            if rv.status_code >= 400:
+                with lock:
+                    errors[0] += 1
+        lookup.close()
+        with lock:
+            latencies.extend(own)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    database.get_pool(path).close()
+    return summarize('flask', latencies, errors[0], elapsed)
+
+def run_asgi(path, clients, requests, write_every):
+    """Run the workload against the ASGI API with one task per client."""
+    api = CirculationAPI(path, api_token=BENCH_TOKEN)
+    headers = [(b'authorization', f'Bearer {BENCH_TOKEN}'.encode())]
+    latencies = []
+    errors = 0
+
+    async def client(n):
+        nonlocal errors
+        title = f"Book {n:05d}"
+        loan_id = None
+        for i in range(requests):
+            start = time.perf_counter()
+            if i % write_every == write_every - 1:
+                if loan_id is not None:
+                    status, _body = await call_asgi(api, 'POST', '/return', {'borrow_id': loan_id}, headers)
+                    loan_id = None
+                else:
+                    status, body = await call_asgi(api, 'POST', '/borrow',
+                                                   {'student_name': f"Student {n}", 'book_title': title}, headers)
+                    loan_id = body.get('id')
+            else:
+                status, _body = await call_asgi(api, 'GET', '/books?available=1', headers=headers)
+            latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                errors += 1
+
+    async def run():
+        await asyncio.gather(*(client(n) for n in range(clients)))
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    api.close()
+    return summarize('asgi', latencies, errors, elapsed)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the Flask app and the ASGI API under kiosk load")
+    parser.add_argument('--clients', type=int, default=16, help="Concurrent simulated clients")
+    parser.add_argument('--requests', type=int, default=200, help="Requests per client")
+    parser.add_argument('--books', type=int, default=500, help="Books in the test database")
+    parser.add_argument('--write-every', type=int, default=10,
+                        help="Every Nth request of a client is a borrow or return")
+    parser.add_argument('--json', help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, runner in (('flask', run_flask), ('asgi', run_asgi)):
+            path = os.path.join(tmp, f"{name}.db")
+            make_database(path, max(args.books, args.clients))
+            result = runner(path, args.clients, args.requests, args.write_every)
+            results.append(result)
+            print(f"{name:<6} {result['requests_per_second']:9.1f} req/s   "
+                  f"p50 {result['p50_ms']:7.2f} ms   p99 {result['p99_ms']:7.2f} ms   "
+                  f"errors {result['errors']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    return all(result['errors'] == 0 for result in results)
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Password Hashing Benchmark for SmartLib Manager
+
+Times auth.hash_password for a range of scrypt and PBKDF2 costs so
+PASSWORD_SCRYPT_N (or PASSWORD_PBKDF2_ITERATIONS) in config.py can be set
+to the highest cost that still fits the login time budget on the server.
+Also compares checking a signed session token, cached and uncached, with
+a full password login against the users table.
+
+Usage:
+    python benchmarks/bench_password_hash.py [--target-ms MS] [--rounds N] [--json results.json]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import auth
+import config
+
+SCRYPT_COSTS = [2 ** k for k in range(12, 18)]
+PBKDF2_ITERATIONS = [100000, 300000, 600000, 1000000]
+
+def time_call(fn, rounds):
+    """Return the median time of fn() in milliseconds."""
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times[len(times) // 2] * 1000
+
+def bench_methods(rounds):
+    methods = [f'pbkdf2:sha256:{i}' for i in PBKDF2_ITERATIONS]
+    if hasattr(hashlib, 'scrypt'):
+        methods = [f'scrypt:{n}:{config.PASSWORD_SCRYPT_R}:{config.PASSWORD_SCRYPT_P}'
+                   for n in SCRYPT_COSTS] + methods
+    return [{'method': method, 'ms': round(time_call(lambda: auth.hash_password('benchmark', method), rounds), 2)}
+            for method in methods]
+
+def bench_sessions(rounds):
+    conn = sqlite3.connect(":memory:")
+    auth.initialize_users_table(conn)
+    user = auth.authenticate(conn, config.ADMIN_USERNAME, config.ADMIN_PASSWORD)
+    token = auth.issue_token(user, 'benchmark-key')
+    cache = auth.TokenCache()
+
+    def uncached():
+        cache.clear()
+        cache.verify(token, 'benchmark-key')
+
+    results = {
+        'login_ms': time_call(lambda: auth.authenticate(conn, config.ADMIN_USERNAME, config.ADMIN_PASSWORD), rounds),
+        'token_uncached_us': time_call(uncached, rounds * 100) * 1000,
+        'token_cached_us': time_call(lambda: cache.verify(token, 'benchmark-key'), rounds * 100) * 1000,
+    }
+    conn.close()
+    return {name: round(value, 2) for name, value in results.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure password hash costs and session token checks")
+    parser.add_argument('--target-ms', type=float, default=100,
+                        help="Login time budget per password check")
+    parser.add_argument('--rounds', type=int, default=5, help="Timed hashes per cost (median reported)")
+    parser.add_argument('--json', help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    methods = bench_methods(args.rounds)
+    current = auth._method()
+    print(f"{'method':<28} {'ms/hash':>9}")
+    for result in methods:
+        marks = (" <= target" if result['ms'] <= args.target_ms else "") + \
+                (" (configured)" if result['method'] == current else "")
+        print(f"{result['method']:<28} {result['ms']:9.2f}{marks}")
+
+    fitting = [r for r in methods if r['ms'] <= args.target_ms]
+    by_kind = {}
+    for result in fitting:
+        by_kind[result['method'].split(':')[0]] = result['method']
+    for kind, method in by_kind.items():
+        print(f"Highest {kind} cost within {args.target_ms:g} ms: {method}")
+
+    sessions = bench_sessions(args.rounds)
+    print(f"\nLogin with password: {sessions['login_ms']:.2f} ms")
+    print(f"Session token check: {sessions['token_uncached_us']:.2f} us uncached, "
+          f"{sessions['token_cached_us']:.2f} us cached")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'target_ms': args.target_ms, 'configured': current,
+                       'methods': methods, 'sessions': sessions}, f, indent=2)
+    return True
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
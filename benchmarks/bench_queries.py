@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Prepared Query Benchmark for SmartLib Manager
+
+Measures the per-call cost of catalog queries (queries.py) run three ways
+against a generated library:
+
+- connect: open a connection, run the query, close it (how the Tk views
+  used to work); every call connects and prepares the statement anew
+- uncached: one long-lived connection with the statement cache turned
+  off, so every call parses and plans the statement
+- cached: one long-lived connection from database.connect, whose
+  statement cache keeps the catalog queries prepared
+
+Usage:
+    python benchmarks/bench_queries.py [--db library_bench.db | --books N --loans N]
+                                       [--min-time S] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config
+import database
+import queries
+from benchmarks.bench_suite import measure
+from benchmarks.datagen import generate
+
+def catalog_calls(conn):
+    """Return (query name, parameters) of the queries timed, with parameters taken from the data."""
+    title = conn.execute("SELECT title FROM books ORDER BY id LIMIT 1").fetchone()[0]
+    student, loan_title = conn.execute("SELECT student_name, book_title FROM borrowed "
+                                       "WHERE return_date IS NULL LIMIT 1").fetchone()
+    return [
+        ('book_id_by_title', (title,)),
+        ('active_loan_of_student', (student, loan_title)),
+        ('active_titles_of_student', (student,)),
+        ('user_by_username', (config.ADMIN_USERNAME,)),
+        ('count_active_loans', ()),
+        ('page_books', (0, 51)),
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-call cost of catalog queries")
+    parser.add_argument('--db', help="Existing database to use")
+    parser.add_argument('--books', type=int, default=10000, help="Books to generate when --db is not given")
+    parser.add_argument('--loans', type=int, default=100000, help="Loans to generate when --db is not given")
+    parser.add_argument('--min-time', type=float, default=0.3, help="Seconds to repeat each measurement")
+    parser.add_argument('--json', help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db
+        if path is None:
+            path = os.path.join(tmp, "library_bench.db")
+            generate(path, books=args.books, loans=args.loans)
+
+        cached = database.connect(path)
+        uncached = sqlite3.connect(path, cached_statements=0)
+        calls = catalog_calls(cached)
+
+        def on_new_connection(sql, params):
+            conn = sqlite3.connect(path, timeout=config.DATABASE_TIMEOUT)
+            try:
+                return conn.execute(sql, params).fetchall()
+            finally:
+                conn.close()
+
+        print(f"{'query':<26} {'connect us':>11} {'uncached us':>12} {'cached us':>10} {'speedup':>8}")
+        for name, params in calls:
+            sql = queries.CATALOG[name].sql
+            row = {'query': name}
+            for mode, fn in (('connect', lambda: on_new_connection(sql, params)),
+                             ('uncached', lambda: uncached.execute(sql, params).fetchall()),
+                             ('cached', lambda: cached.execute(sql, params).fetchall())):
+                row[f'{mode}_us'] = round(measure(fn, args.min_time)['median_ms'] * 1000, 2)
+            row['speedup'] = round(row['connect_us'] / row['cached_us'], 1)
+            results.append(row)
+            print(f"{name:<26} {row['connect_us']:11.2f} {row['uncached_us']:12.2f} "
+                  f"{row['cached_us']:10.2f} {row['speedup']:7.1f}x")
+        cached.close()
+        uncached.close()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'queries': results}, f, indent=2)
+    return True
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Record Type Benchmark for SmartLib Manager
+
+Loads the books table with a million rows into memory and fetches it back
+with each row type the app could use:
+
+- tuple: sqlite3's default rows, read by position
+- Book: records.Book through records.book_factory, read by name
+- sqlite3.Row: read by name or position
+- dict: one dict per row, read by key
+
+For each, the time to fetch all rows and the memory they hold are
+reported. Memory is measured with tracemalloc in a separate fetch, since
+tracing slows allocation down several times. Fetch time is measured
+twice: with the cyclic garbage collector paused, which is the cost of
+building the rows, and with it running. With it running, a million new
+objects trigger collections over an ever larger heap; the collector stops
+tracking plain tuples of strings and numbers after their first pass, but
+not tuple subclasses such as Book, so that figure grows faster for them
+than for tuples. Book records should stay within --max-overhead of the
+memory of tuples and within --max-slowdown of their fetch time with the
+collector paused.
+
+Usage:
+    python benchmarks/bench_records.py [--rows 1000000] [--max-overhead 0.05]
+                                       [--max-slowdown 1.6] [--json results.json]
+"""
+
+import argparse
+import gc
+import json
+import os
+import sqlite3
+import sys
+import tracemalloc
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import queries
+import records
+
+def dict_factory(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+ROW_TYPES = (
+    ('tuple', None),
+    ('Book', records.book_factory),
+    ('sqlite3.Row', sqlite3.Row),
+    ('dict', dict_factory),
+)
+
+def build_catalog(rows):
+    """Return an in-memory database whose books table holds rows books."""
+    conn = sqlite3.connect(':memory:')
+    conn.execute('''
+        CREATE TABLE books (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL UNIQUE,
+            author TEXT,
+            isbn TEXT,
+            available INTEGER DEFAULT 1,
+            date_added TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.executemany("INSERT INTO books (title, author, isbn, available) VALUES (?, ?, ?, ?)",
+                     ((f"Title {i}", f"Author {i % 5000}", f"978{i:010d}", i % 7 != 0) for i in range(rows)))
+    conn.commit()
+    return conn
+
+def fetch_all(conn, row_factory):
+    cursor = conn.cursor()
+    if row_factory is not None:
+        cursor.row_factory = row_factory
+    return cursor.execute(queries.ALL_BOOKS).fetchall()
+
+def fetch_time(conn, row_factory, collect=False):
+    """Return the seconds taken to fetch the whole catalog, with or without garbage collection."""
+    gc.collect()
+    if not collect:
+        gc.disable()
+    try:
+        start = perf_counter()
+        rows = fetch_all(conn, row_factory)
+        seconds = perf_counter() - start
+    finally:
+        gc.enable()
+    del rows
+    return seconds
+
+def fetch_memory(conn, row_factory):
+    """Return the bytes held by the rows of the whole catalog."""
+    gc.collect()
+    tracemalloc.start()
+    rows = fetch_all(conn, row_factory)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del rows
+    return size
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare memory and fetch time of row types")
+    parser.add_argument('--rows', type=int, default=1000000, help="Books to load")
+    parser.add_argument('--max-overhead', type=float, default=0.05,
+                        help="Largest acceptable extra memory of Book records over tuples, as a fraction")
+    parser.add_argument('--max-slowdown', type=float, default=1.6,
+                        help="Largest acceptable Book/tuple fetch time ratio")
+    parser.add_argument('--json', help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    conn = build_catalog(args.rows)
+    # Untraced warm-up so page cache and statement preparation are not measured
+    conn.execute(queries.ALL_BOOKS).fetchall()
+
+    results = {}
+    print(f"{'row type':<12} {'seconds':>8} {'with gc':>8} {'MB':>9} {'bytes/row':>10}")
+    for name, row_factory in ROW_TYPES:
+        seconds = fetch_time(conn, row_factory)
+        seconds_gc = fetch_time(conn, row_factory, collect=True)
+        size = fetch_memory(conn, row_factory)
+        results[name] = {'seconds': round(seconds, 3), 'seconds_gc': round(seconds_gc, 3),
+                         'mb': round(size / 2 ** 20, 1), 'bytes_per_row': round(size / args.rows, 1)}
+        print(f"{name:<12} {seconds:8.3f} {seconds_gc:8.3f} {size / 2 ** 20:9.1f} {size / args.rows:10.1f}")
+    conn.close()
+
+    slowdown = results['Book']['seconds'] / results['tuple']['seconds']
+    overhead = results['Book']['bytes_per_row'] / results['tuple']['bytes_per_row'] - 1
+    success = overhead <= args.max_overhead and slowdown <= args.max_slowdown
+    print(f"\nBook vs tuple: {slowdown:.2f}x fetch time, {overhead:+.1%} memory")
+    print("PASS" if success else "FAIL")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'rows': args.rows, 'max_overhead': args.max_overhead,
+                       'max_slowdown': args.max_slowdown, 'results': results,
+                       'success': success}, f, indent=2)
+    return success
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
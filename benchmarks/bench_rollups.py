@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Daily Rollup Benchmark for SmartLib Manager
+
+Times the daily circulation time series of a generated library read two
+ways: grouped from the raw borrowed rows, and from the daily rollup
+tables maintained by rollups.py. Both are timed for the whole library
+and for its most borrowed title, and must return the same series. The
+time of a full backfill is reported too.
+
+Usage:
+    python benchmarks/bench_rollups.py [--db library_bench.db | --books N --loans N]
+                                       [--min-time S] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import database
+import rollups
+from benchmarks.bench_suite import measure
+from benchmarks.datagen import generate
+
+# The daily series computed from the loans themselves
+RAW_SERIES = '''
+    SELECT day, SUM(borrows), SUM(returns) FROM (
+        SELECT date(borrow_date) AS day, 1 AS borrows, 0 AS returns FROM borrowed {where}
+        UNION ALL
+        SELECT date(return_date), 0, 1 FROM borrowed {where_returned}
+    ) GROUP BY day ORDER BY day
+'''
+
+def raw_series(conn, book_title=None):
+    if book_title is None:
+        sql = RAW_SERIES.format(where='', where_returned='WHERE return_date IS NOT NULL')
+        return conn.execute(sql).fetchall()
+    sql = RAW_SERIES.format(where='WHERE book_title = ?',
+                            where_returned='WHERE book_title = ? AND return_date IS NOT NULL')
+    return conn.execute(sql, (book_title, book_title)).fetchall()
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare daily time series from raw loans and from rollups")
+    parser.add_argument('--db', help="Existing database to use")
+    parser.add_argument('--books', type=int, default=20000, help="Books to generate when --db is not given")
+    parser.add_argument('--loans', type=int, default=1000000, help="Loans to generate when --db is not given")
+    parser.add_argument('--min-time', type=float, default=0.5, help="Seconds to repeat each measurement")
+    parser.add_argument('--json', help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db
+        if path is None:
+            path = os.path.join(tmp, "library_bench.db")
+            print(generate(path, books=args.books, loans=args.loans))
+        conn = database.connect(path)
+        popular = conn.execute("SELECT book_title FROM daily_book_stats GROUP BY book_title "
+                               "ORDER BY SUM(borrows) DESC LIMIT 1").fetchone()[0]
+
+        results = []
+        success = True
+        print(f"{'series':<16} {'days':>6} {'raw ms':>10} {'rollup ms':>10} {'speedup':>8}")
+        for name, title in (('library', None), ('popular title', popular)):
+            same = raw_series(conn, title) == rollups.daily_counts(conn, book_title=title)
+            success = success and same
+            raw_ms = measure(lambda: raw_series(conn, title), args.min_time, min_rounds=3)['median_ms']
+            rollup_ms = measure(lambda: rollups.daily_counts(conn, book_title=title), args.min_time)['median_ms']
+            days = len(rollups.daily_counts(conn, book_title=title))
+            results.append({'series': name, 'days': days, 'raw_ms': raw_ms, 'rollup_ms': rollup_ms,
+                            'speedup': round(raw_ms / rollup_ms, 1), 'same_result': same})
+            print(f"{name:<16} {days:6d} {raw_ms:10.2f} {rollup_ms:10.2f} {raw_ms / rollup_ms:7.1f}x"
+                  f"{'' if same else '  MISMATCH'}")
+
+        start = time.perf_counter()
+        rollups.backfill(conn)
+        conn.commit()
+        backfill_seconds = time.perf_counter() - start
+        print(f"\nFull backfill: {backfill_seconds:.2f} s")
+        conn.close()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'series': results, 'backfill_seconds': round(backfill_seconds, 3),
+                       'success': success}, f, indent=2)
+    return success
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
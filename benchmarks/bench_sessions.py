@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Session Backend Benchmark for SmartLib Manager
+
+Measures what loading and saving the session costs per request (median) for each
+session backend (Flask's signed cookie, in-memory LRU, SQLite table), for
+requests that only read the session and for requests that change it, and
+the cookie size each backend sends. Then times purging expired sessions
+from a large SQLite session table.
+
+Usage:
+    python benchmarks/bench_sessions.py [--requests N] [--sessions N] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from flask import request
+
+import database
+from app import create_app
+from session_store import SQLiteSessionStore
+
+BACKENDS = ('cookie', 'memory', 'sqlite')
+
+def session_cycle(app, cookie, modify):
+    """Load and save the session of one request; return the seconds it took."""
+    with app.test_request_context('/', headers={'Cookie': cookie}):
+        response = app.response_class()
+        start = time.perf_counter()
+        sess = app.session_interface.open_session(app, request)
+        if modify:
+            sess['hits'] = sess.get('hits', 0) + 1
+        app.session_interface.save_session(app, sess, response)
+        return time.perf_counter() - start
+
+def bench_backend(path, backend, requests):
+    app = create_app({'DATABASE': path, 'SECRET_KEY': 'benchmark', 'SESSION_BACKEND': backend})
+
+    # Start a logged-in sized session and keep its cookie
+    with app.test_request_context('/'):
+        sess = app.session_interface.open_session(app, request)
+        sess.permanent = True
+        sess.update(user_id=1, username='admin', is_admin=True, _flashes=[('info', 'Welcome back')])
+        response = app.response_class()
+        app.session_interface.save_session(app, sess, response)
+        cookie = response.headers['Set-Cookie'].split(';')[0]
+
+    result = {'backend': backend, 'cookie_bytes': len(cookie)}
+    for name, modify in (('read_us', False), ('write_us', True)):
+        times = sorted(session_cycle(app, cookie, modify) for _ in range(requests))
+        result[name] = round(times[len(times) // 2] * 1e6, 1)
+    return result
+
+def bench_purge(path, sessions):
+    store = SQLiteSessionStore(path)
+    now = time.time()
+    store.load('none', now)  # creates the sessions table
+    with database.get_pool(path).connection() as conn:
+        conn.executemany("INSERT INTO sessions (id, data, expires_at) VALUES (?, '{}', ?)",
+                         ((f'sid-{i}', now - 1 if i % 2 else now + 3600) for i in range(sessions)))
+        conn.commit()
+    start = time.perf_counter()
+    removed = store.purge(now)
+    return {'sessions': sessions, 'removed': removed,
+            'purge_ms': round((time.perf_counter() - start) * 1000, 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-request session cost of each backend")
+    parser.add_argument('--requests', type=int, default=2000, help="Requests per measurement")
+    parser.add_argument('--sessions', type=int, default=100000, help="Rows in the purge test")
+    parser.add_argument('--json', help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in BACKENDS:
+            path = os.path.join(tmp, f"{backend}.db")
+            database.initialize_database(path)
+            result = bench_backend(path, backend, args.requests)
+            results.append(result)
+            print(f"{backend:<7} cookie {result['cookie_bytes']:4d} B   "
+                  f"read {result['read_us']:7.1f} us/request   write {result['write_us']:7.1f} us/request")
+            database.get_pool(path).close()
+
+        path = os.path.join(tmp, "purge.db")
+        database.initialize_database(path)
+        purge = bench_purge(path, args.sessions)
+        database.get_pool(path).close()
+    print(f"purge   {purge['removed']} of {purge['sessions']} sessions expired: {purge['purge_ms']:.1f} ms")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'backends': results, 'purge': purge}, f, indent=2)
+    return True
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Catalog Snapshot Benchmark for SmartLib Manager
+
+Loads a generated library into a catalog_snapshot.CatalogSnapshot and
+times each aggregation over it, next to the SQL GROUP BY query that
+answers the same question from the database. The snapshot is loaded once;
+the aggregations together should take less than --budget seconds.
+
+Requires NumPy.
+
+Usage:
+    python benchmarks/bench_snapshot.py [--db library_bench.db | --books N --loans N]
+                                        [--budget S] [--min-time S] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import catalog_snapshot
+import database
+from benchmarks.bench_suite import measure
+from benchmarks.datagen import generate
+
+# The same questions asked of the database directly
+SQL_EQUIVALENTS = {
+    'top_books': "SELECT book_title, COUNT(*) FROM borrowed GROUP BY book_title ORDER BY 2 DESC LIMIT 10",
+    'author_demand': "SELECT author, COUNT(*) FROM borrowed JOIN books ON books.title = borrowed.book_title "
+                     "GROUP BY author ORDER BY 2 DESC",
+    'loans_per_month': "SELECT strftime('%Y-%m', borrow_date), COUNT(*) FROM borrowed GROUP BY 1",
+    'loan_duration_stats': "SELECT COUNT(*), AVG(julianday(return_date) - julianday(borrow_date)) "
+                           "FROM borrowed WHERE return_date IS NOT NULL",
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Time analytics over a columnar catalog snapshot")
+    parser.add_argument('--db', help="Existing database to use")
+    parser.add_argument('--books', type=int, default=20000, help="Books to generate when --db is not given")
+    parser.add_argument('--loans', type=int, default=1000000, help="Loans to generate when --db is not given")
+    parser.add_argument('--budget', type=float, default=1.0, help="Seconds all aggregations may take together")
+    parser.add_argument('--min-time', type=float, default=0.5, help="Seconds to repeat each measurement")
+    parser.add_argument('--json', help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    if not catalog_snapshot.available():
+        print("NumPy is not installed; catalog snapshots are unavailable")
+        return False
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db
+        if path is None:
+            path = os.path.join(tmp, "library_bench.db")
+            print(generate(path, books=args.books, loans=args.loans))
+        conn = database.connect(path)
+
+        start = time.perf_counter()
+        snapshot = catalog_snapshot.load_snapshot(conn)
+        load_seconds = time.perf_counter() - start
+        print(f"Loaded {snapshot.book_count} books and {snapshot.loan_count} loans in {load_seconds:.2f} s "
+              f"({snapshot.nbytes / 2 ** 20:.1f} MB of arrays)\n")
+
+        results = []
+        print(f"{'aggregation':<22} {'snapshot ms':>12} {'SQL ms':>10} {'speedup':>8}")
+        for name, sql in SQL_EQUIVALENTS.items():
+            aggregate = getattr(catalog_snapshot, name)
+            snapshot_ms = measure(lambda: aggregate(snapshot), args.min_time)['median_ms']
+            sql_ms = measure(lambda: conn.execute(sql).fetchall(), args.min_time, min_rounds=3)['median_ms']
+            results.append({'aggregation': name, 'snapshot_ms': snapshot_ms, 'sql_ms': sql_ms,
+                            'speedup': round(sql_ms / snapshot_ms, 1)})
+            print(f"{name:<22} {snapshot_ms:12.2f} {sql_ms:10.2f} {sql_ms / snapshot_ms:7.1f}x")
+        conn.close()
+
+    total = sum(result['snapshot_ms'] for result in results) / 1000
+    success = total < args.budget
+    print(f"\nAll aggregations: {total:.3f} s (budget {args.budget} s) {'PASS' if success else 'FAIL'}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'books': snapshot.book_count, 'loans': snapshot.loan_count,
+                       'load_seconds': round(load_seconds, 3), 'aggregations': results,
+                       'total_seconds': round(total, 3), 'success': success}, f, indent=2)
+    return success
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
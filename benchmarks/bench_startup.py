@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark for SmartLib Manager
+
+Measures cold start of the Flask app (app.py) and the Tk client (main.py)
+with `python -X importtime`, and checks that the imaging stack (qrcode,
+Pillow) is not imported until a QR code is actually needed.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs N] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry points to measure: name -> module imported at start-up
+TARGETS = {
+    'flask': 'app',
+    'tk': 'main',
+}
+
+# Packages that must only be imported lazily, on first QR use
+LAZY_PACKAGES = ('qrcode', 'PIL')
+
+def parse_importtime(stderr):
+    """
+    Parse `-X importtime` output.
+
+    Returns:
+        list: (module name, self time in us, cumulative time in us) tuples;
+              names keep their indentation
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # header line
+        # Nested imports are indented below the module that imported them
+        entries.append((fields[2][1:].rstrip(), int(fields[0]), int(fields[1])))
+    return entries
+
+def measure_import(module, runs=5):
+    """
+    Import a module in fresh interpreters and report its start-up cost.
+
+    Args:
+        module (str): Module to import
+        runs (int): Number of fresh interpreters to start
+
+    Returns:
+        dict: Median wall time and import time, the slowest imports and
+              any lazy packages that were loaded
+    """
+    # Measure a fresh process with a warm bytecode cache, as in a deployment:
+    # allow .pyc files to be written and discard the first run
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    command = [sys.executable, '-X', 'importtime', '-c', f'import {module}']
+    subprocess.run(command, cwd=ROOT, env=env, capture_output=True)
+
+    wall_times = []
+    import_times = []
+    entries = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True)
+        wall_times.append((time.perf_counter() - start) * 1000)
+        if proc.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+        entries = parse_importtime(proc.stderr)
+        import_times.append(sum(cumulative for name, _self, cumulative in entries
+                                if not name.startswith(' ')) / 1000)
+
+    loaded = set(name.strip() for name, _self, _cumulative in entries)
+    slowest = sorted(entries, key=lambda entry: entry[1], reverse=True)[:10]
+    return {
+        'module': module,
+        'runs': runs,
+        'wall_ms': round(statistics.median(wall_times), 2),
+        'import_ms': round(statistics.median(import_times), 2),
+        'modules_loaded': len(loaded),
+        'lazy_packages_loaded': sorted(p for p in LAZY_PACKAGES
+                                       if any(n == p or n.startswith(p + '.') for n in loaded)),
+        'slowest_imports': [{'module': name.strip(), 'self_ms': round(self_us / 1000, 2)}
+                            for name, self_us, _cumulative in slowest],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure start-up import cost of the Flask and Tk entry points")
+    parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters per entry point")
+    parser.add_argument('--json', help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    ok = True
+    for name, module in TARGETS.items():
+        result = measure_import(module, args.runs)
+        results[name] = result
+        print(f"{name:<6} import {module:<5} wall {result['wall_ms']:8.1f} ms   "
+              f"imports {result['import_ms']:8.1f} ms   modules {result['modules_loaded']}")
+        for entry in result['slowest_imports'][:5]:
+            print(f"         {entry['self_ms']:7.2f} ms  {entry['module']}")
+        if result['lazy_packages_loaded']:
+            ok = False
+            print(f"  ❌ imaging packages imported at start-up: {', '.join(result['lazy_packages_loaded'])}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    return ok
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
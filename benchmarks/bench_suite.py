@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite for SmartLib Manager
+
+Times every data-layer operation and web route against a synthetic
+library built by benchmarks/datagen.py, in the manner of pytest-benchmark:
+each benchmark is warmed up, then repeated until it has run for at least
+--min-time seconds and --min-rounds rounds, and min/median/mean/stddev and
+operations per second are reported.
+
+Results are saved as JSON together with the git commit, Python and SQLite
+versions and the data size, and --compare prints the change in median time
+against a saved run, so a commit can be checked for regressions:
+
+    python benchmarks/bench_suite.py --books 100000 --loans 1000000 --json before.json
+    (change the code)
+    python benchmarks/bench_suite.py --books 100000 --loans 1000000 --compare before.json
+
+Data-layer writes (borrow and return) run inside a savepoint that is
+rolled back, so every round sees the same data. The route benchmark that
+borrows and returns through the web app commits, so each round adds one
+returned loan.
+
+Usage:
+    python benchmarks/bench_suite.py [--db library_bench.db | --books N --loans N --students N]
+                                     [--filter TEXT] [--min-time S] [--min-rounds N]
+                                     [--json results.json] [--compare previous.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import circulation
+import database
+from app import create_app
+from availability_cache import AvailabilityCache
+from benchmarks.datagen import generate
+
+def measure(fn, min_time=0.5, min_rounds=5, warmup=1):
+    """
+    Time repeated calls of fn.
+
+    Returns:
+        dict: rounds, min/max/mean/median/stddev in milliseconds and ops per second
+    """
+    for _ in range(warmup):
+        fn()
+    times = []
+    started = time.perf_counter()
+    while len(times) < min_rounds or time.perf_counter() - started < min_time:
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    median = statistics.median(times)
+    return {
+        'rounds': len(times),
+        'min_ms': round(min(times) * 1000, 4),
+        'max_ms': round(max(times) * 1000, 4),
+        'mean_ms': round(statistics.mean(times) * 1000, 4),
+        'median_ms': round(median * 1000, 4),
+        'stddev_ms': round(statistics.stdev(times) * 1000, 4) if len(times) > 1 else 0.0,
+        'ops': round(1 / median, 1) if median else None,
+    }
+
+def _sample(conn):
+    """Pick the rows the benchmarks work on: a popular title, an available one and a middle id."""
+    popular = conn.execute("SELECT book_title FROM borrowed GROUP BY book_title "
+                           "ORDER BY COUNT(*) DESC LIMIT 1").fetchone()
+    available = conn.execute("SELECT title FROM books WHERE available = 1 ORDER BY id LIMIT 1").fetchone()
+    middle = conn.execute("SELECT id FROM books ORDER BY id LIMIT 1 OFFSET "
+                          "(SELECT COUNT(*) / 2 FROM books)").fetchone()
+    return {'popular': popular[0] if popular else available[0], 'available': available[0],
+            'middle_id': middle[0] if middle else 0}
+
+def data_layer_benchmarks(path, sample):
+    """Return (name, callable) pairs for the circulation and cache functions."""
+    conn = database.connect(path)
+    cache = AvailabilityCache(path)
+
+    def borrow_and_return():
+        conn.execute("SAVEPOINT bench")
+        try:
+            loan_id = circulation.borrow_book(conn, "Bench Student", sample['available'])
+            circulation.return_book(conn, loan_id)
+        finally:
+            conn.execute("ROLLBACK TO bench")
+            conn.execute("RELEASE bench")
+
+    return [
+        ('list_books', lambda: circulation.list_books(conn)),
+        ('list_books_available', lambda: circulation.list_books(conn, available_only=True)),
+        ('list_available_titles', lambda: circulation.list_available_titles(conn)),
+        ('list_loans_active', lambda: circulation.list_loans(conn, active_only=True)),
+        ('page_books', lambda: circulation.page_books(conn, after=sample['middle_id'], limit=50)),
+        ('page_loans_active', lambda: circulation.page_loans(conn, limit=50, active_only=True)),
+        ('library_stats', lambda: circulation.library_stats(conn)),
+        ('borrow_and_return', borrow_and_return),
+        ('cache_is_available', lambda: cache.is_available(sample['popular'])),
+        ('cache_available_titles', lambda: cache.available_titles()),
+    ], lambda: (cache.close(), conn.close())
+
+def route_benchmarks(path, sample):
+    """Return (name, callable) pairs for the web routes, as a logged-in user."""
+    app = create_app({'DATABASE': path, 'SECRET_KEY': 'benchmark', 'SESSION_BACKEND': 'memory'})
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+
+    def get(url):
+        def request():
+            response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f"GET {url} answered {response.status_code}")
+        return request
+
+    def borrow_and_return():
+        client.post('/borrow', data={'student_name': 'Bench Student', 'book_title': sample['available']})
+        with database.get_pool(path).connection() as conn:
+            loan_id = conn.execute("SELECT MAX(id) FROM borrowed").fetchone()[0]
+        client.post('/return_book', data={'borrow_id': loan_id})
+
+    title = sample['popular']
+    return [
+        ('GET /dashboard', get('/dashboard')),
+        ('GET /books', get('/books')),
+        ('GET /borrow', get('/borrow')),
+        ('GET /borrowed_books', get('/borrowed_books')),
+        ('GET /api/v1/books', get('/api/v1/books?limit=50')),
+        ('GET /api/v1/loans?active=1', get('/api/v1/loans?active=1&limit=50')),
+        ('GET /api/v1/stats', get('/api/v1/stats')),
+        ('GET /generate_qr', get(f'/generate_qr/{title}?format=png')),
+        ('POST /borrow + /return_book', borrow_and_return),
+    ], lambda: database.get_pool(path).close()
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, previous_path):
+    """Print the change in median time of each benchmark against a saved run."""
+    with open(previous_path) as f:
+        previous = {r['name']: r for r in json.load(f)['benchmarks']}
+    print(f"\nCompared with {previous_path}:")
+    for result in results:
+        old = previous.get(result['name'])
+        if old is None:
+            continue
+        change = (result['median_ms'] - old['median_ms']) / old['median_ms'] * 100 if old['median_ms'] else 0
+        print(f"  {result['name']:<34} {old['median_ms']:10.3f} -> {result['median_ms']:10.3f} ms  {change:+7.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark data-layer operations and web routes")
+    parser.add_argument('--db', help="Existing database to benchmark (route writes add returned loans to it)")
+    parser.add_argument('--books', type=int, default=10000, help="Books to generate when --db is not given")
+    parser.add_argument('--loans', type=int, default=100000, help="Loans to generate when --db is not given")
+    parser.add_argument('--students', type=int, default=2000, help="Students to generate when --db is not given")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--filter', help="Only run benchmarks whose name contains this text")
+    parser.add_argument('--min-time', type=float, default=0.5, help="Seconds to repeat each benchmark")
+    parser.add_argument('--min-rounds', type=int, default=5)
+    parser.add_argument('--json', help="Write results to this JSON file")
+    parser.add_argument('--compare', help="Compare with results saved by an earlier --json run")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db
+        if path is None:
+            path = os.path.join(tmp, "library_bench.db")
+            info = generate(path, books=args.books, students=args.students, loans=args.loans, seed=args.seed)
+            print(f"Generated {info['books']} books and {info['loans']} loans in {info['seconds']} s")
+
+        conn = sqlite3.connect(path)
+        sample = _sample(conn)
+        books, loans = conn.execute("SELECT (SELECT COUNT(*) FROM books), (SELECT COUNT(*) FROM borrowed)").fetchone()
+        conn.close()
+
+        results = []
+        for group, factory in (('data', data_layer_benchmarks), ('route', route_benchmarks)):
+            benchmarks, cleanup = factory(path, sample)
+            for name, fn in benchmarks:
+                if args.filter and args.filter not in name:
+                    continue
+                stats = measure(fn, args.min_time, args.min_rounds)
+                results.append({'group': group, 'name': name, **stats})
+                print(f"{group:<6} {name:<34} median {stats['median_ms']:10.3f} ms   "
+                      f"min {stats['min_ms']:10.3f} ms   {stats['ops']:>10} ops/s   ({stats['rounds']} rounds)")
+            cleanup()
+
+    if args.compare:
+        compare(results, args.compare)
+    if args.json:
+        meta = {'commit': git_commit(), 'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+                'books': books, 'loans': loans, 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        with open(args.json, 'w') as f:
+            json.dump({'meta': meta, 'benchmarks': results}, f, indent=2)
+    return True
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Write Queue Benchmark for SmartLib Manager
+
+Simulates circulation desks writing at the same time. Each desk thread
+borrows and returns its own book repeatedly, either committing on its own
+connection (as the views did before the write queue) or through the
+group-commit write queue. Reports writes per second, latency percentiles
+and "database is locked" errors.
+
+Usage:
+    python benchmarks/bench_write_queue.py [--desks N] [--writes N] [--busy-timeout MS] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import circulation
+import database
+from write_queue import WriteQueue
+
+def make_database(path, desks):
+    database.initialize_database(path)
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO books (title, author, isbn) VALUES (?, ?, ?)",
+                     ((f"Book {i:05d}", "Author", str(i)) for i in range(desks)))
+    conn.commit()
+    conn.close()
+
+def circulate(conn, desk, loan_id):
+    """Borrow the desk's book, or return it if it is out. Returns the open loan id."""
+    if loan_id is None:
+        return circulation.borrow_book(conn, f"Student {desk}", f"Book {desk:05d}")
+    circulation.return_book(conn, loan_id)
+    return None
+
+def run(path, desks, writes, busy_timeout, queued):
+    write_queue = WriteQueue(path) if queued else None
+    latencies = []
+    errors = {'locked': 0, 'other': 0}
+    lock = threading.Lock()
+    barrier = threading.Barrier(desks)
+
+    def desk(n):
+        conn = None
+        if not queued:
+            conn = sqlite3.connect(path, timeout=busy_timeout / 1000, check_same_thread=False)
+            conn.execute("PRAGMA synchronous = NORMAL")
+        loan_id = None
+        own = []
+        barrier.wait()
+        for _ in range(writes):
+            start = time.perf_counter()
+            try:
+                if queued:
+                    loan_id = write_queue.call(circulate, n, loan_id)
+                else:
+                    loan_id = circulate(conn, n, loan_id)
+                    conn.commit()
+            except sqlite3.OperationalError as e:
+                if conn is not None and conn.in_transaction:
+                    conn.rollback()
+                with lock:
+                    errors['locked' if 'locked' in str(e) else 'other'] += 1
+                continue
+            own.append(time.perf_counter() - start)
+        if conn is not None:
+            conn.close()
+        with lock:
+            latencies.extend(own)
+
+    threads = [threading.Thread(target=desk, args=(n,)) for n in range(desks)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    result = {'mode': 'queued' if queued else 'direct', 'writes': len(latencies),
+              'locked_errors': errors['locked'], 'other_errors': errors['other'],
+              'writes_per_second': round(len(latencies) / elapsed, 1)}
+    if latencies:
+        latencies.sort()
+        result['p50_ms'] = round(latencies[len(latencies) // 2] * 1000, 2)
+        result['p99_ms'] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2)
+    if write_queue is not None:
+        write_queue.close()
+        result['commits'] = write_queue.batches
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-request commits with the group-commit write queue")
+    parser.add_argument('--desks', type=int, default=16, help="Concurrent writing threads")
+    parser.add_argument('--writes', type=int, default=200, help="Writes per desk")
+    parser.add_argument('--busy-timeout', type=int, default=100,
+                        help="Lock wait in ms for direct writers before 'database is locked'")
+    parser.add_argument('--json', help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for queued in (False, True):
+            path = os.path.join(tmp, f"{'queued' if queued else 'direct'}.db")
+            make_database(path, args.desks)
+            result = run(path, args.desks, args.writes, args.busy_timeout, queued)
+            results.append(result)
+            print(f"{result['mode']:<7} {result['writes_per_second']:9.1f} writes/s   "
+                  f"p50 {result.get('p50_ms', 0):7.2f} ms   p99 {result.get('p99_ms', 0):7.2f} ms   "
+                  f"locked {result['locked_errors']}"
+                  + (f"   commits {result['commits']}" if 'commits' in result else ""))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return True
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
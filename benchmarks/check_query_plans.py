@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Query Plan Check for SmartLib Manager
+
+Runs EXPLAIN QUERY PLAN on every statement in the query catalog
+(queries.py) against a large generated library, or against a copy of a
+real database, and fails if a hot query scans the books or borrowed
+table. A missing or dropped index shows up here as a full scan long
+before it shows up as a slow desk.
+
+Usage:
+    python benchmarks/check_query_plans.py [--db library.db | --books N --loans N] [--verbose]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import queries
+from benchmarks.datagen import generate
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the query plans of the query catalog")
+    parser.add_argument('--db', help="Database to check; generated if omitted")
+    parser.add_argument('--books', type=int, default=100000, help="Books to generate when --db is not given")
+    parser.add_argument('--loans', type=int, default=1000000, help="Loans to generate when --db is not given")
+    parser.add_argument('--verbose', action='store_true', help="Print the plan of every query")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db
+        if path is None:
+            path = os.path.join(tmp, "library_plans.db")
+            info = generate(path, books=args.books, loans=args.loans)
+            print(f"Generated {info['books']} books and {info['loans']} loans in {info['seconds']} s")
+        conn = sqlite3.connect(path)
+        violations = queries.check_plans(conn)
+        if args.verbose:
+            for query in queries.CATALOG.values():
+                print(f"{query.name:<26} {'hot' if query.hot else '   '}  {'; '.join(queries.explain(conn, query.sql))}")
+        conn.close()
+
+    for name, detail in violations:
+        print(f"FAIL {name}: {detail}")
+    print(f"{len(queries.CATALOG)} queries checked, {len(violations)} full scans in hot queries")
+    return not violations
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Closed-Loop Load Generator for SmartLib Manager
+
+Simulates circulation desks using the web app (app.py) at the same time to
+find where it saturates. Each virtual user logs in and then repeatedly
+picks an action from a weighted mix, sends it, waits for the response and
+(after an optional think time) sends the next one: a closed loop, so the
+offered load rises with the number of users until the server is the
+bottleneck.
+
+Actions:
+    login      POST /login with a fresh session
+    dashboard  GET /dashboard
+    search     GET /api/v1/books, one page of available books from a random position
+    borrow     POST /borrow of a book chosen by Zipf popularity
+    return     POST /return_book of one of the user's open loans
+    qr         GET /generate_qr/<title>?format=png
+
+Requests go through the Flask test client in this process, or over real
+HTTP: --serve starts the app on a free localhost port, --url targets a
+server started separately (e.g. gunicorn wsgi:application -w 4) that
+uses the database given with --db. The loan ids needed for returns are
+looked up in that database outside the timed part of the request.
+
+Reported per action and in total: completed requests per second, latency
+percentiles, and errors split into SQLITE_BUSY (503 from the app's
+"database is locked" handler), other failures, and rejected borrows of
+books that were already out (expected under contention, not errors).
+
+Usage:
+    python benchmarks/loadgen.py [--users N] [--duration S] [--warmup S]
+                                 [--mix login=2,dashboard=20,search=30,borrow=20,return=18,qr=10]
+                                 [--serve | --url http://127.0.0.1:8000] [--db library.db]
+                                 [--books N] [--loans N] [--think-ms MS] [--json results.json]
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from bisect import bisect
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config
+import database
+from app import create_app
+from benchmarks.datagen import generate, zipf_cum_weights
+
+DEFAULT_MIX = 'login=2,dashboard=20,search=30,borrow=20,return=18,qr=10'
+
+def parse_mix(text):
+    """Parse "name=weight,..." into a list of (name, weight)."""
+    mix = []
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in ACTIONS:
+            raise ValueError(f"Unknown action {name.strip()!r}; choose from {', '.join(ACTIONS)}")
+        mix.append((name.strip(), float(weight)))
+    return mix
+
+class FlaskClientTransport:
+    """Requests through the Flask test client, in this process."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, path):
+        return self.client.get(path).status_code, ''
+
+    def post(self, path, data):
+        response = self.client.post(path, data=data)
+        return response.status_code, response.headers.get('Location', '')
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+class HTTPTransport:
+    """Requests over HTTP with a cookie jar of their own, not following redirects."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def _open(self, request):
+        try:
+            with self.opener.open(request, timeout=60) as response:
+                response.read()
+                return response.status, response.headers.get('Location', '')
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code, e.headers.get('Location', '')
+
+    def get(self, path):
+        return self._open(urllib.request.Request(self.base_url + path))
+
+    def post(self, path, data):
+        return self._open(urllib.request.Request(self.base_url + path,
+                                                 data=urllib.parse.urlencode(data).encode()))
+
+class VirtualUser:
+    """One desk: a session, a student name and the loans it has open."""
+
+    def __init__(self, number, transport, library, rng):
+        self.number = number
+        self.transport = transport
+        self.library = library
+        self.rng = rng
+        self.student = f"Load Student {number:04d}"
+        self.open_loans = []
+
+    def login(self):
+        status, location = self.transport.post('/login', {'username': config.ADMIN_USERNAME,
+                                                          'password': config.ADMIN_PASSWORD})
+        return status, status == 302 and 'dashboard' in location
+
+    def dashboard(self):
+        status, _ = self.transport.get('/dashboard')
+        return status, True
+
+    def search(self):
+        after = int(self.rng.random() * self.library.max_book_id)
+        status, _ = self.transport.get(f'/api/v1/books?available=1&limit=20&after={after}')
+        return status, True
+
+    def borrow(self):
+        title = self.library.popular_title(self.rng)
+        before = self.library.last_loan_id()
+        status, location = self.transport.post('/borrow', {'student_name': self.student, 'book_title': title})
+        borrowed = status == 302 and 'borrowed_books' in location
+        if borrowed:
+            return status, True, lambda: self._remember_loan(before)
+        return status, False
+
+    def _remember_loan(self, before):
+        loan_id = self.library.find_loan(before, self.student)
+        if loan_id is not None:
+            self.open_loans.append(loan_id)
+
+    def return_(self):
+        if not self.open_loans:
+            return self.borrow()
+        loan_id = self.open_loans.pop(int(self.rng.random() * len(self.open_loans)))
+        status, location = self.transport.post('/return_book', {'borrow_id': loan_id})
+        return status, True
+
+    def qr(self):
+        title = self.library.popular_title(self.rng)
+        status, _ = self.transport.get(f'/generate_qr/{urllib.parse.quote(title)}?format=png')
+        return status, True
+
+ACTIONS = {
+    'login': VirtualUser.login,
+    'dashboard': VirtualUser.dashboard,
+    'search': VirtualUser.search,
+    'borrow': VirtualUser.borrow,
+    'return': VirtualUser.return_,
+    'qr': VirtualUser.qr,
+}
+
+class Library:
+    """Read-only view of the database the load tool uses to pick books and find loan ids."""
+
+    def __init__(self, path, zipf=1.1):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        self.max_book_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM books").fetchone()[0]
+        self._cum_weights = zipf_cum_weights(max(self.max_book_id, 1), zipf)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = database.connect(self.path)
+        return conn
+
+    def popular_title(self, rng):
+        book_id = bisect(self._cum_weights, rng.random() * self._cum_weights[-1]) + 1
+        row = self._conn().execute("SELECT title FROM books WHERE id <= ? ORDER BY id DESC LIMIT 1",
+                                   (book_id,)).fetchone()
+        return row[0] if row else ''
+
+    def last_loan_id(self):
+        return self._conn().execute("SELECT COALESCE(MAX(id), 0) FROM borrowed").fetchone()[0]
+
+    def find_loan(self, after, student):
+        # A range scan from the id seen before the borrow, not a scan by name
+        row = self._conn().execute("SELECT id FROM borrowed WHERE id > ? AND student_name = ? "
+                                   "AND return_date IS NULL ORDER BY id DESC LIMIT 1",
+                                   (after, student)).fetchone()
+        return row[0] if row else None
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))]
+
+def summarize(name, records, seconds):
+    """Summarize (latency, outcome) records of one action or of all actions."""
+    latencies = sorted(latency for latency, _outcome in records)
+    counts = {outcome: 0 for outcome in ('ok', 'rejected', 'busy', 'error')}
+    for _latency, outcome in records:
+        counts[outcome] += 1
+    result = {'action': name, 'requests': len(records), **counts,
+              'requests_per_second': round(len(records) / seconds, 1) if seconds else 0,
+              'busy_rate': round(counts['busy'] / len(records), 4) if records else 0,
+              'error_rate': round(counts['error'] / len(records), 4) if records else 0}
+    if latencies:
+        result.update({f'p{p}_ms': round(percentile(latencies, p) * 1000, 2) for p in (50, 90, 95, 99)})
+        result['max_ms'] = round(latencies[-1] * 1000, 2)
+    return result
+
+def run(make_transport, library, users, duration, warmup, mix, think, seed):
+    """Run the virtual users and return per-action summaries."""
+    names = [name for name, _weight in mix]
+    weights = [weight for _name, weight in mix]
+    records = {name: [] for name in names}
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(users + 1)
+    timing = {}
+
+    def user(n):
+        rng = random.Random(seed * 100003 + n)
+        vu = VirtualUser(n, make_transport(), library, rng)
+        vu.login()
+        own = {name: [] for name in names}
+        start_barrier.wait()
+        while time.perf_counter() < timing['end']:
+            name = rng.choices(names, weights)[0]
+            began = time.perf_counter()
+            try:
+                result = ACTIONS[name](vu)
+                latency = time.perf_counter() - began
+                status, succeeded = result[0], result[1]
+                if status == 503:
+                    outcome = 'busy'
+                elif status >= 400:
+                    outcome = 'error'
+                else:
+                    outcome = 'ok' if succeeded else 'rejected'
+                if len(result) > 2:
+                    result[2]()  # bookkeeping outside the timed part
+            except sqlite3.OperationalError:
+                latency, outcome = time.perf_counter() - began, 'busy'
+            except Exception:
+                latency, outcome = time.perf_counter() - began, 'error'
+            if began >= timing['measure_from']:
+                own[name].append((latency, outcome))
+            if think:
+                time.sleep(rng.expovariate(1 / think))
+        with lock:
+            for name, values in own.items():
+                records[name].extend(values)
+
+    threads = [threading.Thread(target=user, args=(n,), daemon=True) for n in range(users)]
+    for thread in threads:
+        thread.start()
+    now = time.perf_counter()
+    timing['measure_from'] = now + warmup
+    timing['end'] = now + warmup + duration
+    start_barrier.wait()
+    for thread in threads:
+        thread.join()
+
+    results = [summarize(name, records[name], duration) for name in names]
+    results.append(summarize('total', [r for name in names for r in records[name]], duration))
+    return results
+
+def serve(app):
+    """Start the app on a free localhost port in a background thread; return (server, url)."""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+def main():
+    parser = argparse.ArgumentParser(description="Closed-loop load test of the web app")
+    parser.add_argument('--users', type=int, default=16, help="Concurrent virtual users")
+    parser.add_argument('--duration', type=float, default=20, help="Seconds measured")
+    parser.add_argument('--warmup', type=float, default=3, help="Seconds run before measuring")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="Action weights, name=weight,...")
+    parser.add_argument('--think-ms', type=float, default=0, help="Mean think time between requests")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--serve', action='store_true', help="Serve the app over HTTP on localhost")
+    target.add_argument('--url', help="Base URL of a running server using --db")
+    parser.add_argument('--db', help="Database to use (required with --url); generated if omitted")
+    parser.add_argument('--books', type=int, default=10000, help="Books to generate without --db")
+    parser.add_argument('--loans', type=int, default=100000, help="Loans to generate without --db")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    if args.url and not args.db:
+        parser.error("--url needs --db, the database the server uses")
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db
+        if path is None:
+            path = os.path.join(tmp, "library_load.db")
+            generate(path, books=args.books, loans=args.loans, seed=args.seed)
+        library = Library(path)
+
+        server = None
+        if args.url:
+            mode = 'http'
+            make_transport = lambda: HTTPTransport(args.url)
+        else:
+            app = create_app({'DATABASE': path, 'SECRET_KEY': 'load-test', 'SESSION_BACKEND': 'memory'})
+            if args.serve:
+                server, url = serve(app)
+                mode = 'http'
+                make_transport = lambda: HTTPTransport(url)
+            else:
+                mode = 'test-client'
+                make_transport = lambda: FlaskClientTransport(app)
+
+        print(f"{args.users} users, {mode}, {args.duration:g} s after {args.warmup:g} s warm-up, mix {args.mix}")
+        results = run(make_transport, library, args.users, args.duration, args.warmup,
+                      mix, args.think_ms / 1000, args.seed)
+        if server is not None:
+            server.shutdown()
+        database.get_pool(path).close()
+
+    print(f"{'action':<10} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'ok':>7} {'rejected':>8} {'busy':>6} {'error':>6}")
+    for r in results:
+        print(f"{r['action']:<10} {r['requests_per_second']:8.1f} {r.get('p50_ms', 0):8.2f} "
+              f"{r.get('p95_ms', 0):8.2f} {r.get('p99_ms', 0):8.2f} "
+              f"{r['ok']:7d} {r['rejected']:8d} {r['busy']:6d} {r['error']:6d}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'users': args.users, 'mode': mode, 'duration': args.duration,
+                       'mix': dict(mix), 'results': results}, f, indent=2)
+    total = results[-1]
+    return total['requests'] > 0 and total['error'] == 0
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
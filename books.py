@@ -2,10 +2,14 @@
 import tkinter as tk
 from tkinter import messagebox, ttk
 import sqlite3
-import os
-from qr_module import generate_qr
-from PIL import ImageTk, Image
+from qr_labels import write_label, store_qr_png, render_catalog_qr
+import circulation
 import config
+import database
+import queries
+from change_feed import subscribe_widget, changed_rows
+from records import book_factory
+from tree_rows import TreeRows, select_by_ids
 
 def add_book_ui():
     win = tk.Toplevel()
@@ -71,24 +75,35 @@ def add_book_ui():
             return
 
         try:
-            conn = sqlite3.connect("library.db")
-            c = conn.cursor()
-            
-            # Check if book already exists
-            c.execute("SELECT id FROM books WHERE title = ?", (title,))
-            if c.fetchone():
-                messagebox.showerror("Error", "A book with this title already exists")
-                title_entry.focus()
-                return
-            
-            # Insert new book
-            c.execute("INSERT INTO books (title, author, isbn) VALUES (?, ?, ?)", 
-                     (title, author if author else None, isbn if isbn else None))
-            conn.commit()
-            
-            # Generate QR code
-            qr_filename = f"qr_codes/{title.replace(' ', '_').replace('/', '_')}_qr.png"
-            generate_qr(f"Book: {title}\nAuthor: {author}\nISBN: {isbn}", qr_filename)
+            with database.get_pool(config.DATABASE_NAME).connection() as conn:
+                c = conn.cursor()
+                
+                # Check if book already exists
+                c.execute(queries.BOOK_ID_BY_TITLE, (title,))
+                if c.fetchone():
+                    messagebox.showerror("Error", "A book with this title already exists")
+                    title_entry.focus()
+                    return
+                
+                # Insert new book
+                c.execute(queries.INSERT_BOOK,
+                         (title, author if author else None, isbn if isbn else None))
+                book_id = c.lastrowid
+                conn.commit()
+                
+                # Generate the QR label and catalog PNG once the book is committed,
+                # so a failed save leaves no label file behind
+                try:
+                    qr_filename = write_label(conn, book_id, title, author, isbn, config.QR_CODE_DIRECTORY)
+                    store_qr_png(conn, book_id, render_catalog_qr(title))
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    # qr_labels.migrate_labels generates labels for books left without one
+                    messagebox.showwarning("QR Code Error",
+                                           f"Book '{title}' was added, but its QR code could not be created: {e}")
+                    win.destroy()
+                    return
             
             messagebox.showinfo("Success", f"Book '{title}' added successfully!\nQR code saved as: {qr_filename}")
             win.destroy()
@@ -97,9 +112,6 @@ def add_book_ui():
             messagebox.showerror("Database Error", f"Error saving book: {str(e)}")
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {str(e)}")
-        finally:
-            if conn:
-                conn.close()
     
     def on_enter(event):
         save_book()
@@ -157,36 +169,49 @@ def view_books_ui():
     tree.pack(side="left", fill="both", expand=True)
     scrollbar.pack(side="right", fill="y")
     
+    # Rows are keyed by book id so changes can be applied one item at a time
+    rows = TreeRows(tree, sort_key=lambda values: values[1])
+    
+    def book_row(book):
+        # Format the data
+        author = book.author if book.author else "N/A"
+        isbn = book.isbn if book.isbn else "N/A"
+        available_text = "No" if book.is_borrowed else "Yes"
+        date_added = book.date_added.split()[0] if book.date_added else "N/A"  # Show only date part
+        return book.id, (book.id, book.title, author, isbn, available_text, date_added)
+    
     # Load books data
     def load_books():
-        # Clear existing data
-        for item in tree.get_children():
-            tree.delete(item)
-        
         try:
-            conn = sqlite3.connect("library.db")
-            c = conn.cursor()
-            c.execute("SELECT id, title, author, isbn, available, date_added FROM books ORDER BY title")
-            books = c.fetchall()
-            
-            for book in books:
-                # Format the data
-                book_id, title, author, isbn, available, date_added = book
-                author = author if author else "N/A"
-                isbn = isbn if isbn else "N/A"
-                available_text = "Yes" if available else "No"
-                date_added = date_added.split()[0] if date_added else "N/A"  # Show only date part
-                
-                tree.insert("", "end", values=(book_id, title, author, isbn, available_text, date_added))
+            with database.get_pool(config.DATABASE_NAME).connection() as conn:
+                books = circulation.fetch_records(conn, book_factory, queries.ALL_BOOKS)
+            rows.reset(book_row(book) for book in books)
             
             # Update status
-            status_label.config(text=f"Total books: {len(books)}")
+            status_label.config(text=f"Total books: {len(rows)}")
             
         except sqlite3.Error as e:
             messagebox.showerror("Database Error", f"Error loading books: {str(e)}")
-        finally:
-            if conn:
-                conn.close()
+    
+    # Apply only the books that changed since the last refresh
+    def apply_changes(changes):
+        if changes is None:
+            load_books()
+            return
+        upserts, deletes = changed_rows(changes, 'books')
+        try:
+            with database.get_pool(config.DATABASE_NAME).connection() as conn:
+                books = select_by_ids(conn, queries.BOOKS_BY_IDS, upserts, book_factory)
+            rows.apply((book_row(book) for book in books), upserts | deletes)
+            status_label.config(text=f"Total books: {len(rows)}")
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Error loading books: {str(e)}")
+    
+    def refresh():
+        try:
+            feed.poll(force=True)
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Error refreshing books: {str(e)}")
     
     # Status frame
     status_frame = tk.Frame(main_frame)
@@ -199,10 +224,13 @@ def view_books_ui():
     button_frame = tk.Frame(status_frame)
     button_frame.pack(side="right")
     
-    tk.Button(button_frame, text="Refresh", command=load_books, 
+    tk.Button(button_frame, text="Refresh", command=refresh, 
               font=("Arial", 10), bg="#3498db", fg="white").pack(side="left", padx=5)
     tk.Button(button_frame, text="Close", command=win.destroy, 
               font=("Arial", 10), bg="#95a5a6", fg="white").pack(side="left", padx=5)
     
+    # Follow changes made in this or another client
+    feed = subscribe_widget(win, apply_changes, ('books',))
+    
     # Load initial data
     load_books()
@@ -2,8 +2,14 @@
 import tkinter as tk
 from tkinter import messagebox, ttk
 import sqlite3
-from datetime import datetime
 import config
+import circulation
+import database
+import queries
+from availability_cache import get_availability_cache
+from change_feed import subscribe_widget, changed_rows
+from records import loan_factory
+from tree_rows import TreeRows, select_by_ids
 
 def borrow_ui():
     win = tk.Toplevel()
@@ -53,10 +59,7 @@ def borrow_ui():
     # Load available books
     def load_available_books():
         try:
-            conn = sqlite3.connect("library.db")
-            c = conn.cursor()
-            c.execute("SELECT title FROM books WHERE available = 1 ORDER BY title")
-            books = [row[0] for row in c.fetchall()]
+            books = get_availability_cache(config.DATABASE_NAME).available_titles()
             btitle['values'] = books
             if books:
                 btitle.set("Select a book...")
@@ -64,9 +67,6 @@ def borrow_ui():
                 btitle.set("No books available")
         except sqlite3.Error as e:
             messagebox.showerror("Database Error", f"Error loading books: {str(e)}")
-        finally:
-            if conn:
-                conn.close()
     
     load_available_books()
     
@@ -90,40 +90,28 @@ def borrow_ui():
             return
         
         try:
-            conn = sqlite3.connect("library.db")
-            c = conn.cursor()
-            
-            # Check if book is still available
-            c.execute("SELECT available FROM books WHERE title = ?", (book_title,))
-            result = c.fetchone()
-            if not result or result[0] == 0:
-                messagebox.showerror("Error", "This book is no longer available")
-                load_available_books()  # Refresh the list
-                return
-            
-            # Check if student already borrowed this book
-            c.execute("SELECT id FROM borrowed WHERE student_name = ? AND book_title = ? AND return_date IS NULL", 
-                     (student_name, book_title))
-            if c.fetchone():
-                messagebox.showerror("Error", "This student has already borrowed this book")
-                return
-            
-            # Record the borrowing
-            c.execute("INSERT INTO borrowed (student_name, book_title) VALUES (?, ?)", 
-                     (student_name, book_title))
-            
-            # Mark book as unavailable
-            c.execute("UPDATE books SET available = 0 WHERE title = ?", (book_title,))
-            
-            conn.commit()
+            with database.get_pool(config.DATABASE_NAME).connection() as conn:
+                # Check if student already borrowed this book
+                if conn.execute(queries.ACTIVE_LOAN_OF_STUDENT, (student_name, book_title)).fetchone():
+                    messagebox.showerror("Error", "This student has already borrowed this book")
+                    return
+                
+                # Mark the book unavailable and record the borrowing, unless
+                # someone else borrowed it since the list was loaded
+                try:
+                    circulation.borrow_book(conn, student_name, book_title)
+                except circulation.CirculationError:
+                    messagebox.showerror("Error", "This book is no longer available")
+                    load_available_books()  # Refresh the list
+                    return
+                
+                conn.commit()
+            get_availability_cache(config.DATABASE_NAME).set_available(book_title, False)
             messagebox.showinfo("Success", f"Book '{book_title}' borrowed by {student_name}")
             win.destroy()
             
         except sqlite3.Error as e:
             messagebox.showerror("Database Error", f"Error processing borrow request: {str(e)}")
-        finally:
-            if conn:
-                conn.close()
     
     def on_enter(event):
         borrow()
@@ -194,11 +182,8 @@ def return_ui():
             return
         
         try:
-            conn = sqlite3.connect("library.db")
-            c = conn.cursor()
-            c.execute("SELECT book_title FROM borrowed WHERE student_name = ? AND return_date IS NULL", 
-                     (student_name,))
-            books = [row[0] for row in c.fetchall()]
+            with database.get_pool(config.DATABASE_NAME).connection() as conn:
+                books = [row[0] for row in conn.execute(queries.ACTIVE_TITLES_OF_STUDENT, (student_name,))]
             btitle['values'] = books
             if books:
                 btitle.set("Select a book...")
@@ -206,9 +191,6 @@ def return_ui():
                 btitle.set("No borrowed books found")
         except sqlite3.Error as e:
             messagebox.showerror("Database Error", f"Error loading borrowed books: {str(e)}")
-        finally:
-            if conn:
-                conn.close()
     
     # Bind student name entry to load books
     def on_student_change(event):
@@ -235,34 +217,22 @@ def return_ui():
             return
         
         try:
-            conn = sqlite3.connect("library.db")
-            c = conn.cursor()
-            
-            # Check if the borrowing record exists
-            c.execute("SELECT id FROM borrowed WHERE student_name = ? AND book_title = ? AND return_date IS NULL", 
-                     (student_name, book_title))
-            borrow_record = c.fetchone()
-            
-            if not borrow_record:
-                messagebox.showerror("Error", "No active borrowing record found for this student and book")
-                return
-            
-            # Update the borrowing record with return date
-            c.execute("UPDATE borrowed SET return_date = ? WHERE id = ?", 
-                     (datetime.now().isoformat(), borrow_record[0]))
-            
-            # Mark book as available
-            c.execute("UPDATE books SET available = 1 WHERE title = ?", (book_title,))
-            
-            conn.commit()
+            with database.get_pool(config.DATABASE_NAME).connection() as conn:
+                # Find the student's open loan of the book and close it
+                borrow_record = conn.execute(queries.ACTIVE_LOAN_OF_STUDENT, (student_name, book_title)).fetchone()
+                
+                if not borrow_record:
+                    messagebox.showerror("Error", "No active borrowing record found for this student and book")
+                    return
+                
+                circulation.return_book(conn, borrow_record[0])
+                conn.commit()
+            get_availability_cache(config.DATABASE_NAME).set_available(book_title, True)
             messagebox.showinfo("Success", f"Book '{book_title}' returned by {student_name}")
             win.destroy()
             
         except sqlite3.Error as e:
             messagebox.showerror("Database Error", f"Error processing return: {str(e)}")
-        finally:
-            if conn:
-                conn.close()
     
     def on_enter(event):
         ret()
@@ -318,44 +288,51 @@ def view_borrowed_books_ui():
     tree.pack(side="left", fill="both", expand=True)
     scrollbar.pack(side="right", fill="y")
     
+    # Rows are keyed by loan id so changes can be applied one item at a time
+    rows = TreeRows(tree, sort_key=lambda values: values[5], reverse=True)
+    
+    def loan_row(loan):
+        borrowed_at = loan.borrowed_at
+        days_borrowed = loan.days_borrowed if borrowed_at else "N/A"
+        formatted_date = borrowed_at.strftime("%Y-%m-%d %H:%M") if borrowed_at else loan.borrow_date
+        
+        # The raw borrow date is kept as a hidden last value to sort by
+        return loan.id, (loan.id, loan.student_name, loan.book_title, formatted_date, days_borrowed,
+                         loan.borrow_date)
+    
     # Load borrowed books data
     def load_borrowed_books():
-        # Clear existing data
-        for item in tree.get_children():
-            tree.delete(item)
-        
         try:
-            conn = sqlite3.connect("library.db")
-            c = conn.cursor()
-            c.execute("SELECT id, student_name, book_title, borrow_date FROM borrowed WHERE return_date IS NULL ORDER BY borrow_date DESC")
-            borrowed_books = c.fetchall()
-            
-            for book in borrowed_books:
-                book_id, student_name, book_title, borrow_date = book
-                
-                # Calculate days borrowed
-                try:
-                    borrow_datetime = datetime.fromisoformat(borrow_date)
-                    days_borrowed = (datetime.now() - borrow_datetime).days
-                except:
-                    days_borrowed = "N/A"
-                
-                # Format borrow date
-                try:
-                    formatted_date = datetime.fromisoformat(borrow_date).strftime("%Y-%m-%d %H:%M")
-                except:
-                    formatted_date = borrow_date
-                
-                tree.insert("", "end", values=(book_id, student_name, book_title, formatted_date, days_borrowed))
+            with database.get_pool(config.DATABASE_NAME).connection() as conn:
+                borrowed_books = circulation.fetch_records(conn, loan_factory, queries.ACTIVE_LOANS)
+            rows.reset(loan_row(loan) for loan in borrowed_books)
             
             # Update status
-            status_label.config(text=f"Total borrowed books: {len(borrowed_books)}")
+            status_label.config(text=f"Total borrowed books: {len(rows)}")
             
         except sqlite3.Error as e:
             messagebox.showerror("Database Error", f"Error loading borrowed books: {str(e)}")
-        finally:
-            if conn:
-                conn.close()
+    
+    # Apply only the loans that changed since the last refresh; returned
+    # loans no longer match the query and are removed
+    def apply_changes(changes):
+        if changes is None:
+            load_borrowed_books()
+            return
+        upserts, deletes = changed_rows(changes, 'borrowed')
+        try:
+            with database.get_pool(config.DATABASE_NAME).connection() as conn:
+                loans = select_by_ids(conn, queries.ACTIVE_LOANS_BY_IDS, upserts, loan_factory)
+            rows.apply((loan_row(loan) for loan in loans), upserts | deletes)
+            status_label.config(text=f"Total borrowed books: {len(rows)}")
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Error loading borrowed books: {str(e)}")
+    
+    def refresh():
+        try:
+            feed.poll(force=True)
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Error refreshing borrowed books: {str(e)}")
     
     # Status frame
     status_frame = tk.Frame(main_frame)
@@ -368,10 +345,13 @@ def view_borrowed_books_ui():
     button_frame = tk.Frame(status_frame)
     button_frame.pack(side="right")
     
-    tk.Button(button_frame, text="Refresh", command=load_borrowed_books, 
+    tk.Button(button_frame, text="Refresh", command=refresh, 
               font=("Arial", 10), bg="#3498db", fg="white").pack(side="left", padx=5)
     tk.Button(button_frame, text="Close", command=win.destroy, 
               font=("Arial", 10), bg="#95a5a6", fg="white").pack(side="left", padx=5)
     
+    # Follow changes made in this or another client
+    feed = subscribe_widget(win, apply_changes, ('borrowed',))
+    
     # Load initial data
     load_borrowed_books()
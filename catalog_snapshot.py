@@ -0,0 +1,306 @@
+# catalog_snapshot.py
+"""
+Columnar in-memory snapshot of the catalog and loan history, for analytics.
+
+Reporting questions (most borrowed books, loans per month, loan lengths,
+how busy books are, how many loans run late) each need every row of the borrowed table. load_snapshot reads books and
+loans once, in fetchmany chunks, into NumPy arrays: integer ids, epoch
+second timestamps, and categorical codes for students and authors, whose
+names are stored once each. The aggregation functions below then run as
+vectorized NumPy operations over the arrays instead of Python loops over
+rows, so they take milliseconds for millions of loans.
+
+Loans refer to books by position in the book arrays (-1 for a title that
+is not in the catalog); both tables are read in one transaction, so they
+are consistent with each other and with the change counters saved in the
+snapshot, which tell whether it is still current.
+
+NumPy is optional: the rest of the application runs without it, and
+load_snapshot raises RuntimeError if it is not installed.
+benchmarks/bench_snapshot.py measures loading and aggregating.
+"""
+
+from datetime import datetime, timezone
+
+try:
+    import numpy as np
+except ImportError:  # snapshots need NumPy; available() reports whether it is installed
+    np = None
+
+import config
+import database
+import queries
+
+# Return time of loans still out, as selected by queries.SNAPSHOT_LOANS
+NOT_RETURNED = -1
+
+SECONDS_PER_DAY = 86400
+
+def available():
+    """Return True if NumPy is installed and snapshots can be loaded."""
+    return np is not None
+
+class CatalogSnapshot:
+    """
+    Books and loans as parallel NumPy arrays.
+
+    Attributes:
+        book_ids (ndarray): int64 book ids, ascending
+        book_titles (list): Title of each book
+        book_authors (ndarray): int32 code of each book's author in authors
+        book_available (ndarray): bool, whether each book is on the shelf
+        authors (list): Author names by code; None for books without one
+        loan_ids (ndarray): int64 loan ids, ascending
+        loan_books (ndarray): int32 position of each loan's book, or -1
+        loan_students (ndarray): int32 code of each loan's student in students
+        loan_borrowed (ndarray): int64 borrow times, epoch seconds (UTC)
+        loan_returned (ndarray): int64 return times, or NOT_RETURNED
+        students (list): Student names by code
+        versions (tuple): Change counters of books and borrowed when read
+        taken_at (int): Epoch seconds at which the snapshot was read
+    """
+
+    def __init__(self, books, loans, authors, students, versions, taken_at):
+        (self.book_ids, self.book_titles, self.book_authors, self.book_available) = books
+        (self.loan_ids, self.loan_books, self.loan_students, self.loan_borrowed,
+         self.loan_returned) = loans
+        self.authors = authors
+        self.students = students
+        self.versions = versions
+        self.taken_at = taken_at
+
+    @property
+    def book_count(self):
+        return len(self.book_ids)
+
+    @property
+    def loan_count(self):
+        return len(self.loan_ids)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the NumPy arrays (names not included)."""
+        return sum(array.nbytes for array in (
+            self.book_ids, self.book_authors, self.book_available, self.loan_ids, self.loan_books,
+            self.loan_students, self.loan_borrowed, self.loan_returned))
+
+def _chunks(cursor, size):
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+def _encode(values, codes):
+    # Codes are assigned in order of first appearance
+    return [codes.setdefault(value, len(codes)) for value in values]
+
+def _concatenate(parts, dtype):
+    return np.concatenate(parts).astype(dtype, copy=False) if parts else np.empty(0, dtype=dtype)
+
+def load_snapshot(conn, chunk_size=config.SNAPSHOT_CHUNK):
+    """
+    Read the books and borrowed tables into a CatalogSnapshot.
+
+    Args:
+        conn (sqlite3.Connection): Open connection with no transaction in progress
+        chunk_size (int): Rows per fetchmany call
+
+    Raises:
+        RuntimeError: If NumPy is not installed
+
+    Returns:
+        CatalogSnapshot: The snapshot
+    """
+    if np is None:
+        raise RuntimeError("Catalog snapshots require NumPy (pip install numpy)")
+
+    # One read transaction: in WAL mode both tables are read as of the same commit
+    conn.execute("BEGIN")
+    try:
+        taken_at = int(datetime.now(timezone.utc).timestamp())
+        versions = database.table_versions(conn, database.VERSIONED_TABLES)
+
+        book_ids, book_authors, book_available, book_titles = [], [], [], []
+        author_codes = {}
+        for rows in _chunks(conn.execute(queries.SNAPSHOT_BOOKS), chunk_size):
+            ids, titles, authors, shelved = zip(*rows)
+            book_ids.append(np.array(ids, dtype=np.int64))
+            book_titles.extend(titles)
+            book_authors.append(np.array(_encode(authors, author_codes), dtype=np.int32))
+            book_available.append(np.array(shelved, dtype=bool))
+
+        positions = {title: position for position, title in enumerate(book_titles)}
+        loan_ids, loan_books, loan_students, loan_borrowed, loan_returned = [], [], [], [], []
+        student_codes = {}
+        for rows in _chunks(conn.execute(queries.SNAPSHOT_LOANS), chunk_size):
+            ids, students, titles, borrowed, returned = zip(*rows)
+            loan_ids.append(np.array(ids, dtype=np.int64))
+            loan_students.append(np.array(_encode(students, student_codes), dtype=np.int32))
+            loan_books.append(np.array([positions.get(title, -1) for title in titles], dtype=np.int32))
+            loan_borrowed.append(np.array(borrowed, dtype=np.int64))
+            loan_returned.append(np.array(returned, dtype=np.int64))
+    finally:
+        conn.rollback()
+
+    books = (_concatenate(book_ids, np.int64), book_titles, _concatenate(book_authors, np.int32),
+             _concatenate(book_available, bool))
+    loans = (_concatenate(loan_ids, np.int64), _concatenate(loan_books, np.int32),
+             _concatenate(loan_students, np.int32), _concatenate(loan_borrowed, np.int64),
+             _concatenate(loan_returned, np.int64))
+    return CatalogSnapshot(books, loans, list(author_codes), list(student_codes), versions, taken_at)
+
+def _loans_since(snapshot, since):
+    """Return the positions of loans borrowed at or after since (epoch seconds), or all if None."""
+    if since is None:
+        return slice(None)
+    return snapshot.loan_borrowed >= since
+
+def _descending(counts):
+    """Return the positions of counts from largest to smallest count, ties by position."""
+    return np.lexsort((np.arange(len(counts)), -counts))
+
+def top_books(snapshot, n=10, since=None):
+    """
+    Return the most borrowed books.
+
+    Args:
+        snapshot (CatalogSnapshot): Snapshot to aggregate
+        n (int): Number of books to return
+        since (int): Only count loans borrowed from this time on (epoch seconds)
+
+    Returns:
+        list: (title, author, loans) tuples, most loans first
+    """
+    books = snapshot.loan_books[_loans_since(snapshot, since)]
+    counts = np.bincount(books[books >= 0], minlength=snapshot.book_count)
+    top = _descending(counts)[:n]
+    return [(snapshot.book_titles[book], snapshot.authors[snapshot.book_authors[book]], int(counts[book]))
+            for book in top if counts[book]]
+
+def author_demand(snapshot, n=None, since=None):
+    """
+    Return loans and distinct books borrowed per author.
+
+    Returns:
+        list: (author, loans, books in the catalog) tuples, most loans
+              first; author is None for books without one
+    """
+    books = snapshot.loan_books[_loans_since(snapshot, since)]
+    authors = snapshot.book_authors[books[books >= 0]]
+    loans = np.bincount(authors, minlength=len(snapshot.authors))
+    titles = np.bincount(snapshot.book_authors, minlength=len(snapshot.authors))
+    order = _descending(loans)[:n]
+    return [(snapshot.authors[author], int(loans[author]), int(titles[author])) for author in order]
+
+def _months(borrowed):
+    """Return borrow times as months since 1970."""
+    return borrowed.astype('datetime64[s]').astype('datetime64[M]').astype(np.int64)
+
+def _month_name(month):
+    return str(np.datetime64(int(month), 'M'))
+
+def loans_per_month(snapshot):
+    """
+    Return the number of loans started in each month.
+
+    Returns:
+        list: ('YYYY-MM', loans) tuples in month order, for months with loans
+    """
+    if not snapshot.loan_count:
+        return []
+    # Counted with bincount over month offsets rather than sorted by np.unique
+    months = _months(snapshot.loan_borrowed)
+    first = months.min()
+    counts = np.bincount(months - first)
+    return [(_month_name(first + offset), int(counts[offset])) for offset in np.flatnonzero(counts)]
+
+def overdue_by_month(snapshot, borrow_period_days=config.DEFAULT_BORROW_PERIOD_DAYS, since=None, now=None):
+    """
+    Return how many of the loans started in each month ran past their due date.
+
+    A loan is overdue if it was returned, or is still out at now (epoch
+    seconds, by default when the snapshot was taken), more than
+    borrow_period_days after it started.
+
+    Returns:
+        list: ('YYYY-MM', loans, overdue loans, overdue fraction) tuples in
+              month order, for months with loans
+    """
+    selected = _loans_since(snapshot, since)
+    borrowed = snapshot.loan_borrowed[selected]
+    if not len(borrowed):
+        return []
+    returned = snapshot.loan_returned[selected]
+    ended = np.where(returned == NOT_RETURNED, snapshot.taken_at if now is None else now, returned)
+    overdue = ended - borrowed > borrow_period_days * SECONDS_PER_DAY
+    months = _months(borrowed)
+    first = months.min()
+    loans = np.bincount(months - first)
+    late = np.bincount(months - first, weights=overdue, minlength=len(loans))
+    return [(_month_name(first + offset), int(loans[offset]), int(late[offset]),
+             float(late[offset] / loans[offset])) for offset in np.flatnonzero(loans)]
+
+def utilization(snapshot, n=10, since=None, now=None):
+    """
+    Return the fraction of time books spent on loan.
+
+    Each book's loans are clipped to the window from since to now; a book
+    that was out for the whole window has a utilization of 1.
+
+    Args:
+        snapshot (CatalogSnapshot): Snapshot to aggregate
+        n (int): Number of busiest books to return
+        since (int): Start of the window (epoch seconds); defaults to the
+                     first loan
+        now (int): End of the window (epoch seconds); defaults to when the
+                   snapshot was taken
+
+    Returns:
+        dict: 'utilization', the mean over all books; 'idle_books', books
+              never out during the window; 'busiest', (title, author,
+              utilization) tuples of the n busiest books
+    """
+    if now is None:
+        now = snapshot.taken_at
+    if since is None:
+        since = int(snapshot.loan_borrowed.min()) if snapshot.loan_count else now
+    window = now - since
+    if window <= 0 or not snapshot.book_count:
+        return {'utilization': 0.0, 'idle_books': snapshot.book_count, 'busiest': []}
+
+    ended = np.where(snapshot.loan_returned == NOT_RETURNED, now, snapshot.loan_returned)
+    out = np.minimum(ended, now) - np.maximum(snapshot.loan_borrowed, since)
+    known = (snapshot.loan_books >= 0) & (out > 0)
+    seconds = np.bincount(snapshot.loan_books[known], weights=out[known], minlength=snapshot.book_count)
+    fraction = np.minimum(seconds / window, 1.0)
+    busiest = _descending(fraction)[:n]
+    return {
+        'utilization': float(fraction.mean()),
+        'idle_books': int((fraction == 0).sum()),
+        'busiest': [(snapshot.book_titles[book], snapshot.authors[snapshot.book_authors[book]],
+                     float(fraction[book])) for book in busiest if fraction[book]],
+    }
+
+def loan_durations(snapshot, since=None):
+    """Return the lengths of returned loans, in days, as a float array."""
+    selected = _loans_since(snapshot, since)
+    borrowed = snapshot.loan_borrowed[selected]
+    returned = snapshot.loan_returned[selected]
+    done = returned != NOT_RETURNED
+    return (returned[done] - borrowed[done]) / SECONDS_PER_DAY
+
+def loan_duration_stats(snapshot, percentiles=(50, 90, 99), since=None):
+    """
+    Summarize how long returned loans lasted.
+
+    Returns:
+        dict: 'count', 'mean_days' and 'p<N>_days' for each percentile;
+              the day figures are None when no loan has been returned
+    """
+    days = loan_durations(snapshot, since)
+    stats = {'count': int(len(days)), 'mean_days': float(days.mean()) if len(days) else None}
+    values = np.percentile(days, percentiles) if len(days) else [None] * len(percentiles)
+    for percentile, value in zip(percentiles, values):
+        stats[f'p{percentile}_days'] = None if value is None else float(value)
+    return stats
@@ -0,0 +1,223 @@
+# change_feed.py
+"""
+Change notifications shared by the Tk client and the web app.
+
+Triggers on the books and borrowed tables append one row per inserted,
+updated or deleted record to the changes table, whose ids only ever grow.
+A ChangeFeed remembers the last change id it has seen and, when polled,
+hands subscribers the changes made since then by any process. Polling is
+cheap when nothing happened: PRAGMA data_version only moves when another
+connection commits, and the log is only read when it does.
+
+The feed has no thread of its own. The web app polls it from a
+before_request hook, at most once per feed interval, so its caches see
+writes by the Tk client and other workers even when no cached view is
+read; the Tk client polls it from the event loop with root.after, so Tk
+callbacks run on the Tk thread.
+
+If a feed falls behind the oldest retained change, or the database has no
+change log, subscribers receive None instead of a list and should reload
+everything.
+
+Every feed also keeps the log bounded: after seeing prune_interval new
+changes, it deletes all but the most recent retention ones, so the log
+does not grow for as long as a web worker or Tk client runs.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+import config
+import database
+
+Change = namedtuple('Change', ['id', 'table', 'row_id', 'op'])
+
+def latest_change_id(conn):
+    """Return the id of the most recent change, 0 if there is none, or None without a log."""
+    try:
+        return conn.execute("SELECT COALESCE(MAX(id), 0) FROM changes").fetchone()[0]
+    except sqlite3.OperationalError:
+        return None
+
+def changes_since(conn, after_id, tables=database.CHANGE_TABLES):
+    """
+    Return the changes made after a given change id.
+
+    Args:
+        conn (sqlite3.Connection): Open database connection
+        after_id (int): Last change id already seen
+        tables (tuple): Tables to report changes for
+
+    Returns:
+        list or None: Change tuples in order, or None if the log is missing
+                      or changes after after_id have already been pruned
+    """
+    try:
+        oldest = conn.execute("SELECT MIN(id) FROM changes").fetchone()[0]
+        if oldest is not None and oldest > after_id + 1:
+            return None
+        rows = conn.execute(
+            f"SELECT id, table_name, row_id, op FROM changes "
+            f"WHERE id > ? AND table_name IN ({', '.join('?' * len(tables))}) ORDER BY id",
+            (after_id,) + tuple(tables)).fetchall()
+    except sqlite3.OperationalError:
+        return None
+    return [Change(*row) for row in rows]
+
+def changed_rows(changes, table):
+    """
+    Collapse changes to one table into the rows to reload and to remove.
+
+    Returns:
+        tuple: (set of row ids to insert or update, set of row ids deleted)
+    """
+    upserts, deletes = set(), set()
+    for change in changes:
+        if change.table != table:
+            continue
+        if change.op == 'delete':
+            upserts.discard(change.row_id)
+            deletes.add(change.row_id)
+        else:
+            deletes.discard(change.row_id)
+            upserts.add(change.row_id)
+    return upserts, deletes
+
+class ChangeFeed:
+    """Polls one database for changes and dispatches them to subscribers."""
+
+    def __init__(self, path=config.DATABASE_NAME, interval=config.CHANGE_FEED_INTERVAL,
+                 retention=config.CHANGE_LOG_RETENTION, prune_interval=config.CHANGE_LOG_PRUNE_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.retention = retention
+        self.prune_interval = prune_interval
+        self.last_id = None
+        self._pruned_id = 0
+        self._lock = threading.RLock()
+        self._conn = None
+        self._data_version = None
+        self._polled_at = None
+        self._subscribers = []
+
+    def subscribe(self, callback, tables=database.CHANGE_TABLES):
+        """
+        Call callback(changes) with new changes to the given tables.
+
+        changes is a list of Change tuples, or None when the subscriber
+        should reload everything.
+        """
+        with self._lock:
+            self._subscribers.append((callback, tuple(tables)))
+
+    def unsubscribe(self, callback):
+        """Stop calling a subscribed callback."""
+        with self._lock:
+            self._subscribers = [(cb, tables) for cb, tables in self._subscribers if cb != callback]
+
+    def poll_due(self):
+        """Return True if poll() would look at the database now."""
+        return self._polled_at is None or time.monotonic() - self._polled_at >= self.interval
+
+    def poll(self, force=False):
+        """
+        Dispatch changes committed since the last poll.
+
+        Polls at most once per interval unless force is set.
+
+        Returns:
+            int: Number of changes dispatched (0 also when a reload was signalled)
+        """
+        with self._lock:
+            if not force and not self.poll_due():
+                return 0
+            self._polled_at = time.monotonic()
+            if self._conn is None:
+                self._conn = database.connect(self.path)
+                self.last_id = latest_change_id(self._conn)
+                self._pruned_id = self.last_id or 0
+                self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+                return 0
+
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version and not force:
+                return 0
+            self._data_version = data_version
+
+            changes = changes_since(self._conn, self.last_id) if self.last_id is not None else None
+            if changes is None:
+                self.last_id = latest_change_id(self._conn)
+            elif not changes:
+                return 0
+            else:
+                self.last_id = changes[-1].id
+            if self.last_id is not None and self.last_id - self._pruned_id >= self.prune_interval:
+                self._prune()
+            self._dispatch(changes)
+            return len(changes or ())
+
+    def _prune(self):
+        self._pruned_id = self.last_id
+        try:
+            database.prune_changes(self._conn, self.retention)
+            self._conn.commit()
+        except sqlite3.OperationalError:
+            # Busy or no log: the next prune interval tries again
+            self._conn.rollback()
+
+    def _dispatch(self, changes):
+        error = None
+        for callback, tables in list(self._subscribers):
+            selected = None if changes is None else [c for c in changes if c.table in tables]
+            if selected == []:
+                continue
+            try:
+                callback(selected)
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+    def close(self):
+        """Close the feed's connection; the next poll starts from the latest change."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._polled_at = None
+
+_feeds = {}
+_feeds_lock = threading.Lock()
+
+def get_change_feed(path=config.DATABASE_NAME):
+    """Return this process's change feed for a database file."""
+    with _feeds_lock:
+        entry = _feeds.get(path)
+        # A forked child must not share the parent's connection
+        if entry is None or entry[0] != os.getpid():
+            entry = _feeds[path] = (os.getpid(), ChangeFeed(path))
+        return entry[1]
+
+def subscribe_widget(widget, callback, tables=database.CHANGE_TABLES, path=config.DATABASE_NAME):
+    """
+    Subscribe callback to this process's feed until a Tk widget is destroyed.
+
+    Returns:
+        ChangeFeed: The feed, so the widget can poll it on demand
+    """
+    feed = get_change_feed(path)
+    if feed.last_id is None:
+        # Fix the feed's position before the widget loads its first rows
+        feed.poll(force=True)
+    feed.subscribe(callback, tables)
+
+    def on_destroy(event):
+        # <Destroy> is also delivered for every child of the widget
+        if event.widget is widget:
+            feed.unsubscribe(callback)
+
+    widget.bind('<Destroy>', on_destroy, add='+')
+    return feed
@@ -0,0 +1,212 @@
+# circulation.py
+"""
+Circulation operations shared by the Flask app and the ASGI API.
+
+Every function takes an open connection and leaves committing to the
+caller, so the same operations can run one per request or several inside a
+single transaction. Failures that should be shown to the user are raised
+as CirculationError.
+"""
+
+import sqlite3
+
+import config
+import queries
+from queries import BOOK_COLUMNS, LOAN_COLUMNS
+from records import book_factory, loan_factory
+
+STATS_FIELDS = ('total_books', 'available_books', 'borrowed_books', 'total_loans', 'overdue_loans')
+
+class CirculationError(Exception):
+    """A borrow or return request that cannot be carried out."""
+
+def fetch_records(conn, row_factory, query, parameters=()):
+    """Run a query on a new cursor of conn and return its rows built by row_factory."""
+    cursor = conn.cursor()
+    cursor.row_factory = row_factory
+    return cursor.execute(query, parameters).fetchall()
+
+def list_books(conn, available_only=False):
+    """
+    Return all books, newest first.
+
+    Args:
+        conn (sqlite3.Connection): Open database connection
+        available_only (bool): Only return books that are on the shelf
+
+    Returns:
+        list: records.Book records
+    """
+    query = queries.LIST_AVAILABLE_BOOKS if available_only else queries.LIST_BOOKS
+    return fetch_records(conn, book_factory, query)
+
+def list_available_titles(conn):
+    """Return the titles of all books that can be borrowed, alphabetically."""
+    return [row[0] for row in conn.execute(queries.LIST_AVAILABLE_TITLES)]
+
+def list_loans(conn, active_only=False):
+    """
+    Return loans, most recent first.
+
+    Args:
+        conn (sqlite3.Connection): Open database connection
+        active_only (bool): Only return books that have not been returned
+
+    Returns:
+        list: records.Loan records
+    """
+    query = queries.LIST_ACTIVE_LOANS if active_only else queries.LIST_LOANS
+    return fetch_records(conn, loan_factory, query)
+
+def _page(conn, table, columns, where, after, limit):
+    # Keyset pagination: seek past the last id of the previous page through
+    # the primary key instead of skipping rows with OFFSET
+    selected = list(columns) if 'id' in columns else ['id'] + list(columns)
+    query = queries.page_query(table, selected, where)
+    rows = conn.execute(query, (after or 0, limit + 1)).fetchall()
+
+    next_after = rows[limit - 1][0] if len(rows) > limit else None
+    offset = 0 if 'id' in columns else 1
+    return [row[offset:] for row in rows[:limit]], next_after
+
+def page_books(conn, columns=BOOK_COLUMNS, after=None, limit=50, available_only=False):
+    """
+    Return one page of books in id order.
+
+    Args:
+        conn (sqlite3.Connection): Open database connection
+        columns (tuple): Columns to return, a subset of BOOK_COLUMNS
+        after (int): Id of the last book of the previous page
+        limit (int): Maximum number of books to return
+        available_only (bool): Only return books that are on the shelf
+
+    Returns:
+        tuple: (list of row tuples in the order of columns,
+                id to pass as after for the next page, or None)
+    """
+    if not set(columns) <= set(BOOK_COLUMNS):
+        raise ValueError(f"Unknown book fields: {', '.join(sorted(set(columns) - set(BOOK_COLUMNS)))}")
+    where = ["available = 1"] if available_only else []
+    return _page(conn, 'books', columns, where, after, limit)
+
+def page_loans(conn, columns=LOAN_COLUMNS, after=None, limit=50, active_only=False):
+    """
+    Return one page of loans in id order.
+
+    Arguments and return value are as for page_books, with columns taken
+    from LOAN_COLUMNS and active_only selecting unreturned loans.
+    """
+    if not set(columns) <= set(LOAN_COLUMNS):
+        raise ValueError(f"Unknown loan fields: {', '.join(sorted(set(columns) - set(LOAN_COLUMNS)))}")
+    where = ["return_date IS NULL"] if active_only else []
+    return _page(conn, 'borrowed', columns, where, after, limit)
+
+def library_stats(conn, borrow_period_days=config.DEFAULT_BORROW_PERIOD_DAYS):
+    """
+    Return catalog and circulation counts in one query.
+
+    Loans still out after borrow_period_days count as overdue.
+
+    Returns:
+        dict: Counts keyed by the names in STATS_FIELDS
+    """
+    row = conn.execute(queries.LIBRARY_STATS, (f'-{int(borrow_period_days)} days',)).fetchone()
+    return dict(zip(STATS_FIELDS, row))
+
+def add_book(conn, title, author, isbn):
+    """
+    Add a book to the catalog.
+
+    Raises:
+        sqlite3.IntegrityError: If a book with the same title exists
+
+    Returns:
+        int: The id of the new book
+    """
+    c = conn.execute(queries.INSERT_BOOK, (title, author, isbn))
+    return c.lastrowid
+
+def borrow_book(conn, student_name, book_title):
+    """
+    Lend a book to a student.
+
+    The book is marked unavailable with a conditional UPDATE, so two
+    concurrent requests for the same copy cannot both succeed.
+
+    Raises:
+        CirculationError: If the book does not exist or is already on loan
+
+    Returns:
+        int: The id of the new loan
+    """
+    c = conn.execute(queries.MARK_BOOK_BORROWED, (book_title,))
+    if c.rowcount == 0:
+        raise CirculationError('Book is not available for borrowing')
+    c = conn.execute(queries.INSERT_LOAN, (student_name, book_title))
+    return c.lastrowid
+
+def return_book(conn, borrow_id):
+    """
+    Record the return of a loan and put the book back on the shelf.
+
+    Raises:
+        CirculationError: If there is no open loan with this id
+
+    Returns:
+        str: The title of the returned book
+    """
+    row = conn.execute(queries.ACTIVE_LOAN_TITLE, (borrow_id,)).fetchone()
+    if not row:
+        raise CirculationError('Invalid borrow record')
+    conn.execute(queries.CLOSE_LOAN, (borrow_id,))
+    conn.execute(queries.MARK_BOOK_RETURNED, (row[0],))
+    return row[0]
+
+def apply_loan_batch(conn, operations):
+    """
+    Apply many borrow and return operations as one write.
+
+    Submit the whole batch as a single write queue job, so it takes the
+    write lock once and costs one commit. Each operation runs in its own
+    savepoint: an operation that fails is undone and reported without
+    affecting the others.
+
+    Args:
+        conn (sqlite3.Connection): Open database connection
+        operations (list): Dicts with 'op' set to 'borrow' (with
+                           'student_name' and 'book_title') or 'return'
+                           (with 'borrow_id')
+
+    Returns:
+        list: One result dict per operation, in order, with 'ok' and
+              either the loan 'id' and 'book_title' or an 'error' message
+    """
+    results = []
+    for operation in operations:
+        conn.execute("SAVEPOINT loan_op")
+        try:
+            results.append(_apply_loan_operation(conn, operation))
+            conn.execute("RELEASE loan_op")
+        except (CirculationError, ValueError, sqlite3.IntegrityError) as e:
+            conn.execute("ROLLBACK TO loan_op")
+            conn.execute("RELEASE loan_op")
+            results.append({'ok': False, 'error': str(e)})
+    return results
+
+def _apply_loan_operation(conn, operation):
+    if not isinstance(operation, dict):
+        raise ValueError('Operation must be an object')
+    op = operation.get('op')
+    if op == 'borrow':
+        student_name = str(operation.get('student_name') or '').strip()
+        book_title = str(operation.get('book_title') or '').strip()
+        if not student_name or not book_title:
+            raise ValueError('Student name and book title are required')
+        loan_id = borrow_book(conn, student_name, book_title)
+        return {'ok': True, 'id': loan_id, 'book_title': book_title}
+    if op == 'return':
+        borrow_id = operation.get('borrow_id')
+        if not isinstance(borrow_id, int) or isinstance(borrow_id, bool):
+            raise ValueError('borrow_id must be an integer')
+        return {'ok': True, 'id': borrow_id, 'book_title': return_book(conn, borrow_id)}
+    raise ValueError("op must be 'borrow' or 'return'")
@@ -7,12 +7,39 @@ ADMIN_PASSWORD = "admin123"
 
 # Database Configuration
 DATABASE_NAME = "library.db"
+DATABASE_TIMEOUT = 30  # seconds to wait for locks and pooled connections
+DATABASE_POOL_SIZE = 5  # connections per worker process
+DATABASE_STATEMENT_CACHE = 256  # prepared statements kept per connection (sqlite3 default: 128)
+WRITE_QUEUE_DELAY = 0  # extra seconds the writer waits to grow a batch
+WRITE_QUEUE_MAX_BATCH = 200  # writes per group commit
+CHANGE_FEED_INTERVAL = 0.5  # seconds between checks for changes by other processes
+CHANGE_LOG_RETENTION = 100000  # most recent row changes kept in the changes table
+CHANGE_LOG_PRUNE_INTERVAL = 10000  # changes a feed sees between prunes of the changes table
+ARCHIVE_HORIZON_DAYS = 730  # loans returned longer ago than this are moved to the archive database
+ARCHIVE_BATCH_SIZE = 5000  # loans moved per transaction by archive.py
+
+# Monitoring
+REQUEST_METRICS = True  # Server-Timing headers and /metrics on the web app
+SLOW_QUERY_THRESHOLD = 0.1  # seconds; slower SQL statements are logged to LOG_FILE
+
+# Analytics
+SNAPSHOT_CHUNK = 50000  # rows fetched at a time when loading a catalog snapshot
+ANALYTICS_WINDOW_DAYS = 365  # default report window, in days
+ANALYTICS_MAX_WINDOW_DAYS = ARCHIVE_HORIZON_DAYS  # reports read live loans; older ones may be archived
+ANALYTICS_TOP_N = 10  # books and authors listed in the rankings
+ANALYTICS_CACHE_TTL = 300  # seconds a report is reused while the tables are unchanged
 
 # QR Code Configuration
 QR_CODE_DIRECTORY = "qr_codes"
 QR_CODE_SIZE = 10
 QR_CODE_BORDER = 4
 
+# API Configuration
+API_PAGE_SIZE = 50  # default items per page
+API_MAX_PAGE_SIZE = 500
+API_GZIP_MIN_SIZE = 500  # bytes; smaller responses are sent uncompressed
+API_MAX_BATCH_SIZE = 1000  # operations per /api/v1/loans:batch request
+
 # Application Settings
 APP_TITLE = "SMARTLIB MANAGER"
 APP_VERSION = "1.0.0"
@@ -38,11 +65,27 @@ FONT_SIZE_NORMAL = 10
 FONT_SIZE_SMALL = 8
 
 # Security Settings
-MAX_LOGIN_ATTEMPTS = 3
+SECRET_KEY_FILE = ".secret_key"  # used when SMARTLIB_SECRET_KEY is not set
+MAX_LOGIN_ATTEMPTS = 3  # failed logins per username within LOGIN_ATTEMPT_WINDOW
+MAX_LOGIN_ATTEMPTS_PER_IP = 20  # failed logins per client address (shared lab PCs, NAT)
+LOGIN_ATTEMPT_WINDOW = 300  # seconds a failed login counts against the limits
+LOGIN_THROTTLE_BACKEND = "memory"  # or "sqlite" to share counts between worker processes
+LOGIN_THROTTLE_MAX_KEYS = 100000  # in-memory usernames/addresses tracked before pruning
+PASSWORD_HASH_METHOD = "scrypt"  # or "pbkdf2"; tune with benchmarks/bench_password_hash.py
+PASSWORD_SCRYPT_N = 2 ** 14  # scrypt CPU/memory cost; about 70 ms per hash when benchmarked
+PASSWORD_SCRYPT_R = 8
+PASSWORD_SCRYPT_P = 1
+PASSWORD_PBKDF2_ITERATIONS = 600000  # used when method is pbkdf2 or scrypt is unavailable
+SESSION_TOKEN_CACHE_SIZE = 10000  # verified API session tokens kept in memory
 SESSION_TIMEOUT = 3600  # 1 hour in seconds
+SESSION_BACKEND = "sqlite"  # "sqlite" (shared by workers), "memory" (one worker) or "cookie"
+SESSION_MEMORY_SIZE = 10000  # sessions kept by the memory backend
+SESSION_TOUCH_INTERVAL = 60  # seconds before an unchanged session's expiry is extended
+SESSION_PURGE_INTERVAL = 300  # seconds between deletions of expired sessions
+SESSION_PURGE_BATCH = 500  # expired sessions deleted per transaction
 
 # File Paths
-LOG_FILE = "library_system.log"
+LOG_FILE = "library_system.log"  # also receives slow queries from the web app
 BACKUP_DIRECTORY = "backups"
 
 # Validation Rules
@@ -53,4 +96,5 @@ MAX_ISBN_LENGTH = 20
 
 # Default Values
 DEFAULT_BORROW_PERIOD_DAYS = 14
+DUE_SOON_DAYS = 3  # loans due within this many days are flagged
 MAX_BOOKS_PER_STUDENT = 3
@@ -0,0 +1,364 @@
+# database.py
+"""
+Database access shared by the web app, its workers and the command line tools.
+
+Connections are pooled per process and per database file. Pools notice when
+they are used in a forked child and start over, so a pre-fork server never
+shares an SQLite connection between processes. The schema is created once,
+idempotently, under an exclusive file lock, and the database runs in WAL
+mode so many workers can read while one writes.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import auth
+import config
+from qr_labels import initialize_manifest_table, initialize_blob_table
+from rollups import initialize_rollups
+
+try:
+    import fcntl
+except ImportError:  # Windows: schema creation relies on SQLite's own locking
+    fcntl = None
+
+def connect(path=config.DATABASE_NAME):
+    """
+    Open a new connection with the settings used throughout the application.
+
+    Connections are meant to be long-lived (pooled): each keeps the last
+    DATABASE_STATEMENT_CACHE statements prepared, so running a catalog
+    query (queries.py) again skips parsing and planning it.
+
+    Args:
+        path (str): Path of the database file
+
+    Returns:
+        sqlite3.Connection: The new connection
+    """
+    conn = sqlite3.connect(path, timeout=config.DATABASE_TIMEOUT, check_same_thread=False,
+                           cached_statements=config.DATABASE_STATEMENT_CACHE)
+    conn.execute(f"PRAGMA busy_timeout = {int(config.DATABASE_TIMEOUT * 1000)}")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+class ConnectionPool:
+    """
+    A per-process pool of connections to one database file.
+
+    Connections are created lazily on first use. If the pool is used in a
+    different process than the one that created its connections (after a
+    fork), the inherited connections are dropped without being touched.
+    """
+
+    def __init__(self, path, size=config.DATABASE_POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._created = 0
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+
+    def acquire(self):
+        """Take a connection from the pool, opening a new one if none is idle."""
+        self._check_pid()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return connect(self.path)
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._idle.get(timeout=config.DATABASE_TIMEOUT)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Timed out waiting for a database connection")
+
+    def release(self, conn):
+        """Return a connection to the pool, rolling back any open transaction."""
+        if self._pid != os.getpid():
+            return
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Context manager yielding a pooled connection."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Close all idle connections owned by this process."""
+        if self._pid != os.getpid():
+            self._reset()
+            return
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(path=config.DATABASE_NAME, size=config.DATABASE_POOL_SIZE, role=None):
+    """
+    Return this process's connection pool for a database file.
+
+    Components that take a connection while their request may already
+    hold one from the main pool (server-side sessions, the login
+    throttle) pass a role and get a pool of their own: drawing from the
+    main pool, a request could wait for the connection it holds itself.
+
+    Args:
+        path (str): Path of the database file
+        size (int): Connections of a newly created pool
+        role (str): Name of a separate pool for the same file
+    """
+    key = path if role is None else f"{path}#{role}"
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(path, size)
+    return pool
+
+def get_db():
+    """
+    Return the pooled connection of the current Flask request.
+
+    The connection is taken from the pool of the app's DATABASE on first
+    use and given back by close_db when the app context ends. While
+    request_metrics measures the request, its statements are traced.
+    """
+    from flask import g, current_app
+    from request_metrics import TracedConnection, current_stats
+    if 'db' not in g:
+        pool = get_pool(current_app.config['DATABASE'], current_app.config['DATABASE_POOL_SIZE'])
+        g.db_pool = pool
+        conn = g.db_connection = pool.acquire()
+        stats = current_stats()
+        g.db = conn if stats is None else TracedConnection(conn, stats)
+    return g.db
+
+def close_db(exception=None):
+    """Return the request's connection to the pool."""
+    from flask import g
+    g.pop('db', None)
+    conn = g.pop('db_connection', None)
+    if conn is not None:
+        g.pop('db_pool').release(conn)
+
+@contextmanager
+def _file_lock(path):
+    """Hold an exclusive lock on path + '.lock' across processes."""
+    if fcntl is None:
+        yield
+        return
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def initialize_schema(conn):
+    """Create all tables used by the web application if they do not exist."""
+    c = conn.cursor()
+
+    # Create users table (shared with the Tk client) and the default admin
+    auth.initialize_users_table(conn)
+
+    # Create books table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS books (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL UNIQUE,
+            author TEXT,
+            isbn TEXT,
+            available INTEGER DEFAULT 1,
+            date_added TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Create borrowed books table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS borrowed (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_name TEXT NOT NULL,
+            book_title TEXT NOT NULL,
+            borrow_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            return_date TIMESTAMP,
+            FOREIGN KEY (book_title) REFERENCES books (title)
+        )
+    ''')
+
+    # Create QR label manifest and pre-rendered QR tables
+    initialize_manifest_table(conn)
+    initialize_blob_table(conn)
+
+    initialize_indexes(conn)
+    initialize_change_counters(conn)
+    initialize_change_log(conn)
+    initialize_rollups(conn)
+
+# Partial indexes over the loans still out: active-loan lookups, counts and
+# listings read only these entries, however long the loan history grows.
+# queries.check_plans verifies that hot queries use them.
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_borrowed_active ON borrowed (borrow_date) WHERE return_date IS NULL",
+    "CREATE INDEX IF NOT EXISTS idx_borrowed_active_student "
+    "ON borrowed (student_name, book_title) WHERE return_date IS NULL",
+)
+
+def initialize_indexes(conn):
+    """Create the indexes of the books and borrowed tables."""
+    for statement in INDEXES:
+        conn.execute(statement)
+
+# Tables whose changes are counted for cache validation (API ETags)
+VERSIONED_TABLES = ('books', 'borrowed')
+
+def initialize_change_counters(conn):
+    """
+    Create the table_versions table and the triggers that maintain it.
+
+    Every insert, update or delete on a versioned table bumps its counter,
+    whichever program made the change, so a counter that has not moved
+    means the table is unchanged.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS table_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    for table in VERSIONED_TABLES:
+        conn.execute("INSERT OR IGNORE INTO table_versions (name) VALUES (?)", (table,))
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE table_versions SET version = version + 1 WHERE name = '{table}';
+                END
+            ''')
+
+# Tables whose row changes are logged
+CHANGE_TABLES = ('books', 'borrowed')
+
+def initialize_change_log(conn):
+    """Create the changes table and the triggers that fill it."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS changes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    for table in CHANGE_TABLES:
+        for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_change_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN
+                    INSERT INTO changes (table_name, row_id, op)
+                    VALUES ('{table}', {row}.id, '{event.lower()}');
+                END
+            ''')
+
+def prune_changes(conn, keep=config.CHANGE_LOG_RETENTION):
+    """Delete all but the most recent keep changes. The caller commits."""
+    conn.execute("DELETE FROM changes WHERE id <= (SELECT MAX(id) FROM changes) - ?", (keep,))
+
+def table_versions(conn, tables):
+    """
+    Return the change counters of the given tables.
+
+    Returns:
+        tuple or None: One counter per table, or None if the database has
+                       no change counters
+    """
+    try:
+        rows = dict(conn.execute(
+            f"SELECT name, version FROM table_versions WHERE name IN ({', '.join('?' * len(tables))})",
+            tuple(tables)).fetchall())
+    except sqlite3.OperationalError:
+        return None
+    if len(rows) != len(tables):
+        return None
+    return tuple(rows[table] for table in tables)
+
+def initialize_database(path=config.DATABASE_NAME):
+    """
+    Create the schema and switch the database to WAL mode.
+
+    Safe to call from every worker at start-up: it runs under an exclusive
+    file lock, is idempotent, and closes its connection before returning,
+    so nothing is left open to be inherited by forked workers.
+    """
+    with _file_lock(path):
+        conn = connect(path)
+        try:
+            conn.execute("PRAGMA journal_mode = WAL")
+            initialize_schema(conn)
+            prune_changes(conn)
+            conn.commit()
+        finally:
+            conn.close()
+
+def load_secret_key(path=config.SECRET_KEY_FILE):
+    """
+    Return the session signing key shared by all workers.
+
+    The key comes from the SMARTLIB_SECRET_KEY environment variable, or
+    from a key file that is created with a random key on first use.
+    """
+    key = os.environ.get('SMARTLIB_SECRET_KEY')
+    if key:
+        return key
+    if not os.path.exists(path):
+        # Write the key to a private file, then link it into place so that
+        # concurrent workers never see a partially written key
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(os.urandom(32).hex())
+        try:
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(tmp_path)
+    with open(path) as f:
+        return f.read().strip()
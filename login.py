@@ -1,33 +1,19 @@
 # login.py
 import tkinter as tk
 from tkinter import messagebox, ttk
-import sqlite3
-import hashlib
+import math
 import config
+import auth
+import database
+import queries
+from login_throttle import get_login_throttle
 
 def initialize_users_table():
     """Initialize users table for registration system"""
     try:
-        conn = sqlite3.connect(config.DATABASE_NAME)
-        c = conn.cursor()
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                email TEXT,
-                role TEXT DEFAULT 'user',
-                created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Insert default admin if not exists
-        admin_hash = hashlib.sha256(config.ADMIN_PASSWORD.encode()).hexdigest()
-        c.execute("INSERT OR IGNORE INTO users (username, password_hash, role) VALUES (?, ?, ?)",
-                 (config.ADMIN_USERNAME, admin_hash, 'admin'))
-        
-        conn.commit()
-        conn.close()
+        with database.get_pool(config.DATABASE_NAME).connection() as conn:
+            auth.initialize_users_table(conn)
+            conn.commit()
     except Exception as e:
         print(f"Error initializing users table: {e}")
 
@@ -85,29 +71,33 @@ def show_login(callback):
             messagebox.showerror("Login Failed", "Please enter both username and password")
             return
         
+        # Refuse throttled attempts before spending time on the password hash
+        throttle = get_login_throttle(config.DATABASE_NAME)
+        wait = throttle.retry_after(user)
+        if wait:
+            messagebox.showerror("Login Failed",
+                                 f"Too many failed login attempts. Try again in {math.ceil(wait)} seconds.")
+            login_password_entry.delete(0, tk.END)
+            return
+        
         try:
-            conn = sqlite3.connect(config.DATABASE_NAME)
-            c = conn.cursor()
-            
-            # Hash the entered password
-            pwd_hash = hashlib.sha256(pwd.encode()).hexdigest()
-            
             # Check credentials in database
-            c.execute("SELECT role FROM users WHERE username = ? AND password_hash = ?", (user, pwd_hash))
-            result = c.fetchone()
+            with database.get_pool(config.DATABASE_NAME).connection() as conn:
+                result = auth.authenticate(conn, user, pwd)
+                conn.commit()  # keeps a rehashed legacy password
             
             if result:
-                role = result[0]
+                throttle.reset(user)
+                role = 'admin' if result['is_admin'] else 'user'
                 messagebox.showinfo("Login", f"Login Successful! Welcome {user} ({role})")
                 login_window.destroy()
                 callback()
             else:
+                throttle.record_failure(user)
                 messagebox.showerror("Login Failed", "Invalid credentials")
                 login_password_entry.delete(0, tk.END)  # Clear password field
                 login_username_entry.focus()
             
-            conn.close()
-            
         except Exception as e:
             messagebox.showerror("Error", f"Database error: {e}")
             login_password_entry.delete(0, tk.END)
@@ -178,23 +168,15 @@ def show_login(callback):
             return
         
         try:
-            conn = sqlite3.connect(config.DATABASE_NAME)
-            c = conn.cursor()
-            
-            # Check if username already exists
-            c.execute("SELECT username FROM users WHERE username = ?", (username,))
-            if c.fetchone():
-                messagebox.showerror("Registration Failed", "Username already exists")
-                conn.close()
-                return
-            
-            # Hash password and insert user
-            pwd_hash = hashlib.sha256(password.encode()).hexdigest()
-            c.execute("INSERT INTO users (username, password_hash, email) VALUES (?, ?, ?)",
-                     (username, pwd_hash, email if email else None))
-            
-            conn.commit()
-            conn.close()
+            with database.get_pool(config.DATABASE_NAME).connection() as conn:
+                # Check if username already exists
+                if conn.execute(queries.USER_EXISTS, (username,)).fetchone():
+                    messagebox.showerror("Registration Failed", "Username already exists")
+                    return
+                
+                # Hash password and insert user
+                auth.create_user(conn, username, password, email if email else None)
+                conn.commit()
             
             messagebox.showinfo("Registration Successful", "Account created successfully! You can now login.")
             
@@ -0,0 +1,161 @@
+# login_throttle.py
+"""
+Sliding-window limits on failed logins, checked before any password hashing.
+
+Every failed login is counted against the username and against the client
+address. Once either has MAX_LOGIN_ATTEMPTS (per username) or
+MAX_LOGIN_ATTEMPTS_PER_IP (per address) failures within the last
+LOGIN_ATTEMPT_WINDOW seconds, further attempts are refused without looking
+at the password until the oldest failure leaves the window. Refusing before
+the KDF runs is the point: every checked password costs tens of
+milliseconds of CPU, so unthrottled guessing would tie up the web workers.
+
+Two stores are available:
+
+- LoginThrottle keeps the failure times of each key in a ring buffer in
+  memory. It costs no I/O, but each process counts on its own.
+- SQLiteLoginThrottle keeps failures in the login_failures table of the
+  database, so all workers of a multi-process server share one count.
+
+config.LOGIN_THROTTLE_BACKEND selects the store used by get_login_throttle.
+"""
+
+import threading
+import time
+from collections import deque
+
+import config
+import database
+
+class LoginThrottle:
+    """Failed-login counters held in this process's memory."""
+
+    def __init__(self, max_attempts=config.MAX_LOGIN_ATTEMPTS,
+                 max_attempts_per_ip=config.MAX_LOGIN_ATTEMPTS_PER_IP,
+                 window=config.LOGIN_ATTEMPT_WINDOW, max_keys=config.LOGIN_THROTTLE_MAX_KEYS):
+        self.max_attempts = max_attempts
+        self.max_attempts_per_ip = max_attempts_per_ip
+        self.window = window
+        self.max_keys = max_keys
+        self._failures = {}
+        self._lock = threading.Lock()
+
+    def _keys(self, username, ip):
+        keys = [(f'user:{username.lower()}', self.max_attempts)]
+        if ip:
+            keys.append((f'ip:{ip}', self.max_attempts_per_ip))
+        return keys
+
+    def retry_after(self, username, ip=None, now=None):
+        """
+        Return how many seconds a login must wait, 0 if it may proceed.
+
+        Args:
+            username (str): Login name being tried
+            ip (str): Client address, or None where there is none (Tk)
+            now (float): Current time, defaults to time.time()
+        """
+        now = time.time() if now is None else now
+        wait = 0
+        with self._lock:
+            for key, limit in self._keys(username, ip):
+                failures = self._failures.get(key)
+                # The buffer holds the last `limit` failures: the key is
+                # blocked while the oldest of them is still in the window
+                if failures is not None and len(failures) >= limit:
+                    wait = max(wait, failures[0] + self.window - now)
+        return max(0, wait)
+
+    def record_failure(self, username, ip=None, now=None):
+        """Count a failed login for the username and address."""
+        now = time.time() if now is None else now
+        with self._lock:
+            for key, limit in self._keys(username, ip):
+                failures = self._failures.get(key)
+                if failures is None:
+                    failures = self._failures[key] = deque(maxlen=limit)
+                failures.append(now)
+            if len(self._failures) > self.max_keys:
+                self._prune(now)
+
+    def reset(self, username, ip=None):
+        """Forget the failures of a username after it logged in."""
+        with self._lock:
+            self._failures.pop(f'user:{username.lower()}', None)
+
+    def _prune(self, now):
+        expired = [key for key, failures in self._failures.items() if failures[-1] <= now - self.window]
+        for key in expired:
+            del self._failures[key]
+
+class SQLiteLoginThrottle(LoginThrottle):
+    """Failed-login counters shared by all processes using one database."""
+
+    def __init__(self, path=config.DATABASE_NAME, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._initialized = False
+
+    def _connection(self):
+        # Not the request's pool: login() holds get_db() while recording failures
+        pool = database.get_pool(self.path, role='login_throttle')
+        if not self._initialized:
+            with pool.connection() as conn:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS login_failures (
+                        key TEXT NOT NULL,
+                        failed_at REAL NOT NULL
+                    )
+                ''')
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_login_failures_key "
+                             "ON login_failures (key, failed_at)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_login_failures_time "
+                             "ON login_failures (failed_at)")
+                conn.commit()
+            self._initialized = True
+        return pool.connection()
+
+    def retry_after(self, username, ip=None, now=None):
+        now = time.time() if now is None else now
+        wait = 0
+        with self._connection() as conn:
+            for key, limit in self._keys(username, ip):
+                # The limit-th most recent failure decides, as in memory
+                row = conn.execute(
+                    "SELECT failed_at FROM login_failures WHERE key = ? AND failed_at > ? "
+                    "ORDER BY failed_at DESC LIMIT 1 OFFSET ?",
+                    (key, now - self.window, limit - 1)).fetchone()
+                if row is not None:
+                    wait = max(wait, row[0] + self.window - now)
+        return max(0, wait)
+
+    def record_failure(self, username, ip=None, now=None):
+        now = time.time() if now is None else now
+        with self._connection() as conn:
+            conn.executemany("INSERT INTO login_failures (key, failed_at) VALUES (?, ?)",
+                             ((key, now) for key, _limit in self._keys(username, ip)))
+            # Expired rows are removed a batch at a time by the failures that follow
+            conn.execute("DELETE FROM login_failures WHERE rowid IN "
+                         "(SELECT rowid FROM login_failures WHERE failed_at <= ? LIMIT 100)",
+                         (now - self.window,))
+            conn.commit()
+
+    def reset(self, username, ip=None):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM login_failures WHERE key = ?", (f'user:{username.lower()}',))
+            conn.commit()
+
+_throttles = {}
+_throttles_lock = threading.Lock()
+
+def get_login_throttle(path=config.DATABASE_NAME):
+    """Return this process's login throttle, using the configured backend."""
+    with _throttles_lock:
+        throttle = _throttles.get(path)
+        if throttle is None:
+            if config.LOGIN_THROTTLE_BACKEND == 'sqlite':
+                throttle = SQLiteLoginThrottle(path)
+            else:
+                throttle = LoginThrottle()
+            _throttles[path] = throttle
+        return throttle
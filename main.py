@@ -3,9 +3,15 @@ import tkinter as tk
 from tkinter import messagebox
 import sqlite3
 import os
+import time
 from login import show_login
 from books import add_book_ui, view_books_ui
 from borrow_return import borrow_ui, return_ui, view_borrowed_books_ui
+from qr_labels import initialize_manifest_table
+from rollups import initialize_rollups
+from change_feed import get_change_feed
+import config
+import database
 
 def initialize_database():
     """Initialize the database with required tables"""
@@ -36,6 +42,15 @@ def initialize_database():
         )
     ''')
     
+    # Create QR label manifest table
+    initialize_manifest_table(conn)
+    
+    # Indexes, change counters, the change log and the daily rollups shared with the web app
+    database.initialize_indexes(conn)
+    database.initialize_change_counters(conn)
+    database.initialize_change_log(conn)
+    initialize_rollups(conn)
+    
     conn.commit()
     conn.close()
 
@@ -112,7 +127,42 @@ def main_app():
     # Handle window close
     root.protocol("WM_DELETE_WINDOW", on_exit)
     
+    # Poll for changes made by the web app and other clients; open windows
+    # subscribe to the feed and refresh from the Tk thread
+    feed = get_change_feed(config.DATABASE_NAME)
+    
+    def poll_changes():
+        try:
+            feed.poll()
+        except sqlite3.Error:
+            pass
+        root.after(int(config.CHANGE_FEED_INTERVAL * 1000), poll_changes)
+    
+    poll_changes()
+    
+    # Log out after SESSION_TIMEOUT seconds without keyboard or mouse input
+    activity = {'last': time.monotonic(), 'expired': False}
+    
+    def note_activity(event):
+        activity['last'] = time.monotonic()
+    
+    def check_session():
+        if time.monotonic() - activity['last'] >= config.SESSION_TIMEOUT:
+            activity['expired'] = True
+            messagebox.showinfo("Session Expired", "You have been logged out after a period of inactivity.")
+            root.quit()
+            root.destroy()
+            return
+        root.after(60000, check_session)
+    
+    root.bind_all('<KeyPress>', note_activity, add='+')
+    root.bind_all('<ButtonPress>', note_activity, add='+')
+    root.after(60000, check_session)
+    
     root.mainloop()
+    
+    if activity['expired']:
+        show_login(main_app)
 
 if __name__ == "__main__":
     show_login(main_app)
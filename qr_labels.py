@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# qr_labels.py
+"""
+Storage layout for book QR labels.
+
+Labels are keyed by book id and spread over hashed subdirectories
+(qr_codes/3f/42_qr.png), so titles that differ only in punctuation never
+collide and no directory grows past a few thousand files. The qr_manifest
+table maps each book to its label file, so lookups never scan directories.
+
+For the web catalog, pre-rendered PNG bytes are kept in the qr_blobs table
+and served with a single rowid lookup, without rendering or filesystem reads.
+They are stored when a book is added; "qr_labels.py blobs" fills them in
+for older books, which are rendered on each view until then.
+
+Usage:
+    python qr_labels.py migrate [--database library.db] [--directory qr_codes]
+    python qr_labels.py blobs [--database library.db] [--workers N]
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import circulation
+import config
+from qr_module import generate_qr, render_qr_png, decode_qr, QRDecodeError
+
+def initialize_manifest_table(conn):
+    """Create the table mapping books to their label files."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS qr_manifest (
+            book_id INTEGER PRIMARY KEY,
+            path TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (book_id) REFERENCES books (id)
+        )
+    ''')
+
+def label_relpath(book_id):
+    """
+    Return the label path of a book relative to the QR code directory.
+
+    The shard is the first byte of the SHA-1 of the id, which spreads
+    sequential ids evenly over 256 subdirectories.
+    """
+    shard = hashlib.sha1(str(book_id).encode()).hexdigest()[:2]
+    return f"{shard}/{book_id}_qr.png"
+
+def label_path(book_id, directory=config.QR_CODE_DIRECTORY):
+    """Return the full label path of a book."""
+    return os.path.join(directory, *label_relpath(book_id).split('/'))
+
+def legacy_label_path(title, directory=config.QR_CODE_DIRECTORY):
+    """Return the title-based path used for labels before the manifest existed."""
+    return os.path.join(directory, f"{title.replace(' ', '_').replace('/', '_')}_qr.png")
+
+def label_text(title, author, isbn):
+    """Return the text encoded in a book's label."""
+    return f"Book: {title}\nAuthor: {author or ''}\nISBN: {isbn or ''}"
+
+def record_label(conn, book_id, relpath):
+    """Insert or replace the manifest entry of a book."""
+    conn.execute("INSERT OR REPLACE INTO qr_manifest (book_id, path) VALUES (?, ?)",
+                 (book_id, relpath))
+
+def write_label(conn, book_id, title, author, isbn, directory=config.QR_CODE_DIRECTORY):
+    """
+    Generate a book's label and record it in the manifest.
+
+    The caller is responsible for committing the transaction.
+
+    Returns:
+        str: The path of the generated label
+    """
+    path = generate_qr(label_text(title, author, isbn), label_path(book_id, directory))
+    record_label(conn, book_id, label_relpath(book_id))
+    return path
+
+def lookup_label(conn, book_id, directory=config.QR_CODE_DIRECTORY):
+    """
+    Return the label path of a book from the manifest.
+
+    Returns:
+        str or None: The label path, or None if the book has no label
+    """
+    row = conn.execute("SELECT path FROM qr_manifest WHERE book_id = ?", (book_id,)).fetchone()
+    if not row:
+        return None
+    return os.path.join(directory, *row[0].split('/'))
+
+def migrate_labels(database=config.DATABASE_NAME, directory=config.QR_CODE_DIRECTORY, regenerate=True):
+    """
+    Move title-named labels to the id-keyed layout and fill the manifest.
+
+    A legacy file is only claimed by a book if it decodes to that book's
+    title, so colliding titles are resolved correctly. Books without a
+    usable legacy file get a fresh label when regenerate is True.
+
+    Returns:
+        dict: Counts of 'moved', 'regenerated' and 'skipped' books, and
+              'leftover' (legacy files that no book claimed)
+    """
+    conn = sqlite3.connect(database)
+    result = {'moved': 0, 'regenerated': 0, 'skipped': 0, 'leftover': []}
+    claimed = set()
+    try:
+        initialize_manifest_table(conn)
+        c = conn.cursor()
+        c.execute('''
+            SELECT b.id, b.title, b.author, b.isbn
+            FROM books b LEFT JOIN qr_manifest m ON m.book_id = b.id
+            WHERE m.book_id IS NULL
+        ''')
+        for book_id, title, author, isbn in c.fetchall():
+            legacy = legacy_label_path(title, directory)
+            new_path = label_path(book_id, directory)
+            try:
+                decoded = decode_qr(legacy) if os.path.exists(legacy) else None
+            except QRDecodeError:
+                decoded = None
+
+            if decoded is not None and decoded.split('\n', 1)[0] == f"Book: {title}":
+                os.makedirs(os.path.dirname(new_path), exist_ok=True)
+                os.replace(legacy, new_path)
+                record_label(conn, book_id, label_relpath(book_id))
+                claimed.add(legacy)
+                result['moved'] += 1
+            elif regenerate:
+                write_label(conn, book_id, title, author, isbn, directory)
+                result['regenerated'] += 1
+            else:
+                result['skipped'] += 1
+            conn.commit()
+
+        if os.path.isdir(directory):
+            result['leftover'] = sorted(
+                os.path.join(directory, name) for name in os.listdir(directory)
+                if name.endswith('_qr.png') and os.path.join(directory, name) not in claimed
+            )
+    finally:
+        conn.close()
+    return result
+
+def initialize_blob_table(conn):
+    """Create the table holding pre-rendered QR PNGs for the web catalog."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS qr_blobs (
+            book_id INTEGER PRIMARY KEY,
+            png BLOB NOT NULL,
+            FOREIGN KEY (book_id) REFERENCES books (id)
+        )
+    ''')
+
+def catalog_qr_text(title):
+    """Return the text encoded in a book's web catalog QR code."""
+    return f"Book: {title}"
+
+def render_catalog_qr(title):
+    """Render a book's web catalog QR code to PNG bytes."""
+    return render_qr_png(catalog_qr_text(title), config.QR_CODE_SIZE, config.QR_CODE_BORDER)
+
+def store_qr_png(conn, book_id, png):
+    """Insert or replace the pre-rendered QR PNG of a book."""
+    conn.execute("INSERT OR REPLACE INTO qr_blobs (book_id, png) VALUES (?, ?)",
+                 (book_id, png))
+
+def read_qr_png(conn, book_id):
+    """
+    Read the pre-rendered QR PNG of a book.
+
+    book_id is the rowid of qr_blobs, so this is a single primary key
+    lookup; the bytes are read with incremental BLOB I/O where available.
+
+    Returns:
+        bytes or None: The PNG bytes, or None if none are stored
+    """
+    if hasattr(conn, 'blobopen'):
+        try:
+            with conn.blobopen('qr_blobs', 'png', book_id, readonly=True) as blob:
+                return blob.read()
+        except sqlite3.OperationalError:
+            return None
+
+    try:
+        row = conn.execute("SELECT png FROM qr_blobs WHERE book_id = ?", (book_id,)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+def catalog_qr_png(conn, book_id, title):
+    """
+    Return a book's catalog QR PNG, rendering it if none is stored.
+
+    Only reads from the database, so page views never take the write lock.
+    """
+    png = read_qr_png(conn, book_id)
+    if png is None:
+        png = render_catalog_qr(title)
+    return png
+
+def add_book_with_qr(conn, title, author, isbn, png):
+    """
+    Add a book together with its pre-rendered catalog QR PNG.
+
+    A write queue job: render png with render_catalog_qr beforehand, so the
+    writer thread only runs the inserts. The caller commits.
+
+    Returns:
+        int: The new book's id
+    """
+    book_id = circulation.add_book(conn, title, author, isbn)
+    store_qr_png(conn, book_id, png)
+    return book_id
+
+def _render_blob(book):
+    book_id, title = book
+    return book_id, render_catalog_qr(title)
+
+def generate_blobs(database=config.DATABASE_NAME, workers=None, batch_size=500):
+    """
+    Render catalog QR PNGs for all books that do not have one yet.
+
+    Rendering runs across a process pool; results are written in batches
+    of batch_size rows per transaction.
+
+    Returns:
+        int: The number of PNGs written
+    """
+    conn = sqlite3.connect(database)
+    written = 0
+    try:
+        initialize_blob_table(conn)
+        c = conn.cursor()
+        c.execute('''
+            SELECT b.id, b.title
+            FROM books b LEFT JOIN qr_blobs q ON q.book_id = b.id
+            WHERE q.book_id IS NULL
+        ''')
+        books = c.fetchall()
+
+        batch = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for book_id, png in executor.map(_render_blob, books, chunksize=64):
+                batch.append((book_id, png))
+                if len(batch) >= batch_size:
+                    conn.executemany("INSERT OR REPLACE INTO qr_blobs (book_id, png) VALUES (?, ?)", batch)
+                    conn.commit()
+                    written += len(batch)
+                    batch = []
+        if batch:
+            conn.executemany("INSERT OR REPLACE INTO qr_blobs (book_id, png) VALUES (?, ?)", batch)
+            conn.commit()
+            written += len(batch)
+    finally:
+        conn.close()
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage book QR label files")
+    parser.add_argument('command', choices=['migrate', 'blobs'], help="Operation to run")
+    parser.add_argument('--database', default=config.DATABASE_NAME, help="Path of the library database")
+    parser.add_argument('--directory', default=config.QR_CODE_DIRECTORY, help="Directory holding the QR labels")
+    parser.add_argument('--no-regenerate', action='store_true',
+                        help="Do not create labels for books without a legacy file")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes")
+    args = parser.parse_args()
+
+    if args.command == 'blobs':
+        written = generate_blobs(args.database, args.workers)
+        print(f"Rendered QR codes: {written}")
+        return True
+
+    result = migrate_labels(args.database, args.directory, regenerate=not args.no_regenerate)
+    print(f"Moved: {result['moved']}")
+    print(f"Regenerated: {result['regenerated']}")
+    print(f"Skipped: {result['skipped']}")
+    if result['leftover']:
+        print(f"Legacy files not claimed by any book: {len(result['leftover'])}")
+        for path in result['leftover']:
+            print(f"  - {path}")
+    return True
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
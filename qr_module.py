@@ -1,7 +1,10 @@
 # qr_module.py
-import qrcode
-from PIL import Image, ImageDraw, ImageFont
+#
+# qrcode and Pillow are imported inside the functions that use them, so
+# importing this module (e.g. from app.py or books.py) stays cheap until a
+# QR code is actually rendered or decoded.
 import os
+from io import BytesIO
 
 def generate_qr(data, output_file="qr.png"):
     """
@@ -17,6 +20,8 @@ def generate_qr(data, output_file="qr.png"):
     Raises:
         Exception: If there's an error generating or saving the QR code
     """
+    import qrcode
+    
     try:
         # Ensure the directory exists
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
@@ -48,6 +53,39 @@ def generate_qr(data, output_file="qr.png"):
     except Exception as e:
         raise Exception(f"Error generating QR code: {str(e)}")
 
+def render_qr_png(data, box_size=10, border=4):
+    """
+    Render a QR code to PNG bytes without touching the filesystem.
+
+    Args:
+        data (str): The data to encode in the QR code
+        box_size (int): Size of each QR module in pixels
+        border (int): Width of the quiet zone in modules
+
+    Returns:
+        bytes: The compressed PNG image
+    """
+    import qrcode
+
+    try:
+        qr = qrcode.QRCode(
+            version=1,
+            error_correction=qrcode.constants.ERROR_CORRECT_L,
+            box_size=box_size,
+            border=border,
+        )
+        qr.add_data(data)
+        qr.make(fit=True)
+
+        img = qr.make_image(fill_color="black", back_color="white")
+
+        buffer = BytesIO()
+        img.save(buffer, format='PNG', optimize=True)
+        return buffer.getvalue()
+
+    except Exception as e:
+        raise Exception(f"Error rendering QR code: {str(e)}")
+
 def generate_qr_with_logo(data, output_file="qr_with_logo.png", logo_path=None):
     """
     Generate a QR code with an optional logo in the center.
@@ -60,6 +98,9 @@ def generate_qr_with_logo(data, output_file="qr_with_logo.png", logo_path=None):
     Returns:
         str: The path to the saved QR code file
     """
+    import qrcode
+    from PIL import Image
+    
     try:
         # Ensure the directory exists
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
@@ -119,6 +160,9 @@ def create_qr_with_text(data, output_file="qr_with_text.png", title="QR Code"):
     Returns:
         str: The path to the saved QR code file
     """
+    import qrcode
+    from PIL import Image, ImageDraw, ImageFont
+    
     try:
         # Ensure the directory exists
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
@@ -183,6 +227,8 @@ def validate_qr_data(data):
     Returns:
         bool: True if data is valid, False otherwise
     """
+    import qrcode
+    
     try:
         if not data or len(data.strip()) == 0:
             return False
@@ -200,3 +246,356 @@ def validate_qr_data(data):
         
     except Exception:
         return False
+
+class QRDecodeError(Exception):
+    """Raised when a QR image cannot be decoded."""
+
+# GF(256) tables for Reed-Solomon decoding (primitive polynomial 0x11d, as in
+# the QR specification); built here so the decoder's inner loops need no imports
+_GF_EXP = [0] * 512
+_GF_LOG = [0] * 256
+_value = 1
+for _i in range(255):
+    _GF_EXP[_i] = _value
+    _GF_LOG[_value] = _i
+    _value <<= 1
+    if _value & 0x100:
+        _value ^= 0x11d
+for _i in range(255, 512):
+    _GF_EXP[_i] = _GF_EXP[_i - 255]
+del _value, _i
+
+def _gf_exp(n):
+    return _GF_EXP[n % 255]
+
+def _gf_mul(a, b):
+    if a == 0 or b == 0:
+        return 0
+    return _GF_EXP[_GF_LOG[a] + _GF_LOG[b]]
+
+def _gf_inv(a):
+    return _GF_EXP[255 - _GF_LOG[a]]
+
+def _rs_correct(block, ec_count):
+    """
+    Check a Reed-Solomon block and correct it in place if needed.
+    
+    Uses Berlekamp-Massey to locate the errors and solves the syndrome
+    equations for their values.
+    
+    Args:
+        block (list): Data and error correction codewords of one block
+        ec_count (int): Number of error correction codewords in the block
+    
+    Returns:
+        int: The number of corrected codewords
+    
+    Raises:
+        QRDecodeError: If the block has more errors than can be corrected
+    """
+    n = len(block)
+
+    def syndromes():
+        result = []
+        for j in range(ec_count):
+            x = _gf_exp(j)
+            value = 0
+            for codeword in block:
+                value = _gf_mul(value, x) ^ codeword
+            result.append(value)
+        return result
+
+    synd = syndromes()
+    if not any(synd):
+        return 0
+
+    # Berlekamp-Massey: find the error locator polynomial (lowest degree first)
+    locator, previous = [1], [1]
+    length, shift, last_delta = 0, 1, 1
+    for i in range(ec_count):
+        delta = synd[i]
+        for k in range(1, length + 1):
+            delta ^= _gf_mul(locator[k], synd[i - k])
+        if delta == 0:
+            shift += 1
+            continue
+        coef = _gf_mul(delta, _gf_inv(last_delta))
+        updated = locator + [0] * max(0, len(previous) + shift - len(locator))
+        for k, value in enumerate(previous):
+            updated[k + shift] ^= _gf_mul(coef, value)
+        if 2 * length <= i:
+            previous, last_delta = locator, delta
+            length = i + 1 - length
+            shift = 1
+        else:
+            shift += 1
+        locator = updated
+    locator = locator[:length + 1]
+
+    # Chien search: codeword p has locator X = alpha^(n - 1 - p)
+    positions = []
+    for p in range(n):
+        x = _gf_exp(255 - (n - 1 - p) % 255)
+        value = 0
+        for coef in reversed(locator):
+            value = _gf_mul(value, x) ^ coef
+        if value == 0:
+            positions.append(p)
+    if len(positions) != length or 2 * length > ec_count:
+        raise QRDecodeError("Too many errors to correct")
+
+    # Solve sum(e_k * X_k^j) = S_j for the error values
+    xs = [_gf_exp(n - 1 - p) for p in positions]
+    rows = []
+    for j in range(length):
+        rows.append([_gf_exp(_GF_LOG[x] * j) for x in xs] + [synd[j]])
+    for col in range(length):
+        pivot = next((r for r in range(col, length) if rows[r][col]), None)
+        if pivot is None:
+            raise QRDecodeError("Too many errors to correct")
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        inv = _gf_inv(rows[col][col])
+        rows[col] = [_gf_mul(value, inv) for value in rows[col]]
+        for r in range(length):
+            if r != col and rows[r][col]:
+                factor = rows[r][col]
+                rows[r] = [value ^ _gf_mul(factor, pivot_value)
+                           for value, pivot_value in zip(rows[r], rows[col])]
+    for k, p in enumerate(positions):
+        block[p] ^= rows[k][length]
+
+    if any(syndromes()):
+        raise QRDecodeError("Too many errors to correct")
+    return length
+
+def _function_modules(version):
+    """Return a matrix marking finder, timing, alignment and format modules."""
+    from qrcode import util
+
+    size = version * 4 + 17
+    reserved = [[False] * size for _ in range(size)]
+
+    def mark(top, left, height, width):
+        for r in range(max(top, 0), min(top + height, size)):
+            for c in range(max(left, 0), min(left + width, size)):
+                reserved[r][c] = True
+
+    # Finder patterns, separators and format information
+    mark(0, 0, 9, 9)
+    mark(0, size - 8, 9, 8)
+    mark(size - 8, 0, 8, 9)
+
+    for row in util.pattern_position(version):
+        for col in util.pattern_position(version):
+            if not reserved[row][col]:
+                mark(row - 2, col - 2, 5, 5)
+
+    # Timing patterns
+    mark(6, 0, 1, size)
+    mark(0, 6, size, 1)
+
+    # Version information
+    if version >= 7:
+        mark(0, size - 11, 6, 3)
+        mark(size - 11, 0, 3, 6)
+
+    return reserved
+
+def _sample_modules(image_path):
+    """
+    Read an image and sample it into a matrix of dark/light modules.
+    
+    The image is expected to be an upright, unskewed render such as the
+    labels produced by this module; optional caption text below the code
+    is ignored.
+    """
+    from PIL import Image
+
+    with Image.open(image_path) as img:
+        gray = img.convert('L')
+    width, height = gray.size
+    pixels = gray.load()
+
+    def dark(x, y):
+        return pixels[x, y] < 128
+
+    top = next((y for y in range(height) if any(dark(x, y) for x in range(width))), None)
+    if top is None:
+        raise QRDecodeError("No QR code found in image")
+    left = next(x for x in range(width) if dark(x, top))
+    right = max(x for x in range(width) if dark(x, top))
+
+    # The top edge of the finder pattern is seven modules wide
+    run = 0
+    while left + run < width and dark(left + run, top):
+        run += 1
+    module = run / 7.0
+    size = round((right - left + 1) / module)
+    if size < 21 or (size - 17) % 4 != 0:
+        raise QRDecodeError("Could not locate QR finder patterns")
+
+    matrix = []
+    for r in range(size):
+        y = int(top + (r + 0.5) * module)
+        if y >= height:
+            raise QRDecodeError("QR code is cut off")
+        matrix.append([dark(int(left + (c + 0.5) * module), y) for c in range(size)])
+    return matrix
+
+def _read_format(matrix):
+    """Return (error_correction, mask_pattern) from the format information."""
+    from qrcode import util
+
+    size = len(matrix)
+    bits = 0
+    for i in range(15):
+        if i < 6:
+            mod = matrix[i][8]
+        elif i < 8:
+            mod = matrix[i + 1][8]
+        else:
+            mod = matrix[size - 15 + i][8]
+        if mod:
+            bits |= 1 << i
+
+    best, best_distance = None, 16
+    for value in range(32):
+        distance = bin(bits ^ util.BCH_type_info(value)).count('1')
+        if distance < best_distance:
+            best, best_distance = value, distance
+    if best_distance > 3:
+        raise QRDecodeError("Unreadable format information")
+    return best >> 3, best & 7
+
+def _read_codewords(matrix, version, mask_pattern):
+    """Read the codewords in placement order, removing the data mask."""
+    from qrcode import util
+
+    size = len(matrix)
+    reserved = _function_modules(version)
+    mask = util.mask_func(mask_pattern)
+
+    codewords = []
+    current, bit_count = 0, 0
+    upward = True
+    col = size - 1
+    while col > 0:
+        if col == 6:
+            col -= 1
+        rows = range(size - 1, -1, -1) if upward else range(size)
+        for row in rows:
+            for c in (col, col - 1):
+                if reserved[row][c]:
+                    continue
+                bit = matrix[row][c] != mask(row, c)
+                current = (current << 1) | bit
+                bit_count += 1
+                if bit_count == 8:
+                    codewords.append(current)
+                    current, bit_count = 0, 0
+        upward = not upward
+        col -= 2
+    return codewords
+
+def _parse_segments(data, version):
+    """Decode the data bit stream into text."""
+    from qrcode import util
+
+    bits = ''.join(f"{byte:08b}" for byte in data)
+    pos = 0
+
+    def take(count):
+        nonlocal pos
+        if pos + count > len(bits):
+            raise QRDecodeError("Truncated QR data")
+        value = int(bits[pos:pos + count], 2)
+        pos += count
+        return value
+
+    output = bytearray()
+    while pos + 4 <= len(bits):
+        mode = take(4)
+        if mode == 0:
+            break
+        if mode not in (util.MODE_NUMBER, util.MODE_ALPHA_NUM,
+                        util.MODE_8BIT_BYTE):
+            raise QRDecodeError(f"Unsupported QR data mode ({mode})")
+        count = take(util.length_in_bits(mode, version))
+        if mode == util.MODE_NUMBER:
+            while count >= 3:
+                output += f"{take(10):03d}".encode()
+                count -= 3
+            if count == 2:
+                output += f"{take(7):02d}".encode()
+            elif count == 1:
+                output += f"{take(4):01d}".encode()
+        elif mode == util.MODE_ALPHA_NUM:
+            while count >= 2:
+                value = take(11)
+                output.append(util.ALPHA_NUM[value // 45])
+                output.append(util.ALPHA_NUM[value % 45])
+                count -= 2
+            if count:
+                output.append(util.ALPHA_NUM[take(6)])
+        else:
+            output += bytes(take(8) for _ in range(count))
+    return output.decode('utf-8')
+
+def decode_qr(image_path):
+    """
+    Decode a QR code image produced by this module.
+    
+    This is a pure-Python decoder for upright, digitally rendered codes
+    (no camera or perspective correction). Damaged modules are repaired
+    with the code's Reed-Solomon error correction.
+    
+    Args:
+        image_path (str): Path of the QR code image
+    
+    Returns:
+        str: The decoded text
+    
+    Raises:
+        QRDecodeError: If the image cannot be decoded
+    """
+    from qrcode.base import rs_blocks
+
+    try:
+        matrix = _sample_modules(image_path)
+    except OSError as e:
+        raise QRDecodeError(f"Could not read image: {e}")
+
+    version = (len(matrix) - 17) // 4
+    if version > 40:
+        raise QRDecodeError("Could not locate QR finder patterns")
+    error_correction, mask_pattern = _read_format(matrix)
+    codewords = _read_codewords(matrix, version, mask_pattern)
+
+    blocks = rs_blocks(version, error_correction)
+    total = sum(block.total_count for block in blocks)
+    if len(codewords) < total:
+        raise QRDecodeError("Not enough codewords in QR code")
+
+    # De-interleave: data codewords first, then error correction codewords
+    split = [[] for _ in blocks]
+    index = 0
+    for i in range(max(block.data_count for block in blocks)):
+        for b, block in enumerate(blocks):
+            if i < block.data_count:
+                split[b].append(codewords[index])
+                index += 1
+    for i in range(max(block.total_count - block.data_count for block in blocks)):
+        for b, block in enumerate(blocks):
+            if i < block.total_count - block.data_count:
+                split[b].append(codewords[index])
+                index += 1
+
+    data = []
+    for block, words in zip(blocks, split):
+        _rs_correct(words, block.total_count - block.data_count)
+        data.extend(words[:block.data_count])
+
+    try:
+        return _parse_segments(data, version)
+    except UnicodeDecodeError:
+        raise QRDecodeError("QR data is not valid UTF-8")
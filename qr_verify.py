@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# qr_verify.py
+"""
+Batch verification of generated QR labels.
+
+Decodes every label listed in the qr_manifest table across a process pool
+and checks the decoded text against the books table, so auditing a large
+label collection is a batch job rather than manual scanning.
+
+Usage:
+    python qr_verify.py [--directory qr_codes] [--database library.db]
+                        [--workers N] [--report report.json]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import config
+from qr_module import decode_qr, QRDecodeError
+from qr_labels import initialize_manifest_table
+
+def parse_label_text(text):
+    """
+    Split decoded label text into its fields.
+
+    Labels are written as "Key: value" lines, e.g. "Book: Dune\\nAuthor: ...".
+
+    Returns:
+        dict: Field name to value
+    """
+    fields = {}
+    for line in text.splitlines():
+        key, sep, value = line.partition(': ')
+        if sep:
+            fields[key.strip()] = value.strip()
+    return fields
+
+def decode_label(path):
+    """
+    Decode a single label (runs in a worker process).
+
+    Returns:
+        tuple: (path, decoded text or None, error message or None)
+    """
+    try:
+        return path, decode_qr(path), None
+    except QRDecodeError as e:
+        return path, None, str(e)
+    except Exception as e:
+        return path, None, f"Unexpected error: {e}"
+
+def load_labels(database, directory):
+    """
+    Load all books and their manifest entries in one query.
+
+    Returns:
+        tuple: (list of (book_id, label path) for labelled books,
+                dict of book_id to (title, author, isbn) for all books)
+    """
+    conn = sqlite3.connect(database)
+    try:
+        initialize_manifest_table(conn)
+        c = conn.cursor()
+        c.execute('''
+            SELECT b.id, b.title, b.author, b.isbn, m.path
+            FROM books b LEFT JOIN qr_manifest m ON m.book_id = b.id
+            ORDER BY b.id
+        ''')
+        labels = []
+        books = {}
+        for book_id, title, author, isbn, path in c.fetchall():
+            books[book_id] = (title, author, isbn)
+            if path is not None:
+                labels.append((book_id, os.path.join(directory, *path.split('/'))))
+        return labels, books
+    finally:
+        conn.close()
+
+def check_label(text, book):
+    """
+    Compare a decoded label against its book record.
+
+    Returns:
+        str or None: A description of the mismatch, or None if the label is correct
+    """
+    fields = parse_label_text(text)
+    title, author, isbn = book
+    if fields.get('Book') != title:
+        return f"Label belongs to '{fields.get('Book')}', expected '{title}'"
+    if 'Author' in fields and fields['Author'] != (author or ''):
+        return f"Author mismatch for '{title}': label has '{fields['Author']}'"
+    if 'ISBN' in fields and fields['ISBN'] != (isbn or ''):
+        return f"ISBN mismatch for '{title}': label has '{fields['ISBN']}'"
+    return None
+
+def verify_labels(directory=config.QR_CODE_DIRECTORY, database=config.DATABASE_NAME,
+                  workers=None, progress=None, chunksize=32):
+    """
+    Decode all labels in the manifest and compare them with the books table.
+
+    Args:
+        directory (str): Directory holding the label images
+        database (str): Path of the library database
+        workers (int): Number of worker processes (defaults to the CPU count)
+        progress (callable): Optional callback called as progress(done, total)
+        chunksize (int): Number of labels handed to a worker at a time
+
+    Returns:
+        dict: Summary with 'total', 'ok', 'mismatches' (list of (path, reason))
+              and 'missing' (titles of books without a label)
+    """
+    labels, books = load_labels(database, directory)
+    book_ids = dict((path, book_id) for book_id, path in labels)
+    total = len(labels)
+
+    mismatches = []
+    done = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for path, text, error in executor.map(decode_label, [path for _book_id, path in labels], chunksize=chunksize):
+            done += 1
+            if error:
+                mismatches.append((path, f"Unreadable: {error}"))
+            else:
+                reason = check_label(text, books[book_ids[path]])
+                if reason:
+                    mismatches.append((path, reason))
+            if progress:
+                progress(done, total)
+
+    labelled = set(book_ids.values())
+    missing = sorted(title for book_id, (title, _author, _isbn) in books.items() if book_id not in labelled)
+    return {
+        'total': total,
+        'ok': total - len(mismatches),
+        'mismatches': mismatches,
+        'missing': missing,
+    }
+
+def _progress_printer():
+    """Return a progress callback that reports to stderr at most once a second."""
+    last_report = [0.0]
+
+    def report(done, total):
+        now = time.time()
+        if done == total or now - last_report[0] >= 1.0:
+            last_report[0] = now
+            percent = done / total * 100 if total else 100
+            print(f"\rVerified {done}/{total} labels ({percent:.1f}%)", end='', file=sys.stderr, flush=True)
+            if done == total:
+                print(file=sys.stderr)
+
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify generated QR labels against the library database")
+    parser.add_argument('--directory', default=config.QR_CODE_DIRECTORY, help="Directory holding the QR labels")
+    parser.add_argument('--database', default=config.DATABASE_NAME, help="Path of the library database")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes")
+    parser.add_argument('--report', help="Write the full result to this JSON file")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    result = verify_labels(args.directory, args.database, args.workers, progress=_progress_printer())
+    elapsed = time.time() - start_time
+
+    print(f"Labels checked: {result['total']} in {elapsed:.1f}s")
+    print(f"Correct: {result['ok']}")
+    print(f"Mismatches: {len(result['mismatches'])}")
+    for path, reason in result['mismatches']:
+        print(f"  - {path}: {reason}")
+    print(f"Books without a label: {len(result['missing'])}")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    return not result['mismatches']
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
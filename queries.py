@@ -0,0 +1,187 @@
+# queries.py
+"""
+Catalog of the SQL statements run by the web app and the Tk client.
+
+Every statement used by app.py, books.py, borrow_return.py and login.py,
+directly or through circulation.py and auth.py, is registered here under
+a name, so the statements can be checked together: check_plans runs
+EXPLAIN QUERY PLAN on each and reports hot queries that scan the books or
+borrowed table. test_query_plans.py runs it against a generated library
+in the test suite, and benchmarks/check_query_plans.py against a large
+one or a copy of a real database.
+
+Queries registered with hot=False read a whole table by nature (full
+listings and catalog-wide counts) and may scan it. A scan of a partial
+index is not a full scan: idx_borrowed_active holds only the loans that
+are still out, however long the loan history grows.
+
+Run the statements through these constants on a pooled connection
+(database.get_db in the web app, database.get_pool(...).connection() in
+the Tk client) rather than on a connection opened per operation: pooled
+connections live for the whole process, and sqlite3 keeps each one's
+recently used statements prepared, keyed by their SQL text, so a catalog
+query is parsed and planned once per connection. One text per statement
+matters for that as well as for the plan check; benchmarks/bench_queries.py
+measures the difference.
+
+Statements containing "{ids}" are run through tree_rows.select_by_ids,
+which fills in the placeholders for a chunk of ids.
+"""
+
+import re
+from collections import namedtuple
+
+Query = namedtuple('Query', ['name', 'sql', 'hot'])
+
+CATALOG = {}
+
+def register(name, sql, hot=True):
+    """
+    Add a statement to the catalog.
+
+    Args:
+        name (str): Unique name of the statement
+        sql (str): The statement
+        hot (bool): Whether it runs per request or per desk operation and
+                    must therefore not scan books or borrowed
+
+    Returns:
+        str: sql, so the registration can be assigned to a constant
+    """
+    if name in CATALOG:
+        raise ValueError(f"Query {name!r} is already registered")
+    CATALOG[name] = Query(name, sql, hot)
+    return sql
+
+BOOK_COLUMNS = ('id', 'title', 'author', 'isbn', 'available', 'date_added')
+LOAN_COLUMNS = ('id', 'student_name', 'book_title', 'borrow_date', 'return_date')
+
+def page_query(table, columns, where=()):
+    """
+    Return the keyset pagination query of a table: rows after an id, in id order.
+
+    The statement takes (after, limit) parameters; the first page passes
+    after=0, so every page seeks through the primary key.
+    """
+    conditions = list(where) + ["id > ?"]
+    return f"SELECT {', '.join(columns)} FROM {table} WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?"
+
+# Books
+BOOK_ID_BY_TITLE = register('book_id_by_title', "SELECT id FROM books WHERE title = ?")
+INSERT_BOOK = register('insert_book', "INSERT INTO books (title, author, isbn) VALUES (?, ?, ?)")
+MARK_BOOK_BORROWED = register('mark_book_borrowed',
+                              "UPDATE books SET available = 0 WHERE title = ? AND available = 1")
+MARK_BOOK_RETURNED = register('mark_book_returned', "UPDATE books SET available = 1 WHERE title = ?")
+ALL_BOOKS = register('all_books', f"SELECT {', '.join(BOOK_COLUMNS)} FROM books", hot=False)
+BOOKS_BY_IDS = register('books_by_ids', ALL_BOOKS + " WHERE id IN ({ids})")
+LIST_BOOKS = register('list_books', ALL_BOOKS + " ORDER BY date_added DESC", hot=False)
+LIST_AVAILABLE_BOOKS = register('list_available_books',
+                                ALL_BOOKS + " WHERE available = 1 ORDER BY date_added DESC", hot=False)
+LIST_AVAILABLE_TITLES = register('list_available_titles',
+                                 "SELECT title FROM books WHERE available = 1 ORDER BY title", hot=False)
+PAGE_BOOKS = register('page_books', page_query('books', BOOK_COLUMNS))
+PAGE_AVAILABLE_BOOKS = register('page_available_books', page_query('books', BOOK_COLUMNS, ["available = 1"]))
+COUNT_BOOKS = register('count_books', "SELECT COUNT(*) FROM books", hot=False)
+COUNT_AVAILABLE_BOOKS = register('count_available_books', "SELECT COUNT(*) FROM books WHERE available = 1",
+                                 hot=False)
+
+# Loans
+INSERT_LOAN = register('insert_loan', "INSERT INTO borrowed (student_name, book_title) VALUES (?, ?)")
+ACTIVE_LOAN_TITLE = register('active_loan_title',
+                             "SELECT book_title FROM borrowed WHERE id = ? AND return_date IS NULL")
+# In UTC, like the borrow_date default, so loan lengths and daily counts use one clock
+CLOSE_LOAN = register('close_loan', "UPDATE borrowed SET return_date = CURRENT_TIMESTAMP WHERE id = ?")
+ACTIVE_LOAN_OF_STUDENT = register(
+    'active_loan_of_student',
+    "SELECT id FROM borrowed WHERE student_name = ? AND book_title = ? AND return_date IS NULL")
+ACTIVE_TITLES_OF_STUDENT = register(
+    'active_titles_of_student', "SELECT book_title FROM borrowed WHERE student_name = ? AND return_date IS NULL")
+ACTIVE_LOANS = register(
+    'active_loans', f"SELECT {', '.join(LOAN_COLUMNS)} FROM borrowed WHERE return_date IS NULL")
+ACTIVE_LOANS_BY_IDS = register('active_loans_by_ids', ACTIVE_LOANS + " AND id IN ({ids})")
+LIST_LOANS = register('list_loans', f"SELECT {', '.join(LOAN_COLUMNS)} FROM borrowed ORDER BY borrow_date DESC",
+                      hot=False)
+LIST_ACTIVE_LOANS = register(
+    'list_active_loans',
+    f"SELECT {', '.join(LOAN_COLUMNS)} FROM borrowed WHERE return_date IS NULL ORDER BY borrow_date DESC")
+PAGE_LOANS = register('page_loans', page_query('borrowed', LOAN_COLUMNS))
+PAGE_ACTIVE_LOANS = register('page_active_loans', page_query('borrowed', LOAN_COLUMNS, ["return_date IS NULL"]))
+COUNT_ACTIVE_LOANS = register('count_active_loans', "SELECT COUNT(*) FROM borrowed WHERE return_date IS NULL")
+LIBRARY_STATS = register('library_stats', '''
+    SELECT
+        (SELECT COUNT(*) FROM books),
+        (SELECT COUNT(*) FROM books WHERE available = 1),
+        (SELECT COUNT(*) FROM borrowed WHERE return_date IS NULL),
+        (SELECT COUNT(*) FROM borrowed),
+        (SELECT COUNT(*) FROM borrowed
+         WHERE return_date IS NULL AND borrow_date < datetime('now', ?))
+''', hot=False)
+
+# Catalog snapshots (catalog_snapshot.py): whole tables in id order, with
+# timestamps as epoch seconds and -1 for loans not yet returned
+SNAPSHOT_BOOKS = register('snapshot_books', "SELECT id, title, author, available FROM books ORDER BY id",
+                          hot=False)
+SNAPSHOT_LOANS = register('snapshot_loans', '''
+    SELECT id, student_name, book_title,
+           CAST(strftime('%s', borrow_date) AS INTEGER),
+           COALESCE(CAST(strftime('%s', return_date) AS INTEGER), -1)
+    FROM borrowed ORDER BY id
+''', hot=False)
+
+# Daily rollups (rollups.py), read by primary key range
+DAILY_STATS = register('daily_stats', '''
+    SELECT day, borrows, returns FROM daily_stats
+    WHERE day BETWEEN ? AND ? AND (borrows != 0 OR returns != 0) ORDER BY day
+''')
+DAILY_BOOK_STATS = register('daily_book_stats', '''
+    SELECT day, borrows, returns FROM daily_book_stats
+    WHERE book_title = ? AND day BETWEEN ? AND ? AND (borrows != 0 OR returns != 0) ORDER BY day
+''')
+
+# Users
+USER_BY_USERNAME = register('user_by_username',
+                            "SELECT id, username, password, is_admin FROM users WHERE username = ?")
+USER_EXISTS = register('user_exists', "SELECT 1 FROM users WHERE username = ?")
+UPDATE_PASSWORD = register('update_password', "UPDATE users SET password = ? WHERE id = ?")
+INSERT_USER = register('insert_user',
+                       "INSERT INTO users (username, password, email, is_admin) VALUES (?, ?, ?, ?)")
+
+# Tables a hot query must not scan
+SCAN_CHECKED_TABLES = ('books', 'borrowed')
+
+_SCAN = re.compile(r'^SCAN (\w+)(?: USING (?:COVERING )?INDEX (\w+))?')
+
+def explain(conn, sql):
+    """
+    Return the EXPLAIN QUERY PLAN details of a statement.
+
+    Placeholders are bound to NULL, which does not change the plan.
+    """
+    sql = sql.replace('{ids}', '?')
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, (None,) * sql.count('?'))]
+
+def _partial_indexes(conn, tables):
+    return {row[1] for table in tables for row in conn.execute(f"PRAGMA index_list({table})") if row[4]}
+
+def check_plans(conn, catalog=None, tables=SCAN_CHECKED_TABLES):
+    """
+    Find hot queries whose plan scans one of the checked tables.
+
+    Args:
+        conn (sqlite3.Connection): Connection to a database with the full schema
+        catalog (dict): Queries to check by name; defaults to CATALOG
+        tables (tuple): Tables that must not be scanned
+
+    Returns:
+        list: (query name, plan detail) for every full scan found
+    """
+    partial = _partial_indexes(conn, tables)
+    violations = []
+    for query in (catalog or CATALOG).values():
+        if not query.hot:
+            continue
+        for detail in explain(conn, query.sql):
+            match = _SCAN.match(detail)
+            if match and match.group(1) in tables and match.group(2) not in partial:
+                violations.append((query.name, detail))
+    return violations
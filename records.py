@@ -0,0 +1,117 @@
+# records.py
+"""
+Record types for rows of the books and borrowed tables.
+
+Book and Loan are namedtuples: fields can be read by name (book.title,
+loan.borrow_date) by the templates and the Tk views, while each record is
+still a plain tuple underneath, with no per-instance __dict__: it takes
+one pointer more memory than the tuple sqlite3 would return (a dict per
+row takes about half as much again) and can be unpacked, sliced or
+serialized like one. Dates stay the strings SQLite stores; properties
+derive datetimes and due dates from them on demand.
+
+Use book_factory and loan_factory as the row_factory of a cursor running
+a query that selects BOOK_COLUMNS or LOAN_COLUMNS in order:
+
+    cursor = conn.cursor()
+    cursor.row_factory = records.book_factory
+    books = cursor.execute(queries.LIST_BOOKS).fetchall()
+
+benchmarks/bench_records.py compares their cost with tuples, sqlite3.Row
+and dicts.
+"""
+
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+import config
+from queries import BOOK_COLUMNS, LOAN_COLUMNS
+
+def parse_timestamp(value):
+    """Return a TIMESTAMP column value as a datetime, or None if it is empty or malformed."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+def _now():
+    # CURRENT_TIMESTAMP, which sets borrow_date, is in UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class Book(namedtuple('Book', BOOK_COLUMNS)):
+    """A row of the books table."""
+
+    __slots__ = ()
+
+    @property
+    def is_borrowed(self):
+        return not self.available
+
+class Loan(namedtuple('Loan', LOAN_COLUMNS)):
+    """A row of the borrowed table; due dates follow DEFAULT_BORROW_PERIOD_DAYS."""
+
+    __slots__ = ()
+
+    @property
+    def borrowed_at(self):
+        return parse_timestamp(self.borrow_date)
+
+    @property
+    def returned_at(self):
+        return parse_timestamp(self.return_date)
+
+    @property
+    def is_active(self):
+        return self.return_date is None
+
+    @property
+    def due_date(self):
+        borrowed_at = self.borrowed_at
+        if borrowed_at is None:
+            return None
+        return borrowed_at + timedelta(days=config.DEFAULT_BORROW_PERIOD_DAYS)
+
+    @property
+    def days_borrowed(self):
+        borrowed_at = self.borrowed_at
+        if borrowed_at is None:
+            return None
+        return ((self.returned_at or _now()) - borrowed_at).days
+
+    @property
+    def days_remaining(self):
+        """Whole days until the due date, negative once it has passed; None for returned loans."""
+        due_date = self.due_date
+        if due_date is None or not self.is_active:
+            return None
+        return (due_date - _now()).days
+
+    @property
+    def days_overdue(self):
+        days_remaining = self.days_remaining
+        if days_remaining is None or days_remaining >= 0:
+            return 0
+        return -days_remaining
+
+    @property
+    def is_overdue(self):
+        return self.days_overdue > 0
+
+    @property
+    def is_due_soon(self):
+        days_remaining = self.days_remaining
+        return days_remaining is not None and 0 <= days_remaining < config.DUE_SOON_DAYS
+
+# Row factories build the records straight from the row tuple, without the
+# argument parsing of Book(*row) or Book._make(row)
+_new_tuple = tuple.__new__
+
+def book_factory(cursor, row):
+    """Row factory returning Book records."""
+    return _new_tuple(Book, row)
+
+def loan_factory(cursor, row):
+    """Row factory returning Loan records."""
+    return _new_tuple(Loan, row)
@@ -0,0 +1,362 @@
+# request_metrics.py
+"""
+Per-request timing and SQL instrumentation for the web app.
+
+install(app) times every request and the SQL it runs on its pooled
+connection: while a request is measured, database.get_db hands out a
+TracedConnection that counts the statements, the time spent executing
+them and fetching their rows, and the rows fetched. Writes run on the
+write queue's own connection, so for those the time the request waited
+for the group commit is recorded instead.
+
+Each response reports the figures in a Server-Timing header, which
+browser developer tools show next to the request:
+
+    Server-Timing: sql;dur=3.20;desc="4 queries, 120 rows", write;dur=1.10, app;dur=6.80
+
+Totals per endpoint are kept in memory and served at /metrics in the
+Prometheus text format, to logged-in users and API bearer tokens only, as
+they reveal the app's endpoints and timings. They belong to one worker
+process: with several workers, each scrape sees the worker that answered
+it. Statements slower
+than SLOW_QUERY_THRESHOLD seconds are logged to LOG_FILE with their SQL
+but not their parameters, which can hold password hashes and names.
+"""
+
+import logging
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+from flask import Response, g, request
+
+import config
+
+# Upper bounds of the request duration histogram, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class RequestStats:
+    """SQL and write figures of one request."""
+
+    def __init__(self, slow_threshold=config.SLOW_QUERY_THRESHOLD):
+        self.started = perf_counter()
+        self.slow_threshold = slow_threshold
+        self.statements = 0
+        self.sql_time = 0.0
+        self.rows = 0
+        self.write_time = 0.0
+        self.slow = []
+        self._cursors = []
+
+    def statement_done(self, sql, elapsed):
+        if elapsed >= self.slow_threshold:
+            self.slow.append((sql, elapsed))
+
+    def finish(self):
+        """Close the books on statements whose rows were not all fetched; return the wall time."""
+        for cursor in self._cursors:
+            cursor._finish()
+        self._cursors = []
+        return perf_counter() - self.started
+
+class TracedCursor:
+    """A cursor that times its statements and counts the rows they return."""
+
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+        self._sql = None
+        self._elapsed = 0.0
+        stats._cursors.append(self)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._cursor, name, value)
+
+    def _begin(self, sql):
+        self._finish()
+        self._sql = sql
+        self._elapsed = 0.0
+        self._stats.statements += 1
+
+    def _add(self, elapsed, rows=0):
+        self._elapsed += elapsed
+        self._stats.sql_time += elapsed
+        self._stats.rows += rows
+
+    def _finish(self):
+        # A statement's time includes fetching its rows, where SQLite does
+        # most of the work, so it is only complete once they are all read
+        if self._sql is not None:
+            self._stats.statement_done(self._sql, self._elapsed)
+            self._sql = None
+
+    def _run(self, method, sql, *args):
+        self._begin(sql)
+        start = perf_counter()
+        try:
+            method(sql, *args)
+        finally:
+            self._add(perf_counter() - start)
+        return self
+
+    def execute(self, sql, parameters=()):
+        return self._run(self._cursor.execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(self._cursor.executemany, sql, seq_of_parameters)
+
+    def executescript(self, script):
+        return self._run(self._cursor.executescript, script)
+
+    def fetchone(self):
+        start = perf_counter()
+        row = self._cursor.fetchone()
+        self._add(perf_counter() - start, 0 if row is None else 1)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, *args):
+        start = perf_counter()
+        rows = self._cursor.fetchmany(*args)
+        self._add(perf_counter() - start, len(rows))
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        start = perf_counter()
+        rows = self._cursor.fetchall()
+        self._add(perf_counter() - start, len(rows))
+        self._finish()
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = perf_counter()
+        try:
+            row = next(self._cursor)
+        except StopIteration:
+            self._add(perf_counter() - start)
+            self._finish()
+            raise
+        self._add(perf_counter() - start, 1)
+        return row
+
+class TracedConnection:
+    """A connection whose statements and commits are recorded in a RequestStats."""
+
+    def __init__(self, conn, stats):
+        self._conn = conn
+        self._stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._conn.__exit__(*exc_info)
+
+    def cursor(self):
+        return TracedCursor(self._conn.cursor(), self._stats)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+    def commit(self):
+        start = perf_counter()
+        try:
+            self._conn.commit()
+        finally:
+            self._stats.sql_time += perf_counter() - start
+
+def current_stats():
+    """Return the RequestStats of the request being measured, or None."""
+    return g.get('request_stats')
+
+class _EndpointTotals:
+    __slots__ = ('buckets', 'count', 'seconds', 'statements', 'sql_seconds', 'rows', 'write_seconds')
+
+    def __init__(self):
+        self.buckets = [0] * (len(DURATION_BUCKETS) + 1)
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.rows = 0
+        self.write_seconds = 0.0
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class MetricsRegistry:
+    """Request and SQL totals of this process, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._responses = {}
+        self._endpoints = {}
+        self.slow_queries = 0
+
+    def record(self, endpoint, method, status, seconds, stats):
+        with self._lock:
+            key = (endpoint, method, status)
+            self._responses[key] = self._responses.get(key, 0) + 1
+            totals = self._endpoints.get((endpoint, method))
+            if totals is None:
+                totals = self._endpoints[(endpoint, method)] = _EndpointTotals()
+            totals.buckets[bisect_left(DURATION_BUCKETS, seconds)] += 1
+            totals.count += 1
+            totals.seconds += seconds
+            totals.statements += stats.statements
+            totals.sql_seconds += stats.sql_time
+            totals.rows += stats.rows
+            totals.write_seconds += stats.write_time
+            self.slow_queries += len(stats.slow)
+
+    def render(self):
+        """Return all metrics as Prometheus exposition text."""
+        with self._lock:
+            responses = sorted(self._responses.items())
+            endpoints = sorted(self._endpoints.items())
+            slow_queries = self.slow_queries
+
+        lines = ['# HELP smartlib_http_requests_total Requests answered, by endpoint, method and status.',
+                 '# TYPE smartlib_http_requests_total counter']
+        for (endpoint, method, status), count in responses:
+            lines.append(f'smartlib_http_requests_total{{endpoint="{_label(endpoint)}",'
+                         f'method="{method}",status="{status}"}} {count}')
+
+        lines += ['# HELP smartlib_http_request_duration_seconds Wall time of requests.',
+                  '# TYPE smartlib_http_request_duration_seconds histogram']
+        for (endpoint, method), totals in endpoints:
+            labels = f'endpoint="{_label(endpoint)}",method="{method}"'
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS + ('+Inf',), totals.buckets):
+                cumulative += count
+                lines.append(f'smartlib_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'smartlib_http_request_duration_seconds_sum{{{labels}}} {totals.seconds:.6f}')
+            lines.append(f'smartlib_http_request_duration_seconds_count{{{labels}}} {totals.count}')
+
+        for name, attribute, kind, text in (
+                ('smartlib_sql_statements_total', 'statements', 'counter', 'SQL statements executed.'),
+                ('smartlib_sql_duration_seconds_total', 'sql_seconds', 'counter',
+                 'Time spent executing SQL statements and fetching their rows.'),
+                ('smartlib_sql_rows_total', 'rows', 'counter', 'Rows fetched.'),
+                ('smartlib_write_queue_wait_seconds_total', 'write_seconds', 'counter',
+                 'Time spent waiting for writes to be committed by the write queue.')):
+            lines += [f'# HELP {name} {text}', f'# TYPE {name} {kind}']
+            for (endpoint, method), totals in endpoints:
+                value = getattr(totals, attribute)
+                value = f'{value:.6f}' if isinstance(value, float) else value
+                lines.append(f'{name}{{endpoint="{_label(endpoint)}",method="{method}"}} {value}')
+
+        lines += ['# HELP smartlib_slow_queries_total SQL statements slower than the slow query threshold.',
+                  '# TYPE smartlib_slow_queries_total counter',
+                  f'smartlib_slow_queries_total {slow_queries}']
+        return '\n'.join(lines) + '\n'
+
+_slow_query_loggers = {}
+_slow_query_loggers_lock = threading.Lock()
+
+def slow_query_logger(path=config.LOG_FILE):
+    """Return the logger writing slow queries to a log file, created on first use."""
+    with _slow_query_loggers_lock:
+        logger = _slow_query_loggers.get(path)
+        if logger is None:
+            logger = logging.getLogger(f'smartlib.slow_queries.{len(_slow_query_loggers)}')
+            logger.propagate = False
+            logger.setLevel(logging.WARNING)
+            # delay: the file is only created when the first slow query is logged
+            handler = logging.FileHandler(path, delay=True)
+            handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+            logger.addHandler(handler)
+            _slow_query_loggers[path] = logger
+        return logger
+
+def server_timing(stats, seconds):
+    """Format a request's figures as a Server-Timing header value."""
+    queries = 'query' if stats.statements == 1 else 'queries'
+    parts = [f'sql;dur={stats.sql_time * 1000:.2f};desc="{stats.statements} {queries}, {stats.rows} rows"']
+    if stats.write_time:
+        parts.append(f'write;dur={stats.write_time * 1000:.2f}')
+    parts.append(f'app;dur={seconds * 1000:.2f}')
+    return ', '.join(parts)
+
+def install(app, authorize):
+    """
+    Measure every request of an app and serve the totals at /metrics.
+
+    Args:
+        app (Flask): The app to measure
+        authorize (callable): Returns True when the current request may
+                              read /metrics; others get 401
+
+    Returns:
+        MetricsRegistry: The registry the app records into
+    """
+    registry = MetricsRegistry()
+    app.extensions['request_metrics'] = registry
+    threshold = app.config['SLOW_QUERY_THRESHOLD']
+    log_file = app.config['LOG_FILE']
+
+    def record(stats, status):
+        seconds = stats.finish()
+        endpoint = request.endpoint or 'unmatched'
+        registry.record(endpoint, request.method, status, seconds, stats)
+        if stats.slow:
+            logger = slow_query_logger(log_file)
+            for sql, elapsed in stats.slow:
+                logger.warning("slow query %.1f ms in %s %s: %s", elapsed * 1000, request.method,
+                               endpoint, ' '.join(sql.split()))
+        return seconds
+
+    def start_request():
+        g.request_stats = RequestStats(threshold)
+
+    def finish_request(response):
+        stats = g.pop('request_stats', None)
+        if stats is not None:
+            response.headers['Server-Timing'] = server_timing(stats, record(stats, response.status_code))
+        return response
+
+    def abandon_request(exception=None):
+        # Only reached with the stats still set when no response was made
+        stats = g.pop('request_stats', None)
+        if stats is not None:
+            record(stats, 500)
+
+    def metrics():
+        if not authorize():
+            return Response('Authentication required\n', 401, {'WWW-Authenticate': 'Bearer'},
+                            mimetype='text/plain')
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.teardown_request(abandon_request)
+    app.add_url_rule('/metrics', view_func=metrics)
+    return registry
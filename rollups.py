@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# rollups.py
+"""
+Daily circulation rollups.
+
+Time series such as "loans per day over the last three years" would read
+every row of the borrowed table. Instead, two rollup tables hold one row
+per day:
+
+- daily_stats: loans started (borrows) and ended (returns) that day,
+  across the library
+- daily_book_stats: the same counts per book title, for days on which
+  the title was borrowed or returned
+
+Triggers on borrowed keep both up to date inside the transaction that
+changes a loan, whichever program writes it (the web app, the Tk client
+or the API): inserting a loan counts its borrow, and its return if it
+already has one; updating a loan's dates or title moves its counts. A
+chart over three years then reads about a thousand small rows.
+
+Deleting loans (archiving old history) leaves the rollups unchanged, so
+they keep counting every loan ever recorded. backfill() rebuilds them from
+a loan table, for databases that had loans before the rollups existed
+and after bulk loads that ran with the triggers turned off. Once loans
+have been archived (archive.py), rebuild them from the loan_history view
+(--archive), or the archived loans drop out of the counts.
+
+Usage:
+    python rollups.py backfill [--database library.db] [--archive library_archive.db]
+"""
+
+import argparse
+import sys
+
+import config
+import queries
+
+# Rollup tables and the loan columns they are grouped by, besides the day
+ROLLUP_TABLES = {
+    'daily_stats': (),
+    'daily_book_stats': ('book_title',),
+}
+
+def _count(table, keys, row, date_column, sign):
+    """Return a statement adding sign to the borrows or returns of row's day."""
+    counted = 'borrows' if date_column == 'borrow_date' else 'returns'
+    other = 'returns' if counted == 'borrows' else 'borrows'
+    columns = ', '.join(keys + ('day', counted, other))
+    values = ', '.join([f'{row}.{key}' for key in keys] + [f'date({row}.{date_column})', str(sign), '0'])
+    conflict = ', '.join(keys + ('day',))
+    # The WHERE clause also tells SQLite's parser the ON CONFLICT belongs to the INSERT
+    return (f"INSERT INTO {table} ({columns}) SELECT {values} WHERE {row}.{date_column} IS NOT NULL "
+            f"ON CONFLICT ({conflict}) DO UPDATE SET {counted} = {counted} + excluded.{counted};")
+
+def _counts(row, sign):
+    return '\n'.join(_count(table, keys, row, column, sign)
+                     for table, keys in ROLLUP_TABLES.items()
+                     for column in ('borrow_date', 'return_date'))
+
+def initialize_rollups(conn):
+    """
+    Create the rollup tables and the triggers that maintain them.
+
+    Rollup tables created here for the first time are backfilled from the
+    loans already recorded. The triggers exist before the backfill starts,
+    and the backfill replaces the tables' contents, so a loan written
+    meanwhile by another process is counted exactly once.
+    """
+    existing = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('daily_stats', 'daily_book_stats')")}
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS daily_stats (
+            day TEXT PRIMARY KEY,
+            borrows INTEGER NOT NULL DEFAULT 0,
+            returns INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS daily_book_stats (
+            book_title TEXT NOT NULL,
+            day TEXT NOT NULL,
+            borrows INTEGER NOT NULL DEFAULT 0,
+            returns INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (book_title, day)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS borrowed_rollup_insert
+        AFTER INSERT ON borrowed
+        BEGIN
+            {_counts('NEW', 1)}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS borrowed_rollup_update
+        AFTER UPDATE OF borrow_date, return_date, book_title ON borrowed
+        WHEN OLD.borrow_date IS NOT NEW.borrow_date OR OLD.return_date IS NOT NEW.return_date
+             OR OLD.book_title IS NOT NEW.book_title
+        BEGIN
+            {_counts('OLD', -1)}
+            {_counts('NEW', 1)}
+        END
+    ''')
+    if existing != set(ROLLUP_TABLES):
+        backfill(conn)
+
+def backfill(conn, source='borrowed'):
+    """
+    Rebuild the rollup tables from a loan table, replacing their contents.
+
+    The caller commits; until then, writers wait, so no loan is missed.
+
+    Args:
+        conn (sqlite3.Connection): Open database connection
+        source (str): Table or view holding the loans to count, such as a
+                      union of the live and archived loans
+
+    Returns:
+        int: Number of daily_stats rows written
+    """
+    for table, keys in ROLLUP_TABLES.items():
+        conn.execute(f"DELETE FROM {table}")
+        grouped = ', '.join(keys + ('day',))
+        conn.execute(f'''
+            INSERT INTO {table} ({grouped}, borrows, returns)
+            SELECT {grouped}, SUM(borrows), SUM(returns) FROM (
+                SELECT {''.join(key + ', ' for key in keys)}date(borrow_date) AS day, 1 AS borrows, 0 AS returns
+                FROM {source} WHERE borrow_date IS NOT NULL
+                UNION ALL
+                SELECT {''.join(key + ', ' for key in keys)}date(return_date), 0, 1
+                FROM {source} WHERE return_date IS NOT NULL
+            ) GROUP BY {grouped}
+        ''')
+    return conn.execute("SELECT COUNT(*) FROM daily_stats").fetchone()[0]
+
+def daily_counts(conn, since=None, until=None, book_title=None):
+    """
+    Return borrows and returns per day, from the rollups.
+
+    Args:
+        conn (sqlite3.Connection): Open database connection
+        since (str): First day, YYYY-MM-DD; defaults to the first day recorded
+        until (str): Last day, YYYY-MM-DD; defaults to the last day recorded
+        book_title (str): Only count loans of this title
+
+    Returns:
+        list: (day, borrows, returns) tuples in day order, for days with
+              any borrow or return
+    """
+    bounds = (since or '0000-00-00', until or '9999-99-99')
+    if book_title is None:
+        return conn.execute(queries.DAILY_STATS, bounds).fetchall()
+    return conn.execute(queries.DAILY_BOOK_STATS, (book_title,) + bounds).fetchall()
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the daily circulation rollups")
+    parser.add_argument('command', choices=['backfill'], help="Operation to run")
+    parser.add_argument('--database', default=config.DATABASE_NAME, help="Path of the library database")
+    parser.add_argument('--archive', help="Also count the loans moved to this archive database")
+    args = parser.parse_args()
+
+    import archive
+    import database
+    database.initialize_database(args.database)
+    conn = database.connect(args.database)
+    try:
+        source = 'borrowed'
+        if args.archive:
+            archive.attach_archive(conn, args.archive)
+            source = 'loan_history'
+        days = backfill(conn, source)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Rebuilt daily rollups: {days} days")
+    return True
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
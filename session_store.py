@@ -0,0 +1,243 @@
+# session_store.py
+"""
+Server-side sessions for the web app.
+
+Flask's default session keeps everything in a signed cookie that is sent
+with every request and rewritten whenever the session changes. With a
+server-side store the cookie carries only a random session id, and the
+data stays on the server:
+
+- SQLiteSessionStore keeps sessions in the sessions table of the library
+  database, so every worker process of a multi-worker server sees the
+  same sessions. Expired rows are deleted a batch at a time, at most once
+  per SESSION_PURGE_INTERVAL.
+- MemorySessionStore keeps the most recently used SESSION_MEMORY_SIZE
+  sessions in a dictionary. It is the cheapest per request but belongs to
+  one process, so it only suits a single worker.
+
+Sessions expire SESSION_TIMEOUT seconds after they were last used. A
+request that does not change the session only writes to the store when
+the stored expiry is more than SESSION_TOUCH_INTERVAL seconds old, so
+read-only page views do not turn into database writes. Clearing a
+session (as login and logout do) gives it a new id.
+
+config.SESSION_BACKEND selects the store; "cookie" keeps Flask's default
+cookie sessions. Flask-Session is not used: its only database backend
+needs SQLAlchemy, which the project does not depend on.
+"""
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+import config
+import database
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session data with the id it is stored under."""
+
+    def __init__(self, initial=None, sid=None, expires_at=None):
+        def on_update(session):
+            session.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.new = sid is None
+        self.modified = False
+        self.rotate = False
+
+    def clear(self):
+        # A cleared session starts over under a new id, so an id known
+        # before login is useless after it
+        super().clear()
+        self.rotate = True
+
+class MemorySessionStore:
+    """Most recently used sessions, kept in this process's memory."""
+
+    def __init__(self, size=config.SESSION_MEMORY_SIZE):
+        self.size = size
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, sid, now):
+        """Return (data, expires_at) of a live session, or None."""
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                del self._sessions[sid]
+                return None
+            self._sessions.move_to_end(sid)
+            return entry
+
+    def save(self, sid, data, expires_at):
+        """Store a session's serialized data and expiry time."""
+        with self._lock:
+            self._sessions[sid] = (data, expires_at)
+            self._sessions.move_to_end(sid)
+            while len(self._sessions) > self.size:
+                self._sessions.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def purge(self, now):
+        """Delete expired sessions and return how many were removed."""
+        with self._lock:
+            expired = [sid for sid, (_data, expires_at) in self._sessions.items() if expires_at <= now]
+            for sid in expired:
+                del self._sessions[sid]
+        return len(expired)
+
+class SQLiteSessionStore:
+    """Sessions kept in the database, shared by all worker processes."""
+
+    def __init__(self, path=config.DATABASE_NAME, purge_interval=config.SESSION_PURGE_INTERVAL,
+                 purge_batch=config.SESSION_PURGE_BATCH):
+        self.path = path
+        self.purge_interval = purge_interval
+        self.purge_batch = purge_batch
+        self._initialized = False
+        self._purged_at = time.monotonic()
+
+    def _connection(self):
+        # Not the request's pool: sessions are saved while the request still holds g.db
+        pool = database.get_pool(self.path, role='sessions')
+        if not self._initialized:
+            with pool.connection() as conn:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS sessions (
+                        id TEXT PRIMARY KEY,
+                        data TEXT NOT NULL,
+                        expires_at REAL NOT NULL
+                    ) WITHOUT ROWID
+                ''')
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)")
+                conn.commit()
+            self._initialized = True
+        return pool.connection()
+
+    def load(self, sid, now):
+        """Return (data, expires_at) of a live session, or None."""
+        with self._connection() as conn:
+            return conn.execute("SELECT data, expires_at FROM sessions WHERE id = ? AND expires_at > ?",
+                                (sid, now)).fetchone()
+
+    def save(self, sid, data, expires_at):
+        """Store a session's serialized data and expiry time."""
+        with self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)",
+                         (sid, data, expires_at))
+            conn.commit()
+        now = time.monotonic()
+        if now - self._purged_at >= self.purge_interval:
+            self._purged_at = now
+            self.purge(time.time())
+
+    def delete(self, sid):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (sid,))
+            conn.commit()
+
+    def purge(self, now):
+        """
+        Delete expired sessions in batches, committing after each, so the
+        write lock is never held for long.
+
+        Returns:
+            int: Number of sessions removed
+        """
+        removed = 0
+        with self._connection() as conn:
+            while True:
+                cursor = conn.execute(
+                    "DELETE FROM sessions WHERE id IN "
+                    "(SELECT id FROM sessions WHERE expires_at <= ? LIMIT ?)",
+                    (now, self.purge_batch))
+                conn.commit()
+                removed += cursor.rowcount
+                if cursor.rowcount < self.purge_batch:
+                    return removed
+
+class ServerSideSessionInterface(SessionInterface):
+    """Flask session interface keeping session data in a store."""
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store, touch_interval=config.SESSION_TOUCH_INTERVAL):
+        self.store = store
+        self.touch_interval = touch_interval
+
+    def _lifetime(self, app):
+        return app.permanent_session_lifetime.total_seconds()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            entry = self.store.load(sid, time.time())
+            if entry is not None:
+                data, expires_at = entry
+                try:
+                    return ServerSideSession(self.serializer.loads(data), sid, expires_at)
+                except ValueError:
+                    pass
+        return ServerSideSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.sid is not None and (session.modified or session.rotate):
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app))
+            return
+
+        now = time.time()
+        if session.rotate and session.sid is not None:
+            self.store.delete(session.sid)
+            session.sid = None
+        new_sid = session.sid is None
+        expires_at = now + self._lifetime(app)
+        touch_due = session.expires_at is None or expires_at - session.expires_at >= self.touch_interval
+        if not (new_sid or session.modified or touch_due):
+            return
+
+        if new_sid:
+            session.sid = secrets.token_urlsafe(32)
+        self.store.save(session.sid, self.serializer.dumps(dict(session)), expires_at)
+        session.expires_at = expires_at
+        response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                            secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+        response.vary.add('Cookie')
+
+def session_interface(backend, path=config.DATABASE_NAME):
+    """
+    Return the session interface for a configured backend.
+
+    Args:
+        backend (str): "sqlite", "memory" or "cookie"
+        path (str): Database file for the sqlite backend
+
+    Returns:
+        SessionInterface or None: None keeps Flask's cookie sessions
+    """
+    if backend == 'sqlite':
+        return ServerSideSessionInterface(SQLiteSessionStore(path))
+    if backend == 'memory':
+        return ServerSideSessionInterface(MemorySessionStore())
+    if backend == 'cookie':
+        return None
+    raise ValueError(f"Unknown session backend: {backend}")
@@ -0,0 +1,143 @@
+import unittest
+import tempfile
+import shutil
+import os
+import json
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import analytics
+import catalog_snapshot
+import circulation
+import config
+import database
+import test_api
+from benchmarks.datagen import generate
+
+@contextmanager
+def local_timezone(name):
+    """Run the block with the process's local time zone set to name (POSIX only)."""
+    previous = os.environ.get('TZ')
+    os.environ['TZ'] = name
+    time.tzset()
+    try:
+        yield
+    finally:
+        if previous is None:
+            del os.environ['TZ']
+        else:
+            os.environ['TZ'] = previous
+        time.tzset()
+
+@unittest.skipUnless(analytics.available(), "NumPy is not installed")
+class ReportCacheTests(unittest.TestCase):
+    """Test the circulation reports and their cache."""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.test_dir, 'reports.db')
+        end = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        generate(self.db_path, books=200, students=40, loans=3000, years=2, end=end)
+        self.conn = database.connect(self.db_path)
+        self.now = [1000.0]
+        self.cache = analytics.ReportCache(ttl=60, clock=lambda: self.now[0])
+        self.loads = 0
+        load_snapshot = catalog_snapshot.load_snapshot
+
+        def counting_load(conn):
+            self.loads += 1
+            return load_snapshot(conn)
+        catalog_snapshot.load_snapshot = counting_load
+        self.addCleanup(setattr, catalog_snapshot, 'load_snapshot', load_snapshot)
+
+    def tearDown(self):
+        self.conn.close()
+        shutil.rmtree(self.test_dir)
+
+    def test_report_contents(self):
+        """Test that a report covers every section, restricted to its window."""
+        report = self.cache.report(self.conn, window_days=90, top=5)
+        self.assertEqual(report['window_days'], 90)
+        in_window = self.conn.execute(
+            "SELECT COUNT(*) FROM borrowed WHERE CAST(strftime('%s', borrow_date) AS INTEGER) >= "
+            "CAST(strftime('%s', ?) AS INTEGER)", (report['since'],)).fetchone()[0]
+        self.assertEqual(report['loans'], in_window)
+        self.assertEqual(len(report['top_books']), 5)
+        self.assertEqual(sum(month['loans'] for month in report['overdue_by_month']), in_window)
+        self.assertTrue(0 < report['utilization']['mean'] <= 1)
+        self.assertGreater(report['loan_duration']['count'], 0)
+        json.dumps(report)
+
+    def test_cached_until_tables_change(self):
+        """Test that reports are reused until a borrow changes the counters."""
+        first = self.cache.report(self.conn)
+        self.assertIs(self.cache.report(self.conn), first)
+        self.assertEqual(self.loads, 1)
+
+        title = self.conn.execute("SELECT title FROM books WHERE available = 1 LIMIT 1").fetchone()[0]
+        circulation.borrow_book(self.conn, 'Ada', title)
+        self.conn.commit()
+        second = self.cache.report(self.conn)
+        self.assertIsNot(second, first)
+        self.assertEqual(self.loads, 2)
+        self.assertEqual(second['loans'], first['loans'] + 1)
+
+    def test_expired_report_reuses_snapshot(self):
+        """Test that an expired report is recomputed without reloading unchanged tables."""
+        first = self.cache.report(self.conn)
+        self.now[0] += 61
+        second = self.cache.report(self.conn)
+        self.assertIsNot(second, first)
+        self.assertEqual(self.loads, 1)
+
+    @unittest.skipUnless(hasattr(time, 'tzset'), "time.tzset is not available")
+    def test_durations_in_local_timezone(self):
+        """Test that a loan returned right away never lasts a negative time, whatever the time zone."""
+        with local_timezone('America/Los_Angeles'):
+            title = self.conn.execute("SELECT title FROM books WHERE available = 1 LIMIT 1").fetchone()[0]
+            loan_id = circulation.borrow_book(self.conn, 'Ada', title)
+            circulation.return_book(self.conn, loan_id)
+            self.conn.commit()
+            report = self.cache.report(self.conn)
+            durations = catalog_snapshot.loan_durations(catalog_snapshot.load_snapshot(self.conn))
+        self.assertGreaterEqual(durations.min(), 0)
+        self.assertGreaterEqual(report['loan_duration']['p50_days'], 0)
+
+    def test_windows_cached_separately(self):
+        """Test that reports for different windows do not share a cache entry."""
+        short = self.cache.report(self.conn, window_days=30)
+        long = self.cache.report(self.conn, window_days=700)
+        self.assertLess(short['loans'], long['loans'])
+        self.assertIs(self.cache.report(self.conn, window_days=30), short)
+        self.assertEqual(self.loads, 1)
+
+@unittest.skipUnless(analytics.available(), "NumPy is not installed")
+class ReportEndpointTests(test_api.APITestCase):
+    """Test /api/v1/reports and the dashboard reports."""
+
+    def test_reports_json(self):
+        """Test the reports endpoint, its arguments and its ETag."""
+        rv, data = self.get_json('/api/v1/reports?window=730&top=3')
+        self.assertEqual(data['loans'], 1)
+        self.assertEqual({book['title'] for book in data['top_books']}, {'Book 004'})
+        rv = self.client.get('/api/v1/reports?window=730&top=3',
+                             headers={**self.auth, 'If-None-Match': rv.headers['ETag']})
+        self.assertEqual(rv.status_code, 304)
+
+    def test_reports_arguments(self):
+        """Test that out of range or malformed arguments are refused."""
+        for query in ('window=0', 'window=x', 'top=0', f'window={config.ARCHIVE_HORIZON_DAYS + 1}'):
+            with self.subTest(query=query):
+                rv = self.client.get(f'/api/v1/reports?{query}', headers=self.auth)
+                self.assertEqual(rv.status_code, 400)
+
+    def test_dashboard_reports(self):
+        """Test that the dashboard shows the most borrowed books."""
+        self.client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+        rv = self.client.get('/dashboard')
+        self.assertEqual(rv.status_code, 200)
+        self.assertIn(b'Most Borrowed Books', rv.data)
+        self.assertIn(b'Book 004', rv.data)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+import unittest
+import tempfile
+import shutil
+import os
+import gzip
+import json
+import sqlite3
+import database
+from app import create_app
+from write_queue import get_write_queue, close_write_queues
+
+class APITestCase(unittest.TestCase):
+    """Base class setting up an app with a populated database."""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.test_db = os.path.join(self.test_dir, "library.db")
+        database.initialize_database(self.test_db)
+        conn = sqlite3.connect(self.test_db)
+        conn.executemany("INSERT INTO books (title, author, isbn) VALUES (?, ?, ?)",
+                         [(f"Book {i:03d}", f"Author {i}", f"{i:010d}") for i in range(1, 26)])
+        conn.execute("UPDATE books SET available = 0 WHERE id IN (2, 4)")
+        conn.executemany("INSERT INTO borrowed (student_name, book_title, borrow_date) VALUES (?, ?, ?)",
+                         [('Ann', 'Book 002', '2020-01-01 10:00:00'),
+                          ('Bob', 'Book 004', '2999-01-01 10:00:00')])
+        conn.commit()
+        conn.close()
+
+        self.app = create_app({'DATABASE': self.test_db, 'SECRET_KEY': 'test',
+                               'TESTING': True, 'API_TOKEN': 'secret'})
+        self.client = self.app.test_client()
+        self.auth = {'Authorization': 'Bearer secret'}
+
+    def tearDown(self):
+        close_write_queues(self.test_db)
+        database.get_pool(self.test_db).close()
+        shutil.rmtree(self.test_dir)
+
+    def get_json(self, url, **kwargs):
+        rv = self.client.get(url, headers=self.auth, **kwargs)
+        self.assertEqual(rv.status_code, 200, rv.data)
+        return rv, json.loads(rv.data)
+
+class APITests(APITestCase):
+    """Test the /api/v1 endpoints."""
+
+    def test_requires_authentication(self):
+        """Test that anonymous requests are refused."""
+        self.assertEqual(self.client.get('/api/v1/books').status_code, 401)
+        for bearer in ('secreT', 'sécret'):
+            headers = {'Authorization': f'Bearer {bearer}'}
+            self.assertEqual(self.client.get('/api/v1/books', headers=headers).status_code, 401)
+        self.client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+        self.assertEqual(self.client.get('/api/v1/books').status_code, 200)
+
+    def test_session_tokens(self):
+        """Test logging in for a signed token and using it as a bearer token."""
+        rv = self.client.post('/api/v1/tokens', json={'username': 'admin', 'password': 'wrong'})
+        self.assertEqual(rv.status_code, 401)
+        rv = self.client.post('/api/v1/tokens', json={'username': 'admin', 'password': 'admin123'})
+        self.assertEqual(rv.status_code, 201)
+        token = json.loads(rv.data)['token']
+        headers = {'Authorization': f'Bearer {token}'}
+        self.assertEqual(self.client.get('/api/v1/books', headers=headers).status_code, 200)
+        headers = {'Authorization': f'Bearer {token[:-2]}xx'}
+        self.assertEqual(self.client.get('/api/v1/books', headers=headers).status_code, 401)
+
+    def test_keyset_pagination(self):
+        """Test walking all books page by page."""
+        titles = []
+        url = '/api/v1/books?limit=10'
+        while url:
+            _rv, body = self.get_json(url)
+            titles.extend(book['title'] for book in body['books'])
+            url = f"/api/v1/books?limit=10&after={body['next']}" if body['next'] else None
+        self.assertEqual(titles, [f"Book {i:03d}" for i in range(1, 26)])
+
+    def test_sparse_fields(self):
+        """Test that only requested fields are returned."""
+        _rv, body = self.get_json('/api/v1/books?fields=title&available=1&limit=2')
+        self.assertEqual(body['books'], [{'title': 'Book 001'}, {'title': 'Book 003'}])
+        self.assertEqual(self.client.get('/api/v1/books?fields=password', headers=self.auth).status_code, 400)
+
+    def test_loans_and_stats(self):
+        """Test loan listing and circulation counts."""
+        _rv, body = self.get_json('/api/v1/loans?active=1&fields=student_name')
+        self.assertEqual(body['loans'], [{'student_name': 'Ann'}, {'student_name': 'Bob'}])
+
+        _rv, body = self.get_json('/api/v1/stats')
+        self.assertEqual(body, {'total_books': 25, 'available_books': 23, 'borrowed_books': 2,
+                                'total_loans': 2, 'overdue_loans': 1})
+
+    def test_etag_revalidation(self):
+        """Test 304 responses until the underlying table changes."""
+        rv, _body = self.get_json('/api/v1/books')
+        etag = rv.headers['ETag']
+
+        rv = self.client.get('/api/v1/books', headers={**self.auth, 'If-None-Match': etag})
+        self.assertEqual(rv.status_code, 304)
+        self.assertEqual(rv.data, b'')
+
+        # Changes to other tables do not invalidate the books listing
+        conn = sqlite3.connect(self.test_db)
+        conn.execute("INSERT INTO borrowed (student_name, book_title) VALUES ('Cy', 'Book 005')")
+        conn.commit()
+        rv = self.client.get('/api/v1/books', headers={**self.auth, 'If-None-Match': etag})
+        self.assertEqual(rv.status_code, 304)
+
+        conn.execute("UPDATE books SET available = 0 WHERE title = 'Book 005'")
+        conn.commit()
+        conn.close()
+        rv = self.client.get('/api/v1/books', headers={**self.auth, 'If-None-Match': etag})
+        self.assertEqual(rv.status_code, 200)
+        self.assertNotEqual(rv.headers['ETag'], etag)
+
+    def test_gzip(self):
+        """Test that large responses are compressed when accepted."""
+        rv, plain = self.get_json('/api/v1/books?limit=25')
+        self.assertNotIn('Content-Encoding', rv.headers)
+
+        rv = self.client.get('/api/v1/books?limit=25', headers={**self.auth, 'Accept-Encoding': 'gzip'})
+        self.assertEqual(rv.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(rv.data)), plain)
+
+class LoanBatchTests(APITestCase):
+    """Test /api/v1/loans:batch."""
+
+    def post_batch(self, operations):
+        return self.client.post('/api/v1/loans:batch', json={'operations': operations}, headers=self.auth)
+
+    def test_batch_with_per_item_results(self):
+        """Test that failing items are reported without undoing the others."""
+        rv = self.post_batch([
+            {'op': 'borrow', 'student_name': 'Cy', 'book_title': 'Book 005'},
+            {'op': 'borrow', 'student_name': 'Di', 'book_title': 'Book 005'},
+            {'op': 'return', 'borrow_id': 1},
+            {'op': 'return', 'borrow_id': 999},
+            {'op': 'renew'},
+        ])
+        self.assertEqual(rv.status_code, 200)
+        body = json.loads(rv.data)
+        self.assertEqual([result['ok'] for result in body['results']], [True, False, True, False, False])
+        self.assertEqual(body['results'][1]['error'], 'Book is not available for borrowing')
+        self.assertEqual((body['succeeded'], body['failed']), (2, 3))
+
+        conn = sqlite3.connect(self.test_db)
+        available = dict(conn.execute("SELECT title, available FROM books WHERE title IN ('Book 002', 'Book 005')"))
+        conn.close()
+        self.assertEqual(available, {'Book 002': 1, 'Book 005': 0})
+
+    def test_large_batch_commits_once(self):
+        """Test that a large batch is one write queue job, not a transaction on the request connection."""
+        statements = []
+        pool = database.get_pool(self.test_db)
+        with pool.connection() as conn:
+            conn.set_trace_callback(statements.append)
+        write_queue = get_write_queue(self.test_db)
+        batches = write_queue.batches
+
+        operations = [{'op': 'borrow', 'student_name': f'S{i}', 'book_title': f'Book {i:03d}'}
+                      for i in range(5, 26)]
+        rv = self.post_batch(operations)
+        self.assertEqual(json.loads(rv.data)['succeeded'], 21)
+        self.assertEqual((write_queue.batches - batches, write_queue.jobs), (1, 1))
+        self.assertNotIn('BEGIN IMMEDIATE', statements)
+
+    def test_invalid_batches(self):
+        """Test rejection of malformed and oversized batches."""
+        rv = self.client.post('/api/v1/loans:batch', data='x', headers=self.auth)
+        self.assertEqual(rv.status_code, 400)
+        rv = self.post_batch([{'op': 'return', 'borrow_id': 1}] * 1001)
+        self.assertEqual(rv.status_code, 413)
+
+if __name__ == '__main__':
+    unittest.main()
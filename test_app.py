@@ -4,6 +4,7 @@ import os
 import sqlite3
 from datetime import datetime, timedelta
 import json
+from unittest import mock
 import hashlib
 from app import app, initialize_database
 
@@ -291,6 +292,17 @@ class BorrowingTests(LibraryAppTestCase):
         rv = self.app.get('/borrow')
         self.assertEqual(rv.status_code, 200)
         self.assertIn(b'Borrow Book', rv.data)
+        self.assertIn(b'<option value="Test Book 2"', rv.data)
+        self.assertNotIn(b'built-in method', rv.data)
+
+    def test_borrow_page_served_from_cache(self):
+        """Test that the borrow form lists the books from the availability cache."""
+        self.login('testadmin', 'admin123')
+        self.app.get('/borrow')
+        with mock.patch('circulation.list_books', side_effect=AssertionError('queried the books table')):
+            rv = self.app.get('/borrow')
+        self.assertEqual(rv.status_code, 200)
+        self.assertIn(b'<option value="Test Book 2"', rv.data)
     
     def test_borrow_book_success(self):
         """Test borrowing a book successfully."""
@@ -327,6 +339,19 @@ class BorrowingTests(LibraryAppTestCase):
         self.assertIn(b'Borrowed Books', rv.data)
         self.assertIn(b'John Doe', rv.data)  # From test data
     
+    def test_borrowed_books_hides_returned_loans(self):
+        """Test that the borrowed books page only lists loans still out."""
+        conn = sqlite3.connect(self.test_db)
+        conn.execute("INSERT INTO borrowed (student_name, book_title, borrow_date, return_date) "
+                     "VALUES ('Mary Major', 'Test Book 2', '2024-01-01', '2024-01-05')")
+        conn.commit()
+        conn.close()
+        self.login('testadmin', 'admin123')
+        rv = self.app.get('/borrowed_books')
+        self.assertIn(b'John Doe', rv.data)
+        self.assertNotIn(b'Mary Major', rv.data)
+        self.assertIn(b'Currently Borrowed Books (1)', rv.data)
+    
     def test_return_book_success(self):
         """Test returning a book successfully."""
         self.login('testadmin', 'admin123')
@@ -0,0 +1,98 @@
+import unittest
+import tempfile
+import shutil
+import os
+import sqlite3
+import archive
+import circulation
+import database
+import rollups
+
+class ArchiveTests(unittest.TestCase):
+    """Test moving old loans to the archive database and the history view."""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.test_dir, 'library.db')
+        self.archive_path = archive.archive_path(self.db_path)
+        database.initialize_database(self.db_path)
+        self.conn = database.connect(self.db_path)
+        circulation.add_book(self.conn, 'Dune', 'Frank Herbert', None)
+        circulation.add_book(self.conn, 'Emma', 'Jane Austen', None)
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+        shutil.rmtree(self.test_dir)
+
+    def add_loan(self, title, borrow_date, return_date=None):
+        cursor = self.conn.execute("INSERT INTO borrowed (student_name, book_title, borrow_date, return_date) "
+                                   "VALUES ('Ada', ?, ?, ?)", (title, borrow_date, return_date))
+        self.conn.commit()
+        return cursor.lastrowid
+
+    def live_ids(self):
+        return [row[0] for row in self.conn.execute("SELECT id FROM main.borrowed ORDER BY id")]
+
+    def test_archive_path(self):
+        """Test that the archive lives next to the live database."""
+        self.assertEqual(archive.archive_path('library.db'), 'library_archive.db')
+        self.assertEqual(archive.archive_path(os.path.join('data', 'lib.db')),
+                         os.path.join('data', 'lib_archive.db'))
+
+    def test_old_returned_loans_moved(self):
+        """Test that only loans returned before the horizon leave the live table."""
+        old = self.add_loan('Dune', '2020-01-01 09:00:00', '2020-01-10 09:00:00')
+        still_out = self.add_loan('Emma', '2020-02-01 09:00:00')
+        recent = self.add_loan('Dune', '2020-03-01 09:00:00', '2999-01-01 09:00:00')
+
+        self.assertEqual(archive.archive_loans(self.conn, self.archive_path, horizon_days=30), 1)
+        self.assertEqual(self.live_ids(), [still_out, recent])
+        archived = sqlite3.connect(self.archive_path)
+        self.assertEqual(archived.execute("SELECT * FROM borrowed").fetchall(),
+                         [(old, 'Ada', 'Dune', '2020-01-01 09:00:00', '2020-01-10 09:00:00')])
+        archived.close()
+
+    def test_chunks(self):
+        """Test that chunks smaller than the backlog move every old loan."""
+        ids = [self.add_loan('Dune', f'2020-01-{day:02d} 09:00:00', f'2020-01-{day:02d} 17:00:00')
+               for day in range(1, 11)]
+        recent = self.add_loan('Emma', '2020-02-01 09:00:00')
+        self.assertEqual(archive.archive_loans(self.conn, self.archive_path, horizon_days=30, batch_size=3), 10)
+        self.assertEqual(self.live_ids(), [recent])
+        self.assertEqual([row[0] for row in self.conn.execute("SELECT id FROM loan_history ORDER BY id")],
+                         ids + [recent])
+        self.assertEqual(archive.archive_loans(self.conn, self.archive_path, horizon_days=30), 0)
+
+    def test_interrupted_run_finished(self):
+        """Test that a chunk left in both databases is moved once by the next run."""
+        loan_id = self.add_loan('Dune', '2020-01-01 09:00:00', '2020-01-10 09:00:00')
+        archive.attach_archive(self.conn, self.archive_path)
+        self.conn.execute("INSERT INTO archive.borrowed SELECT * FROM main.borrowed")
+        self.conn.commit()
+        self.assertEqual(archive.archive_loans(self.conn, self.archive_path, horizon_days=30), 1)
+        self.assertEqual(self.conn.execute("SELECT id FROM loan_history").fetchall(), [(loan_id,)])
+
+    def test_history_and_rollups(self):
+        """Test that archived loans stay in the rollups and can rebuild them."""
+        self.add_loan('Dune', '2020-01-01 09:00:00', '2020-01-10 09:00:00')
+        self.add_loan('Emma', '2020-01-01 11:00:00')
+        counts = rollups.daily_counts(self.conn)
+        archive.archive_loans(self.conn, self.archive_path, horizon_days=30)
+        self.assertEqual(rollups.daily_counts(self.conn), counts)
+
+        rollups.backfill(self.conn, source='loan_history')
+        self.conn.commit()
+        self.assertEqual(rollups.daily_counts(self.conn), counts)
+
+    def test_detach(self):
+        """Test that detaching removes the history view along with the archive."""
+        archive.attach_archive(self.conn, self.archive_path)
+        archive.attach_archive(self.conn, self.archive_path)
+        archive.detach_archive(self.conn)
+        with self.assertRaises(sqlite3.OperationalError):
+            self.conn.execute("SELECT * FROM loan_history")
+        self.assertNotIn('archive', [row[1] for row in self.conn.execute("PRAGMA database_list")])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+import asyncio
+import tempfile
+import shutil
+import os
+import sqlite3
+import auth
+import database
+from asgi import CirculationAPI, call_asgi
+
+class CirculationAPITests(unittest.TestCase):
+    """Test the asynchronous circulation API."""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.test_db = os.path.join(self.test_dir, "library.db")
+        database.initialize_database(self.test_db)
+        conn = sqlite3.connect(self.test_db)
+        conn.executemany("INSERT INTO books (title, author, isbn) VALUES (?, ?, ?)",
+                         [('Dune', 'Frank Herbert', '111'), ('Emma', 'Jane Austen', '222')])
+        conn.commit()
+        conn.close()
+        self.api = CirculationAPI(self.test_db, pool_size=2, api_token='secret', secret_key='key')
+
+    def tearDown(self):
+        self.api.close()
+        shutil.rmtree(self.test_dir)
+
+    def request(self, method, path, body=None, headers=((b'authorization', b'Bearer secret'),)):
+        return asyncio.run(call_asgi(self.api, method, path, body, headers))
+
+    def test_list_books(self):
+        """Test listing all and only available books."""
+        status, body = self.request('GET', '/books')
+        self.assertEqual(status, 200)
+        self.assertEqual(sorted(book['title'] for book in body['books']), ['Dune', 'Emma'])
+
+        self.request('POST', '/borrow', {'student_name': 'Ann', 'book_title': 'Dune'})
+        status, body = self.request('GET', '/books?available=1')
+        self.assertEqual([book['title'] for book in body['books']], ['Emma'])
+
+    def test_borrow_and_return(self):
+        """Test a full loan cycle."""
+        status, body = self.request('POST', '/borrow', {'student_name': 'Ann', 'book_title': 'Dune'})
+        self.assertEqual(status, 201)
+        loan_id = body['id']
+
+        status, body = self.request('GET', '/borrowed?active=1')
+        self.assertEqual([loan['id'] for loan in body['loans']], [loan_id])
+
+        status, body = self.request('POST', '/return', {'borrow_id': loan_id})
+        self.assertEqual(status, 200)
+        self.assertEqual(body['book_title'], 'Dune')
+
+        status, body = self.request('POST', '/return', {'borrow_id': loan_id})
+        self.assertEqual(status, 404)
+
+    def test_concurrent_borrows_of_one_book(self):
+        """Test that only one of many simultaneous borrows succeeds."""
+        async def burst():
+            return await asyncio.gather(*(
+                call_asgi(self.api, 'POST', '/borrow', {'student_name': f'S{i}', 'book_title': 'Emma'},
+                          [(b'authorization', b'Bearer secret')])
+                for i in range(6)))
+
+        statuses = sorted(status for status, _body in asyncio.run(burst()))
+        self.assertEqual(statuses, [201] + [409] * 5)
+
+    def test_availability(self):
+        """Test availability lookups served from the cache."""
+        status, body = self.request('GET', '/availability?title=Dune')
+        self.assertEqual((status, body['available']), (200, True))
+
+        self.request('POST', '/borrow', {'student_name': 'Ann', 'book_title': 'Dune'})
+        status, body = self.request('GET', '/availability?id=1')
+        self.assertEqual((status, body['available']), (200, False))
+        self.assertEqual(self.request('GET', '/availability?title=Nope')[0], 404)
+
+    def test_invalid_requests(self):
+        """Test validation, unknown routes and wrong methods."""
+        self.assertEqual(self.request('POST', '/borrow', {'student_name': 'Ann'})[0], 400)
+        self.assertEqual(self.request('GET', '/nowhere')[0], 404)
+        self.assertEqual(self.request('GET', '/borrow')[0], 405)
+
+    def test_api_token(self):
+        """Test that every route requires the configured token."""
+        wrong = [[], [(b'authorization', b'Bearer wrong')], [(b'authorization', 'Bearer s\u00e9cret'.encode('latin-1'))]]
+        for method, path, body in (('GET', '/books', None), ('GET', '/borrowed', None),
+                                   ('GET', '/availability?title=Dune', None),
+                                   ('POST', '/borrow', {'student_name': 'Ann', 'book_title': 'Dune'})):
+            for headers in wrong:
+                self.assertEqual(self.request(method, path, body, headers)[0], 401)
+        self.assertEqual(self.request('GET', '/borrowed?active=1')[1]['loans'], [])
+
+    def test_session_token(self):
+        """Test that a session token signed with the secret key is accepted."""
+        token = auth.issue_token({'id': 1, 'username': 'admin', 'is_admin': True}, 'key')
+        status, _body = self.request('POST', '/borrow', {'student_name': 'Ann', 'book_title': 'Dune'},
+                                     [(b'authorization', f'Bearer {token}'.encode())])
+        self.assertEqual(status, 201)
+        forged = auth.issue_token({'id': 1, 'username': 'admin', 'is_admin': True}, 'other')
+        status, _body = self.request('GET', '/books', headers=[(b'authorization', f'Bearer {forged}'.encode())])
+        self.assertEqual(status, 401)
+
+    def test_no_token_configured(self):
+        """Test that an app without a token or secret key refuses every request."""
+        self.api.api_token = self.api.secret_key = None
+        self.assertEqual(self.request('POST', '/borrow', {'student_name': 'Ann', 'book_title': 'Dune'})[0], 503)
+        self.assertEqual(self.request('GET', '/borrowed')[0], 503)
+        self.assertEqual(self.request('GET', '/books?available=1', headers=())[0], 503)
+
+if __name__ == '__main__':
+    unittest.main()
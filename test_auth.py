@@ -0,0 +1,122 @@
+import unittest
+import hashlib
+import sqlite3
+import auth
+import config
+
+# A low scrypt cost keeps the tests fast
+CHEAP = 'scrypt:1024:8:1'
+
+class PasswordHashTests(unittest.TestCase):
+    """Test hashing and verifying passwords."""
+
+    def test_hash_and_verify(self):
+        """Test that hashes are salted and verify only the right password."""
+        first = auth.hash_password('secret123', CHEAP)
+        second = auth.hash_password('secret123', CHEAP)
+        self.assertNotEqual(first, second)
+        self.assertTrue(first.startswith(CHEAP + '$'))
+        self.assertTrue(auth.verify_password('secret123', first))
+        self.assertFalse(auth.verify_password('secret124', first))
+
+    def test_pbkdf2(self):
+        """Test the PBKDF2 method."""
+        stored = auth.hash_password('secret123', 'pbkdf2:sha256:1000')
+        self.assertTrue(auth.verify_password('secret123', stored))
+
+    def test_legacy_hash(self):
+        """Test that unsalted SHA-256 hashes verify and need rehashing."""
+        legacy = hashlib.sha256(b'secret123').hexdigest()
+        self.assertTrue(auth.verify_password('secret123', legacy))
+        self.assertFalse(auth.verify_password('other', legacy))
+        self.assertTrue(auth.needs_rehash(legacy))
+        self.assertTrue(auth.needs_rehash(auth.hash_password('secret123', CHEAP)))
+
+    def test_malformed_hash(self):
+        """Test that unreadable stored values never verify."""
+        for stored in ('', 'plain', 'scrypt:1024:8:1$abc', 'md5:1$abc$def'):
+            self.assertFalse(auth.verify_password('x', stored))
+
+class AuthenticateTests(unittest.TestCase):
+    """Test logging in against the users table."""
+
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        auth.initialize_users_table(self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def stored(self, username):
+        return self.conn.execute("SELECT password FROM users WHERE username = ?", (username,)).fetchone()[0]
+
+    def test_default_admin(self):
+        """Test that the default admin is created with a current hash."""
+        user = auth.authenticate(self.conn, config.ADMIN_USERNAME, config.ADMIN_PASSWORD)
+        self.assertTrue(user['is_admin'])
+        self.assertFalse(auth.needs_rehash(self.stored(config.ADMIN_USERNAME)))
+
+    def test_lookup_by_username_only(self):
+        """Test that the password never appears in the query."""
+        auth.create_user(self.conn, 'ann', 'secret123')
+        statements = []
+        self.conn.set_trace_callback(statements.append)
+        self.assertEqual(auth.authenticate(self.conn, 'ann', 'secret123')['username'], 'ann')
+        self.assertIsNone(auth.authenticate(self.conn, 'ann', 'wrong'))
+        self.assertIsNone(auth.authenticate(self.conn, 'nobody', 'secret123'))
+        self.assertTrue(all('secret123' not in sql for sql in statements))
+
+    def test_legacy_hash_is_upgraded_on_login(self):
+        """Test that a successful login replaces a SHA-256 hash."""
+        self.conn.execute("INSERT INTO users (username, password) VALUES ('bob', ?)",
+                          (hashlib.sha256(b'secret123').hexdigest(),))
+        self.assertIsNone(auth.authenticate(self.conn, 'bob', 'wrong'))
+        self.assertEqual(len(self.stored('bob')), 64)
+        self.assertIsNotNone(auth.authenticate(self.conn, 'bob', 'secret123'))
+        self.assertFalse(auth.needs_rehash(self.stored('bob')))
+        self.assertIsNotNone(auth.authenticate(self.conn, 'bob', 'secret123'))
+
+    def test_tk_table_layout_is_migrated(self):
+        """Test that a users table made by the old Tk client gets the shared columns."""
+        conn = sqlite3.connect(":memory:")
+        conn.execute('''CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        username TEXT UNIQUE NOT NULL, password_hash TEXT NOT NULL,
+                        email TEXT, role TEXT DEFAULT 'user')''')
+        conn.execute("INSERT INTO users (username, password_hash, role) VALUES ('root', ?, 'admin')",
+                     (hashlib.sha256(b'secret123').hexdigest(),))
+        auth.initialize_users_table(conn)
+        self.assertTrue(auth.authenticate(conn, 'root', 'secret123')['is_admin'])
+        self.assertTrue(auth.authenticate(conn, config.ADMIN_USERNAME, config.ADMIN_PASSWORD)['is_admin'])
+        conn.close()
+
+class TokenTests(unittest.TestCase):
+    """Test signed session tokens."""
+
+    user = {'id': 7, 'username': 'ann.lee', 'is_admin': False}
+
+    def setUp(self):
+        self.cache = auth.TokenCache(size=2)
+
+    def test_round_trip(self):
+        """Test that a token verifies to the user it was issued to."""
+        token = auth.issue_token(self.user, 'key', now=1000)
+        self.assertEqual(self.cache.verify(token, 'key', max_age=60, now=1030), self.user)
+        self.assertEqual(self.cache.verify(token, 'key', max_age=60, now=1031), self.user)
+
+    def test_rejected_tokens(self):
+        """Test forged, foreign-key, expired and malformed tokens."""
+        token = auth.issue_token(self.user, 'key', now=1000)
+        forged = token.replace('.0.', '.1.', 1)
+        self.assertIsNone(self.cache.verify(forged, 'key', max_age=60, now=1000))
+        self.assertIsNone(self.cache.verify(token, 'other', max_age=60, now=1000))
+        self.assertIsNone(self.cache.verify(token, 'key', max_age=60, now=1061))
+        self.assertIsNone(self.cache.verify('nonsense', 'key'))
+
+    def test_cached_token_still_expires(self):
+        """Test that a cached token is dropped once it is too old."""
+        token = auth.issue_token(self.user, 'key', now=1000)
+        self.cache.verify(token, 'key', max_age=60, now=1000)
+        self.assertIsNone(self.cache.verify(token, 'key', max_age=60, now=1100))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+import tempfile
+import shutil
+import os
+import sqlite3
+from flask import render_template
+import database
+import queries
+from app import create_app
+from availability_cache import AvailabilityCache
+from change_feed import ChangeFeed
+
+class AvailabilityCacheTests(unittest.TestCase):
+    """Test the in-process availability cache."""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.test_db = os.path.join(self.test_dir, "library.db")
+        database.initialize_database(self.test_db)
+        conn = sqlite3.connect(self.test_db)
+        conn.executemany("INSERT INTO books (title, author, isbn, available) VALUES (?, ?, ?, ?)",
+                         [('Dune', 'Frank Herbert', '111', 1), ('Emma', 'Jane Austen', '222', 0)])
+        conn.commit()
+        conn.close()
+        self.statements = []
+        self.feed = ChangeFeed(self.test_db, interval=0)
+        self.cache = AvailabilityCache(self.test_db, feed=self.feed)
+
+    def tearDown(self):
+        self.cache.close()
+        self.feed.close()
+        shutil.rmtree(self.test_dir)
+
+    def trace(self):
+        self.cache.refresh()
+        self.cache._conn.set_trace_callback(self.statements.append)
+        self.feed._conn.set_trace_callback(self.statements.append)
+
+    def external_update(self, sql):
+        conn = sqlite3.connect(self.test_db)
+        conn.execute(sql)
+        conn.commit()
+        conn.close()
+
+    def test_lookup_by_title_and_id(self):
+        """Test reading availability by title and by id."""
+        self.assertTrue(self.cache.is_available('Dune'))
+        self.assertFalse(self.cache.is_available(2))
+        self.assertIsNone(self.cache.is_available('Missing'))
+        self.assertEqual(self.cache.available_titles(), ['Dune'])
+
+    def test_unchanged_database_is_not_reloaded(self):
+        """Test that reads without external changes run no queries on books."""
+        self.trace()
+        for _ in range(10):
+            self.cache.is_available('Dune')
+        self.assertEqual(self.statements, ['PRAGMA data_version'] * 10)
+
+    def test_external_change_is_detected(self):
+        """Test that commits by other connections update the cache."""
+        self.assertTrue(self.cache.is_available('Dune'))
+        version = self.cache.version
+        self.external_update("UPDATE books SET available = 0 WHERE title = 'Dune'")
+        self.assertFalse(self.cache.is_available('Dune'))
+        self.assertGreater(self.cache.version, version)
+
+    def test_only_changed_books_are_reread(self):
+        """Test that external changes re-read the changed books, not the table."""
+        self.trace()
+        self.external_update("UPDATE books SET title = 'Emma (2nd ed.)' WHERE id = 2")
+        self.external_update("DELETE FROM books WHERE id = 1")
+        self.assertEqual(self.cache.available_titles(), [])
+        self.assertIsNone(self.cache.is_available('Dune'))
+        self.assertFalse(self.cache.is_available('Emma (2nd ed.)'))
+        self.assertNotIn(queries.ALL_BOOKS, self.statements)
+        self.assertIn(queries.BOOKS_BY_IDS.format(ids='2'), self.statements)
+
+    def test_unrelated_change_keeps_cache(self):
+        """Test that changes to other tables do not reload the books."""
+        self.trace()
+        self.external_update("INSERT INTO borrowed (student_name, book_title) VALUES ('Ann', 'Emma')")
+        self.cache.is_available('Dune')
+        self.assertNotIn(queries.ALL_BOOKS, self.statements)
+
+    def test_local_writes_update_entries(self):
+        """Test updates recorded after commits in this process."""
+        self.feed.interval = 60
+        self.assertEqual(self.cache.available_titles(), ['Dune'])
+        self.cache.set_available('Emma', True)
+        self.cache.add(3, 'Ivanhoe', 'Walter Scott', '333')
+        self.assertEqual(self.cache.available_titles(), ['Dune', 'Emma', 'Ivanhoe'])
+        self.assertTrue(self.cache.is_available(3))
+        self.assertEqual(self.cache.available_books()[2][:4], (3, 'Ivanhoe', 'Walter Scott', '333'))
+
+    def test_available_books_render_borrow_form(self):
+        """Test that the cached records carry what the borrow form shows."""
+        books = self.cache.available_books()
+        self.assertEqual([(book.title, book.author, book.isbn) for book in books],
+                         [('Dune', 'Frank Herbert', '111')])
+
+        app = create_app({'TESTING': True, 'DATABASE': self.test_db, 'SECRET_KEY': 'test'})
+        with app.test_request_context('/borrow'):
+            page = render_template('borrow.html', available_books=books)
+        self.assertIn('<option value="Dune"', page)
+        self.assertIn('data-author="Frank Herbert"', page)
+        self.assertIn('data-isbn="111"', page)
+
+if __name__ == '__main__':
+    unittest.main()
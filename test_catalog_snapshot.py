@@ -0,0 +1,112 @@
+import unittest
+import tempfile
+import shutil
+import os
+import sqlite3
+from collections import Counter
+import catalog_snapshot
+import circulation
+import database
+from benchmarks.datagen import generate
+
+@unittest.skipUnless(catalog_snapshot.available(), "NumPy is not installed")
+class CatalogSnapshotTests(unittest.TestCase):
+    """Test that snapshot aggregations agree with the same questions asked in SQL."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = tempfile.mkdtemp()
+        cls.db_path = os.path.join(cls.test_dir, 'snapshot.db')
+        generate(cls.db_path, books=300, students=50, loans=5000, years=1)
+        conn = database.connect(cls.db_path)
+        # A loan of a title missing from the catalog, and a book without an author
+        conn.execute("INSERT INTO borrowed (student_name, book_title) VALUES ('Ada', 'Lost Book')")
+        circulation.add_book(conn, 'Anonymous', None, None)
+        conn.commit()
+        cls.snapshot = catalog_snapshot.load_snapshot(conn, chunk_size=700)
+        conn.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.test_dir)
+
+    def setUp(self):
+        self.conn = sqlite3.connect(self.db_path)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_loaded_in_full(self):
+        """Test that every row is loaded across chunks, with ids in order."""
+        self.assertEqual(self.snapshot.book_count, 301)
+        self.assertEqual(self.snapshot.loan_count, 5001)
+        self.assertEqual(self.snapshot.loan_ids.tolist(),
+                         [row[0] for row in self.conn.execute("SELECT id FROM borrowed ORDER BY id")])
+        self.assertEqual(len(self.snapshot.students), 51)
+        self.assertEqual(self.snapshot.loan_books[-1], -1)
+        self.assertEqual(self.snapshot.versions, database.table_versions(self.conn, database.VERSIONED_TABLES))
+
+    def test_active_loans(self):
+        """Test that loans still out are marked as not returned."""
+        active = self.conn.execute("SELECT COUNT(*) FROM borrowed WHERE return_date IS NULL").fetchone()[0]
+        self.assertEqual(int((self.snapshot.loan_returned == catalog_snapshot.NOT_RETURNED).sum()), active)
+
+    def test_top_books(self):
+        """Test the most borrowed books against GROUP BY."""
+        expected = Counter(dict(self.conn.execute(
+            "SELECT book_title, COUNT(*) FROM borrowed WHERE book_title IN (SELECT title FROM books) "
+            "GROUP BY book_title")))
+        top = catalog_snapshot.top_books(self.snapshot, n=5)
+        self.assertEqual([count for _title, _author, count in top],
+                         [count for _title, count in expected.most_common(5)])
+        for title, _author, count in top:
+            self.assertEqual(expected[title], count)
+
+    def test_top_books_since(self):
+        """Test that only loans from the given time on are counted."""
+        since = int(self.snapshot.loan_borrowed[len(self.snapshot.loan_borrowed) // 2])
+        count = self.conn.execute(
+            "SELECT COUNT(*) FROM borrowed JOIN books ON books.title = borrowed.book_title "
+            "WHERE CAST(strftime('%s', borrow_date) AS INTEGER) >= ?", (since,)).fetchone()[0]
+        top = catalog_snapshot.top_books(self.snapshot, n=1000, since=since)
+        self.assertEqual(sum(loans for _title, _author, loans in top), count)
+
+    def test_author_demand(self):
+        """Test loans per author against a join, including books without an author."""
+        expected = dict(self.conn.execute(
+            "SELECT author, COUNT(*) FROM borrowed JOIN books ON books.title = borrowed.book_title "
+            "GROUP BY author"))
+        demand = catalog_snapshot.author_demand(self.snapshot)
+        self.assertEqual({author: loans for author, loans, _books in demand if loans}, expected)
+        self.assertIn((None, 0, 1), demand)
+
+    def test_loans_per_month(self):
+        """Test monthly loan counts against strftime grouping."""
+        expected = self.conn.execute(
+            "SELECT strftime('%Y-%m', borrow_date), COUNT(*) FROM borrowed GROUP BY 1 ORDER BY 1").fetchall()
+        self.assertEqual(catalog_snapshot.loans_per_month(self.snapshot), expected)
+
+    def test_loan_duration_stats(self):
+        """Test the loan length summary against julianday arithmetic."""
+        count, mean = self.conn.execute(
+            "SELECT COUNT(*), AVG(julianday(return_date) - julianday(borrow_date)) FROM borrowed "
+            "WHERE return_date IS NOT NULL").fetchone()
+        stats = catalog_snapshot.loan_duration_stats(self.snapshot)
+        self.assertEqual(stats['count'], count)
+        self.assertAlmostEqual(stats['mean_days'], mean, places=4)
+        self.assertLessEqual(stats['p50_days'], stats['p90_days'])
+        self.assertLessEqual(stats['p90_days'], stats['p99_days'])
+
+    def test_empty_library(self):
+        """Test that an empty database gives empty results instead of errors."""
+        path = os.path.join(self.test_dir, 'empty.db')
+        database.initialize_database(path)
+        conn = database.connect(path)
+        snapshot = catalog_snapshot.load_snapshot(conn)
+        conn.close()
+        self.assertEqual(catalog_snapshot.top_books(snapshot), [])
+        self.assertEqual(catalog_snapshot.loans_per_month(snapshot), [])
+        self.assertEqual(catalog_snapshot.loan_duration_stats(snapshot)['mean_days'], None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+import tempfile
+import shutil
+import os
+import sqlite3
+import database
+from app import create_app
+from change_feed import get_change_feed, ChangeFeed, Change, changes_since, changed_rows, latest_change_id
+
+class ChangeFeedTests(unittest.TestCase):
+    """Test the change log and the feed that polls it."""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.test_db = os.path.join(self.test_dir, "library.db")
+        database.initialize_database(self.test_db)
+        self.feed = ChangeFeed(self.test_db, interval=0)
+        self.received = []
+        self.feed.subscribe(self.received.append, ('books',))
+        self.feed.poll()
+
+    def tearDown(self):
+        self.feed.close()
+        shutil.rmtree(self.test_dir)
+
+    def execute(self, *statements):
+        conn = sqlite3.connect(self.test_db)
+        for sql in statements:
+            conn.execute(sql)
+        conn.commit()
+        conn.close()
+
+    def test_triggers_log_row_changes(self):
+        """Test that inserts, updates and deletes are logged with the row id."""
+        self.execute("INSERT INTO books (title) VALUES ('Dune')",
+                     "UPDATE books SET available = 0 WHERE id = 1",
+                     "DELETE FROM books WHERE id = 1")
+        conn = sqlite3.connect(self.test_db)
+        changes = changes_since(conn, 0)
+        conn.close()
+        self.assertEqual([(c.table, c.row_id, c.op) for c in changes],
+                         [('books', 1, 'insert'), ('books', 1, 'update'), ('books', 1, 'delete')])
+
+    def test_poll_dispatches_new_changes_once(self):
+        """Test that each poll delivers only changes made since the last one."""
+        self.execute("INSERT INTO books (title) VALUES ('Dune')")
+        self.assertEqual(self.feed.poll(), 1)
+        self.assertEqual(self.feed.poll(), 0)
+        self.execute("INSERT INTO books (title) VALUES ('Emma')")
+        self.feed.poll()
+        self.assertEqual([[c.row_id for c in changes] for changes in self.received], [[1], [2]])
+
+    def test_subscribers_only_get_their_tables(self):
+        """Test that changes to other tables are not dispatched."""
+        loans = []
+        self.feed.subscribe(loans.append, ('borrowed',))
+        self.execute("INSERT INTO borrowed (student_name, book_title) VALUES ('Ann', 'Dune')")
+        self.feed.poll()
+        self.assertEqual(self.received, [])
+        self.assertEqual([c.op for c in loans[0]], ['insert'])
+
+        self.feed.unsubscribe(loans.append)
+        self.execute("UPDATE borrowed SET return_date = CURRENT_TIMESTAMP")
+        self.feed.poll()
+        self.assertEqual(len(loans), 1)
+
+    def test_pruned_log_requests_reload(self):
+        """Test that a feed behind the pruned log tells subscribers to reload."""
+        self.execute("INSERT INTO books (title) VALUES ('Dune')",
+                     "INSERT INTO books (title) VALUES ('Emma')")
+        conn = sqlite3.connect(self.test_db)
+        database.prune_changes(conn, keep=1)
+        conn.commit()
+        self.assertIsNone(changes_since(conn, 0))
+        self.assertEqual(len(changes_since(conn, 1)), 1)
+        conn.close()
+
+        self.feed.poll()
+        self.assertEqual(self.received, [None])
+        self.assertEqual(self.feed.last_id, 2)
+
+    def test_polling_keeps_log_bounded(self):
+        """Test that a long-running feed prunes the log as changes accumulate."""
+        feed = ChangeFeed(self.test_db, interval=0, retention=5, prune_interval=10)
+        feed.poll()
+        for i in range(50):
+            self.execute(f"INSERT INTO books (title) VALUES ('Book {i}')")
+            feed.poll()
+        feed.close()
+        conn = sqlite3.connect(self.test_db)
+        self.assertLessEqual(conn.execute("SELECT COUNT(*) FROM changes").fetchone()[0], 15)
+        conn.close()
+
+    def test_web_requests_poll_feed(self):
+        """Test that the web app polls and prunes the feed on every request."""
+        feed = get_change_feed(self.test_db)
+        feed.interval, feed.retention, feed.prune_interval = 0, 5, 10
+        client = create_app({'TESTING': True, 'DATABASE': self.test_db, 'SECRET_KEY': 'test'}).test_client()
+        client.get('/login')
+        for i in range(50):
+            self.execute(f"INSERT INTO books (title) VALUES ('Book {i}')")
+            client.get('/login')
+        self.assertEqual(feed.last_id, 50)
+        feed.close()
+        conn = sqlite3.connect(self.test_db)
+        self.assertLessEqual(conn.execute("SELECT COUNT(*) FROM changes").fetchone()[0], 15)
+        conn.close()
+
+    def test_missing_log(self):
+        """Test databases created before the change log existed."""
+        conn = sqlite3.connect(":memory:")
+        self.assertIsNone(latest_change_id(conn))
+        self.assertIsNone(changes_since(conn, 0))
+        conn.close()
+
+    def test_changed_rows(self):
+        """Test collapsing changes into rows to reload and rows to remove."""
+        changes = [Change(1, 'books', 1, 'insert'), Change(2, 'books', 2, 'update'),
+                   Change(3, 'books', 1, 'delete'), Change(4, 'borrowed', 5, 'insert'),
+                   Change(5, 'books', 3, 'delete'), Change(6, 'books', 3, 'insert')]
+        self.assertEqual(changed_rows(changes, 'books'), ({2, 3}, {1}))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import tempfile
+import shutil
+import os
+import sqlite3
+from unittest import mock
+import database
+from app import create_app
+
+class ConnectionPoolTests(unittest.TestCase):
+    """Test the per-process connection pool."""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.test_db = os.path.join(self.test_dir, "library.db")
+        self.pool = database.ConnectionPool(self.test_db, size=2)
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.test_dir)
+
+    def test_connections_are_reused(self):
+        """Test that released connections are handed out again."""
+        conn = self.pool.acquire()
+        self.pool.release(conn)
+        self.assertIs(self.pool.acquire(), conn)
+
+    def test_release_rolls_back(self):
+        """Test that an open transaction does not leak into the next request."""
+        with self.pool.connection() as conn:
+            conn.execute("CREATE TABLE t (x INTEGER)")
+            conn.commit()
+            conn.execute("INSERT INTO t VALUES (1)")
+        with self.pool.connection() as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM t").fetchone()[0], 0)
+
+    def test_pool_resets_after_fork(self):
+        """Test that a child process never reuses its parent's connections."""
+        conn = self.pool.acquire()
+        self.pool.release(conn)
+        with mock.patch('os.getpid', return_value=os.getpid() + 1):
+            child_conn = self.pool.acquire()
+            self.assertIsNot(child_conn, conn)
+            child_conn.close()
+        conn.close()
+
+class InitializationTests(unittest.TestCase):
+    """Test schema creation and application set-up."""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.test_db = os.path.join(self.test_dir, "library.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_initialize_database_is_idempotent(self):
+        """Test that repeated initialization keeps one admin and enables WAL."""
+        database.initialize_database(self.test_db)
+        database.initialize_database(self.test_db)
+
+        conn = sqlite3.connect(self.test_db)
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM users").fetchone()[0], 1)
+        conn.close()
+
+    def test_secret_key_is_shared(self):
+        """Test that every worker reads the same generated key."""
+        key_file = os.path.join(self.test_dir, ".secret_key")
+        with mock.patch.dict(os.environ, {}, clear=False):
+            os.environ.pop('SMARTLIB_SECRET_KEY', None)
+            first = database.load_secret_key(key_file)
+            self.assertEqual(database.load_secret_key(key_file), first)
+            self.assertEqual(len(first), 64)
+
+    def test_create_app_uses_configured_database(self):
+        """Test that the factory serves requests from the configured database."""
+        database.initialize_database(self.test_db)
+        app = create_app({'DATABASE': self.test_db, 'SECRET_KEY': 'test', 'TESTING': True})
+        client = app.test_client()
+        response = client.post('/login', data={'username': 'admin', 'password': 'admin123'},
+                               follow_redirects=True)
+        self.assertIn(b'Dashboard', response.data)
+        database.get_pool(self.test_db).close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import tempfile
+import shutil
+import os
+import sqlite3
+from benchmarks.datagen import generate, zipf_cum_weights
+
+class DataGeneratorTests(unittest.TestCase):
+    """Test the synthetic library generator used by the benchmarks."""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def build(self, name, **kwargs):
+        path = os.path.join(self.test_dir, name)
+        generate(path, **{'books': 200, 'students': 50, 'loans': 3000, **kwargs})
+        return sqlite3.connect(path)
+
+    def dump(self, conn):
+        return (conn.execute("SELECT * FROM books ORDER BY id").fetchall(),
+                conn.execute("SELECT * FROM borrowed ORDER BY id").fetchall())
+
+    def test_deterministic(self):
+        """Test that the same seed gives the same rows and another seed does not."""
+        first, second, other = self.build('a.db'), self.build('b.db'), self.build('c.db', seed=1)
+        self.assertEqual(self.dump(first), self.dump(second))
+        self.assertNotEqual(self.dump(first)[1], self.dump(other)[1])
+        for conn in (first, second, other):
+            conn.close()
+
+    def test_consistent_circulation(self):
+        """Test sizes, one open loan per unavailable book and skewed popularity."""
+        conn = self.build('a.db')
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM books").fetchone()[0], 200)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM borrowed").fetchone()[0], 3000)
+        open_titles = [t for (t,) in conn.execute(
+            "SELECT book_title FROM borrowed WHERE return_date IS NULL ORDER BY book_title")]
+        unavailable = [t for (t,) in conn.execute("SELECT title FROM books WHERE available = 0 ORDER BY title")]
+        self.assertTrue(open_titles)
+        self.assertEqual(open_titles, unavailable)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM borrowed WHERE return_date < borrow_date").fetchone()[0], 0)
+
+        counts = [c for (c,) in conn.execute("SELECT COUNT(*) FROM borrowed GROUP BY book_title ORDER BY 1 DESC")]
+        self.assertGreater(counts[0], 10 * counts[len(counts) // 2])
+        conn.close()
+
+    def test_change_tracking_restored(self):
+        """Test that triggers are back and the change log starts empty."""
+        conn = self.build('a.db')
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM changes").fetchone()[0], 0)
+        conn.execute("UPDATE books SET available = 1 WHERE id = 1")
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM changes").fetchone()[0], 1)
+        conn.close()
+
+    def test_refuses_existing_file(self):
+        """Test that an existing database is never overwritten."""
+        self.build('a.db')
+        with self.assertRaises(FileExistsError):
+            self.build('a.db')
+
+    def test_zipf_weights(self):
+        """Test the cumulative Zipf weights."""
+        self.assertEqual(zipf_cum_weights(3, 1), [1, 1.5, 1.5 + 1 / 3])
+
+if __name__ == '__main__':
+    unittest.main()
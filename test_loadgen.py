@@ -0,0 +1,85 @@
+import unittest
+import tempfile
+import shutil
+import os
+import random
+import sqlite3
+import database
+from app import create_app
+from benchmarks.datagen import generate
+from benchmarks.loadgen import Library, FlaskClientTransport, VirtualUser, parse_mix, run, summarize
+
+class LoadGeneratorTests(unittest.TestCase):
+    """Test the closed-loop load generator and the busy-database response it counts."""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.test_dir, 'load.db')
+        generate(self.db_path, books=100, students=20, loans=500)
+        self.app = create_app({'DATABASE': self.db_path, 'SECRET_KEY': 'test', 'SESSION_BACKEND': 'memory',
+                               'TESTING': True})
+
+    def tearDown(self):
+        database.get_pool(self.db_path).close()
+        shutil.rmtree(self.test_dir)
+
+    def test_short_run(self):
+        """Test that a short run completes requests of every action without errors."""
+        library = Library(self.db_path)
+        mix = parse_mix('login=1,dashboard=1,search=1,borrow=2,return=2,qr=1')
+        results = run(lambda: FlaskClientTransport(self.app), library, users=2, duration=1.0, warmup=0.2,
+                      mix=mix, think=0, seed=0)
+        by_action = {r['action']: r for r in results}
+        self.assertEqual(set(by_action), {'login', 'dashboard', 'search', 'borrow', 'return', 'qr', 'total'})
+        total = by_action['total']
+        self.assertGreater(total['requests'], 0)
+        self.assertEqual(total['error'], 0)
+        self.assertEqual(total['requests'], sum(r['requests'] for r in results[:-1]))
+        self.assertLessEqual(total['p50_ms'], total['p99_ms'])
+
+    def test_borrow_then_return_own_loan(self):
+        """Test that a virtual user returns the loan it borrowed."""
+        library = Library(self.db_path)
+        vu = VirtualUser(1, FlaskClientTransport(self.app), library, random.Random(0))
+        self.assertTrue(vu.login()[1])
+        conn = sqlite3.connect(self.db_path)
+        title = conn.execute("SELECT title FROM books WHERE available = 1 LIMIT 1").fetchone()[0]
+        library.popular_title = lambda rng: title
+        status, borrowed, remember = vu.borrow()
+        self.assertEqual((status, borrowed), (302, True))
+        remember()
+        self.assertEqual(len(vu.open_loans), 1)
+        vu.return_()
+        self.assertEqual(conn.execute("SELECT available FROM books WHERE title = ?", (title,)).fetchone()[0], 1)
+        conn.close()
+
+    def test_summary_and_mix(self):
+        """Test outcome counting and rejection of unknown actions."""
+        records = [(0.001, 'ok'), (0.002, 'busy'), (0.003, 'ok'), (0.004, 'error')]
+        result = summarize('total', records, 2)
+        self.assertEqual((result['ok'], result['busy'], result['error']), (2, 1, 1))
+        self.assertEqual(result['requests_per_second'], 2.0)
+        self.assertEqual(result['busy_rate'], 0.25)
+        self.assertEqual(result['max_ms'], 4.0)
+        with self.assertRaises(ValueError):
+            parse_mix('browse=1')
+
+    def test_locked_database_answers_503(self):
+        """Test that a lock timeout becomes 503 with Retry-After and other errors still raise."""
+        def locked():
+            raise sqlite3.OperationalError('database is locked')
+
+        def broken():
+            raise sqlite3.OperationalError('no such table: nothing')
+
+        self.app.add_url_rule('/locked', 'locked', locked)
+        self.app.add_url_rule('/broken', 'broken', broken)
+        client = self.app.test_client()
+        response = client.get('/locked')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        with self.assertRaises(sqlite3.OperationalError):
+            client.get('/broken')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+from unittest import mock
+import tempfile
+import shutil
+import os
+import database
+from app import create_app
+from login_throttle import LoginThrottle, SQLiteLoginThrottle
+
+class LoginThrottleTests(unittest.TestCase):
+    """Test the in-memory sliding-window login limits."""
+
+    def make_throttle(self):
+        return LoginThrottle(max_attempts=3, max_attempts_per_ip=5, window=60, max_keys=100)
+
+    def setUp(self):
+        self.throttle = self.make_throttle()
+
+    def test_username_limit_slides(self):
+        """Test that a username is blocked until its oldest failure leaves the window."""
+        for t in (0, 10, 20):
+            self.assertEqual(self.throttle.retry_after('ann', now=t), 0)
+            self.throttle.record_failure('ann', now=t)
+        self.assertEqual(self.throttle.retry_after('ann', now=30), 30)
+        self.assertEqual(self.throttle.retry_after('ANN', now=30), 30)
+        self.assertEqual(self.throttle.retry_after('bob', now=30), 0)
+        self.assertEqual(self.throttle.retry_after('ann', now=60), 0)
+
+        # The next failure blocks again until the failure at t=10 expires
+        self.throttle.record_failure('ann', now=60)
+        self.assertEqual(self.throttle.retry_after('ann', now=61), 9)
+
+    def test_address_limit(self):
+        """Test that one address guessing many usernames is blocked."""
+        for i in range(5):
+            self.throttle.record_failure(f'user{i}', '10.0.0.1', now=i)
+        self.assertGreater(self.throttle.retry_after('someone', '10.0.0.1', now=5), 0)
+        self.assertEqual(self.throttle.retry_after('someone', '10.0.0.2', now=5), 0)
+
+    def test_successful_login_resets_username(self):
+        """Test that logging in clears the username's failures."""
+        for t in range(3):
+            self.throttle.record_failure('ann', now=t)
+        self.throttle.reset('ann')
+        self.assertEqual(self.throttle.retry_after('ann', now=3), 0)
+
+class SQLiteLoginThrottleTests(LoginThrottleTests):
+    """Test the limits shared through the database."""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.test_db = os.path.join(self.test_dir, "library.db")
+        super().setUp()
+
+    def tearDown(self):
+        database.get_pool(self.test_db).close()
+        shutil.rmtree(self.test_dir)
+
+    def make_throttle(self):
+        return SQLiteLoginThrottle(self.test_db, max_attempts=3, max_attempts_per_ip=5, window=60)
+
+    def test_counts_are_shared(self):
+        """Test that failures recorded by one worker block logins in another."""
+        other = self.make_throttle()
+        for t in range(3):
+            self.throttle.record_failure('ann', now=t)
+        self.assertEqual(other.retry_after('ann', now=3), 57)
+
+class LoginViewThrottleTests(unittest.TestCase):
+    """Test throttling and session expiry in the web login."""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.test_db = os.path.join(self.test_dir, "library.db")
+        database.initialize_database(self.test_db)
+        self.app = create_app({'DATABASE': self.test_db, 'SECRET_KEY': 'test', 'TESTING': True})
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        database.get_pool(self.test_db).close()
+        shutil.rmtree(self.test_dir)
+
+    def login(self, password):
+        return self.client.post('/login', data={'username': 'admin', 'password': password})
+
+    def test_throttled_login_skips_password_check(self):
+        """Test that a throttled username is refused before its password is hashed."""
+        for _ in range(3):
+            self.assertEqual(self.login('wrong').status_code, 200)
+        with mock.patch('auth.authenticate') as authenticate:
+            rv = self.login('admin123')
+        self.assertEqual(rv.status_code, 429)
+        self.assertIn(b'Too many failed login attempts', rv.data)
+        authenticate.assert_not_called()
+
+    def test_sqlite_throttle_with_single_connection_pool(self):
+        """Test that recording a failure never waits for the connection login() holds."""
+        path = os.path.join(self.test_dir, "small.db")
+        database.initialize_database(path)
+        database.get_pool(path, size=1)  # the main pool, before anything else creates it
+        client = create_app({'DATABASE': path, 'DATABASE_POOL_SIZE': 1, 'SECRET_KEY': 'test',
+                             'TESTING': True, 'SESSION_BACKEND': 'cookie'}).test_client()
+        try:
+            with mock.patch('config.LOGIN_THROTTLE_BACKEND', 'sqlite'), mock.patch('config.DATABASE_TIMEOUT', 1):
+                rv = client.post('/login', data={'username': 'admin', 'password': 'wrong'})
+                self.assertEqual(rv.status_code, 200)
+                self.assertEqual(client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+                                 .status_code, 302)
+        finally:
+            database.get_pool(path).close()
+            database.get_pool(path, role='login_throttle').close()
+
+    def test_session_expires(self):
+        """Test that logged-in sessions are permanent with the configured lifetime."""
+        rv = self.login('admin123')
+        self.assertEqual(rv.status_code, 302)
+        self.assertEqual(self.app.permanent_session_lifetime.total_seconds(), 3600)
+        self.assertIn('Expires=', rv.headers['Set-Cookie'])
+
+if __name__ == '__main__':
+    unittest.main()
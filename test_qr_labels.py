@@ -0,0 +1,138 @@
+import unittest
+import tempfile
+import shutil
+import os
+import sqlite3
+from qr_module import generate_qr, decode_qr
+from qr_labels import (initialize_manifest_table, label_path, label_relpath, legacy_label_path,
+                       write_label, lookup_label, migrate_labels, initialize_blob_table,
+                       read_qr_png, store_qr_png, render_catalog_qr, catalog_qr_png,
+                       add_book_with_qr, generate_blobs)
+
+class QRLabelTestCase(unittest.TestCase):
+    """Base class providing a temporary database and label directory."""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.qr_dir = os.path.join(self.test_dir, "qr_codes")
+        self.test_db = os.path.join(self.test_dir, "library.db")
+        
+        conn = sqlite3.connect(self.test_db)
+        conn.execute('''
+            CREATE TABLE books (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL UNIQUE,
+                author TEXT,
+                isbn TEXT,
+                available INTEGER DEFAULT 1,
+                date_added TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        initialize_manifest_table(conn)
+        conn.executemany("INSERT INTO books (id, title, author, isbn) VALUES (?, ?, ?, ?)", [
+            (1, 'War Peace', 'Tolstoy', '111'),
+            (2, 'War/Peace', 'Parody', '222'),
+            (3, 'Café Society', None, None),
+        ])
+        conn.commit()
+        conn.close()
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+class QRLabelTests(QRLabelTestCase):
+    """Test the id-keyed label layout and manifest."""
+    
+    def test_paths_are_sharded_by_id(self):
+        """Test that label paths depend only on the book id."""
+        self.assertRegex(label_relpath(42), r'^[0-9a-f]{2}/42_qr\.png$')
+        self.assertEqual(label_relpath(42), label_relpath(42))
+        self.assertNotEqual(label_path(1, self.qr_dir), label_path(2, self.qr_dir))
+    
+    def test_write_and_lookup_label(self):
+        """Test that written labels are recorded in the manifest."""
+        conn = sqlite3.connect(self.test_db)
+        path = write_label(conn, 3, 'Café Society', None, None, self.qr_dir)
+        conn.commit()
+        
+        self.assertEqual(lookup_label(conn, 3, self.qr_dir), path)
+        self.assertIsNone(lookup_label(conn, 1, self.qr_dir))
+        self.assertEqual(decode_qr(path), "Book: Café Society\nAuthor: \nISBN: ")
+        conn.close()
+    
+    def test_migrate_resolves_colliding_titles(self):
+        """Test that migration moves each legacy file to the book it encodes."""
+        # Both titles map to the same legacy file; it holds book 1's label
+        legacy = legacy_label_path('War Peace', self.qr_dir)
+        self.assertEqual(legacy, legacy_label_path('War/Peace', self.qr_dir))
+        generate_qr("Book: War Peace\nAuthor: Tolstoy\nISBN: 111", legacy)
+        generate_qr("Book: Orphan", os.path.join(self.qr_dir, "Orphan_qr.png"))
+        
+        result = migrate_labels(self.test_db, self.qr_dir)
+        
+        self.assertEqual(result['moved'], 1)
+        self.assertEqual(result['regenerated'], 2)
+        self.assertEqual(result['leftover'], [os.path.join(self.qr_dir, "Orphan_qr.png")])
+        self.assertFalse(os.path.exists(legacy))
+        
+        conn = sqlite3.connect(self.test_db)
+        for book_id, title in ((1, 'War Peace'), (2, 'War/Peace'), (3, 'Café Society')):
+            path = lookup_label(conn, book_id, self.qr_dir)
+            self.assertEqual(path, label_path(book_id, self.qr_dir))
+            self.assertTrue(decode_qr(path).startswith(f"Book: {title}\n"))
+        conn.close()
+        
+        # Running the migration again is a no-op
+        result = migrate_labels(self.test_db, self.qr_dir)
+        self.assertEqual((result['moved'], result['regenerated']), (0, 0))
+
+class QRBlobTests(QRLabelTestCase):
+    """Test pre-rendered QR PNGs stored in the database."""
+    
+    def test_missing_png_rendered_without_writing(self):
+        """Test that a missing PNG is rendered on the fly and not stored."""
+        conn = sqlite3.connect(self.test_db)
+        initialize_blob_table(conn)
+        conn.commit()
+        self.assertIsNone(read_qr_png(conn, 1))
+        
+        png = catalog_qr_png(conn, 1, 'War Peace')
+        self.assertTrue(png.startswith(b'\x89PNG'))
+        self.assertFalse(conn.in_transaction)
+        self.assertIsNone(read_qr_png(conn, 1))
+        
+        path = os.path.join(self.test_dir, "served.png")
+        with open(path, 'wb') as f:
+            f.write(png)
+        self.assertEqual(decode_qr(path), "Book: War Peace")
+        conn.close()
+    
+    def test_generate_blobs(self):
+        """Test that the batch generator fills in every missing PNG."""
+        conn = sqlite3.connect(self.test_db)
+        initialize_blob_table(conn)
+        store_qr_png(conn, 1, render_catalog_qr('War Peace'))
+        conn.commit()
+        conn.close()
+        
+        self.assertEqual(generate_blobs(self.test_db, workers=2, batch_size=1), 2)
+        self.assertEqual(generate_blobs(self.test_db, workers=2), 0)
+        
+        conn = sqlite3.connect(self.test_db)
+        for book_id in (1, 2, 3):
+            self.assertIsNotNone(read_qr_png(conn, book_id))
+        conn.close()
+    
+    def test_add_book_with_qr(self):
+        """Test that a new book is stored together with its catalog PNG."""
+        conn = sqlite3.connect(self.test_db)
+        initialize_blob_table(conn)
+        png = render_catalog_qr('Anna Karenina')
+        book_id = add_book_with_qr(conn, 'Anna Karenina', 'Tolstoy', '444', png)
+        conn.commit()
+        self.assertEqual(read_qr_png(conn, book_id), png)
+        self.assertEqual(catalog_qr_png(conn, book_id, 'Anna Karenina'), png)
+        conn.close()
+
+if __name__ == '__main__':
+    unittest.main()
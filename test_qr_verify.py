@@ -0,0 +1,108 @@
+import unittest
+import tempfile
+import shutil
+import os
+import sqlite3
+from qr_module import generate_qr, generate_qr_with_logo, decode_qr, QRDecodeError
+from qr_labels import initialize_manifest_table, write_label, label_path
+from qr_verify import verify_labels, parse_label_text
+
+class QRDecodeTests(unittest.TestCase):
+    """Test the pure-Python QR decoder."""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+    
+    def test_decode_round_trip(self):
+        """Test that generated labels decode to the original text."""
+        for data in ["Book: Dune\nAuthor: Frank Herbert\nISBN: 9780441013593",
+                     "HELLO 12345678901234567890123456789",
+                     "Book: Ünïcödé title",
+                     "x" * 400]:
+            path = generate_qr(data, os.path.join(self.test_dir, "label.png"))
+            self.assertEqual(decode_qr(path), data)
+    
+    def test_decode_with_logo(self):
+        """Test that error correction recovers modules covered by a logo."""
+        from PIL import Image
+        logo = os.path.join(self.test_dir, "logo.png")
+        Image.new('RGB', (40, 40), 'red').save(logo)
+        path = generate_qr_with_logo("Book: Logo Book", os.path.join(self.test_dir, "logo_qr.png"), logo)
+        self.assertEqual(decode_qr(path), "Book: Logo Book")
+    
+    def test_decode_blank_image(self):
+        """Test that an image without a QR code is rejected."""
+        from PIL import Image
+        path = os.path.join(self.test_dir, "blank.png")
+        Image.new('RGB', (100, 100), 'white').save(path)
+        with self.assertRaises(QRDecodeError):
+            decode_qr(path)
+
+class QRVerifyTests(unittest.TestCase):
+    """Test batch verification of labels against the database."""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.qr_dir = os.path.join(self.test_dir, "qr_codes")
+        self.test_db = os.path.join(self.test_dir, "library.db")
+        
+        conn = sqlite3.connect(self.test_db)
+        c = conn.cursor()
+        c.execute('''
+            CREATE TABLE books (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL UNIQUE,
+                author TEXT,
+                isbn TEXT,
+                available INTEGER DEFAULT 1,
+                date_added TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        initialize_manifest_table(conn)
+        c.executemany("INSERT INTO books (id, title, author, isbn) VALUES (?, ?, ?, ?)", [
+            (1, 'Good Book', 'Author A', '111'),
+            (2, 'Changed Book', 'Author B', '222'),
+            (3, 'Swapped Book', 'Author C', '333'),
+            (4, 'Broken Book', 'Author D', '444'),
+            (5, 'Unlabelled Book', 'Author E', '555'),
+        ])
+        for book_id, title, author, isbn in c.execute("SELECT id, title, author, isbn FROM books WHERE id < 5").fetchall():
+            write_label(conn, book_id, title, author, isbn, self.qr_dir)
+        conn.commit()
+        
+        # Damage some labels after they were written
+        c.execute("UPDATE books SET isbn = '999' WHERE id = 2")
+        conn.commit()
+        conn.close()
+        generate_qr("Book: Good Book\nAuthor: Author A\nISBN: 111", label_path(3, self.qr_dir))
+        with open(label_path(4, self.qr_dir), 'wb') as f:
+            f.write(b'not an image')
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+    
+    def test_parse_label_text(self):
+        """Test splitting label text into fields."""
+        fields = parse_label_text("Book: A: B\nAuthor: X\nISBN: ")
+        self.assertEqual(fields, {'Book': 'A: B', 'Author': 'X', 'ISBN': ''})
+    
+    def test_verify_reports_mismatches(self):
+        """Test that wrong, swapped and unreadable labels are reported."""
+        progress = []
+        result = verify_labels(self.qr_dir, self.test_db, workers=2,
+                               progress=lambda done, total: progress.append((done, total)))
+        
+        self.assertEqual(result['total'], 4)
+        self.assertEqual(result['ok'], 1)
+        reasons = dict(result['mismatches'])
+        self.assertIn('ISBN mismatch', reasons[label_path(2, self.qr_dir)])
+        self.assertIn("belongs to 'Good Book'", reasons[label_path(3, self.qr_dir)])
+        self.assertIn('Unreadable', reasons[label_path(4, self.qr_dir)])
+        self.assertEqual(result['missing'], ['Unlabelled Book'])
+        self.assertEqual(progress[-1], (4, 4))
+
+if __name__ == '__main__':
+    unittest.main()
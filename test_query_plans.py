@@ -0,0 +1,71 @@
+import unittest
+import tempfile
+import shutil
+import os
+import sqlite3
+import database
+import queries
+from benchmarks.datagen import generate
+
+class QueryPlanTests(unittest.TestCase):
+    """Test that hot queries of the query catalog never scan books or borrowed."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = tempfile.mkdtemp()
+        cls.db_path = os.path.join(cls.test_dir, 'plans.db')
+        generate(cls.db_path, books=5000, students=500, loans=50000)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.test_dir)
+
+    def setUp(self):
+        self.conn = sqlite3.connect(self.db_path)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_no_full_scans(self):
+        """Test the catalog against a generated library with statistics."""
+        self.assertEqual(queries.check_plans(self.conn), [])
+
+    def test_no_full_scans_without_statistics(self):
+        """Test the catalog against a fresh database that was never analyzed."""
+        path = os.path.join(self.test_dir, 'fresh.db')
+        database.initialize_database(path)
+        conn = sqlite3.connect(path)
+        self.assertEqual(queries.check_plans(conn), [])
+        conn.close()
+
+    def test_every_query_compiles(self):
+        """Test that every registered statement is valid against the schema."""
+        for query in queries.CATALOG.values():
+            with self.subTest(query=query.name):
+                queries.explain(self.conn, query.sql)
+
+    def test_detects_missing_index(self):
+        """Test that queries left without an index are reported as full scans."""
+        path = os.path.join(self.test_dir, 'unindexed.db')
+        database.initialize_database(path)
+        conn = sqlite3.connect(path)
+        conn.execute("DROP INDEX idx_borrowed_active")
+        conn.execute("DROP INDEX idx_borrowed_active_student")
+        names = {name for name, _detail in queries.check_plans(conn)}
+        conn.close()
+        self.assertIn('active_loan_of_student', names)
+        self.assertIn('count_active_loans', names)
+        self.assertNotIn('book_id_by_title', names)
+
+    def test_statements_are_unique(self):
+        """Test that no statement is registered twice under different names."""
+        texts = [query.sql for query in queries.CATALOG.values()]
+        self.assertEqual(len(texts), len(set(texts)))
+
+    def test_register_rejects_duplicates(self):
+        """Test that a name can only be registered once."""
+        with self.assertRaises(ValueError):
+            queries.register('book_id_by_title', "SELECT 1")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+import tempfile
+import shutil
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+import config
+import circulation
+import database
+import queries
+import records
+from records import Book, Loan
+from tree_rows import select_by_ids
+
+def _timestamp(days_ago):
+    moment = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days_ago)
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+class RecordTests(unittest.TestCase):
+    """Test the Book and Loan record types and their row factories."""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.test_dir, 'records.db')
+        database.initialize_database(self.db_path)
+        self.conn = database.connect(self.db_path)
+        circulation.add_book(self.conn, 'Dune', 'Frank Herbert', '9780441013593')
+        circulation.add_book(self.conn, 'Emma', None, None)
+        self.loan_id = circulation.borrow_book(self.conn, 'Ada', 'Dune')
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+        shutil.rmtree(self.test_dir)
+
+    def test_records_are_plain_tuples(self):
+        """Test that records cost no more memory than tuples and unpack like them."""
+        row = (1, 'Dune', 'Frank Herbert', '9780441013593', 1, '2024-01-01 10:00:00')
+        book = records.book_factory(None, row)
+        self.assertEqual(book, row)
+        self.assertEqual(sys.getsizeof(book), sys.getsizeof(row))
+        self.assertFalse(hasattr(book, '__dict__'))
+        book_id, title, author, isbn, available, date_added = book
+        self.assertEqual((book_id, title), (book.id, book.title))
+
+    def test_list_books_returns_books(self):
+        """Test that the catalog listing yields Book records."""
+        books = {book.title: book for book in circulation.list_books(self.conn)}
+        self.assertIsInstance(books['Dune'], Book)
+        self.assertEqual(books['Dune'].author, 'Frank Herbert')
+        self.assertTrue(books['Dune'].is_borrowed)
+        self.assertFalse(books['Emma'].is_borrowed)
+
+    def test_list_loans_returns_loans(self):
+        """Test that loan listings yield Loan records with derived dates."""
+        loan, = circulation.list_loans(self.conn, active_only=True)
+        self.assertIsInstance(loan, Loan)
+        self.assertEqual((loan.id, loan.student_name, loan.book_title), (self.loan_id, 'Ada', 'Dune'))
+        self.assertTrue(loan.is_active)
+        self.assertEqual(loan.due_date - loan.borrowed_at, timedelta(days=config.DEFAULT_BORROW_PERIOD_DAYS))
+        self.assertFalse(loan.is_overdue)
+
+    def test_select_by_ids_row_factory(self):
+        """Test that changed rows fetched for the Tk views are records too."""
+        loans = select_by_ids(self.conn, queries.ACTIVE_LOANS_BY_IDS, {self.loan_id}, records.loan_factory)
+        self.assertEqual([type(loan) for loan in loans], [Loan])
+        self.assertEqual(loans[0].book_title, 'Dune')
+
+    def test_overdue_loan(self):
+        """Test due date arithmetic of a loan past its borrow period."""
+        loan = Loan(1, 'Ada', 'Dune', _timestamp(config.DEFAULT_BORROW_PERIOD_DAYS + 3), None)
+        self.assertTrue(loan.is_overdue)
+        self.assertFalse(loan.is_due_soon)
+        self.assertIn(loan.days_overdue, (3, 4))
+        self.assertEqual(loan.days_borrowed, config.DEFAULT_BORROW_PERIOD_DAYS + 3)
+
+    def test_loan_due_soon(self):
+        """Test that loans close to their due date are flagged."""
+        loan = Loan(1, 'Ada', 'Dune', _timestamp(config.DEFAULT_BORROW_PERIOD_DAYS - 1), None)
+        self.assertTrue(loan.is_due_soon)
+        self.assertFalse(loan.is_overdue)
+
+    def test_returned_loan_is_never_overdue(self):
+        """Test that returned loans have no due date countdown."""
+        loan = Loan(1, 'Ada', 'Dune', _timestamp(60), _timestamp(50))
+        self.assertFalse(loan.is_active)
+        self.assertFalse(loan.is_overdue)
+        self.assertIsNone(loan.days_remaining)
+        self.assertIn(loan.days_borrowed, (9, 10))
+
+    def test_malformed_dates(self):
+        """Test that unparseable dates give None instead of raising."""
+        loan = Loan(1, 'Ada', 'Dune', 'yesterday', None)
+        self.assertIsNone(loan.borrowed_at)
+        self.assertIsNone(loan.due_date)
+        self.assertFalse(loan.is_overdue)
+
+if __name__ == '__main__':
+    unittest.main()
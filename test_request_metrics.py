@@ -0,0 +1,108 @@
+import unittest
+import tempfile
+import shutil
+import os
+import sqlite3
+import database
+from app import create_app
+from request_metrics import RequestStats, TracedConnection
+
+class RequestMetricsTests(unittest.TestCase):
+    """Test request timing, SQL tracing, /metrics and the slow query log."""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.test_dir, 'test.db')
+        self.log_path = os.path.join(self.test_dir, 'test.log')
+        database.initialize_database(self.db_path)
+
+    def tearDown(self):
+        database.get_pool(self.db_path).close()
+        shutil.rmtree(self.test_dir)
+
+    def client(self, **settings):
+        app = create_app({'DATABASE': self.db_path, 'SECRET_KEY': 'test', 'SESSION_BACKEND': 'memory',
+                          'LOG_FILE': self.log_path, 'TESTING': True, **settings})
+        client = app.test_client()
+        client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+        return client
+
+    def test_server_timing(self):
+        """Test that responses report SQL statements, rows and write waits."""
+        client = self.client()
+        timing = client.get('/books').headers['Server-Timing']
+        self.assertIn('sql;dur=', timing)
+        self.assertIn('desc="1 query, 0 rows"', timing)
+        self.assertIn('app;dur=', timing)
+
+        response = client.post('/add_book', data={'title': 'Dune', 'author': 'Frank Herbert', 'isbn': '1'})
+        self.assertIn('write;dur=', response.headers['Server-Timing'])
+
+    def test_metrics_endpoint(self):
+        """Test the Prometheus text exposition of per-endpoint totals."""
+        client = self.client()
+        client.get('/books')
+        client.get('/books')
+        response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        text = response.get_data(as_text=True)
+        self.assertIn('smartlib_http_requests_total{endpoint="books",method="GET",status="200"} 2', text)
+        self.assertIn('smartlib_http_request_duration_seconds_count{endpoint="books",method="GET"} 2', text)
+        self.assertIn('smartlib_http_request_duration_seconds_bucket{endpoint="books",method="GET",le="+Inf"} 2',
+                      text)
+        self.assertIn('smartlib_sql_statements_total{endpoint="books",method="GET"} 2', text)
+        self.assertIn('smartlib_slow_queries_total 0', text)
+
+    def test_metrics_require_authentication(self):
+        """Test that /metrics is refused to anonymous clients and served to the API token."""
+        app = create_app({'DATABASE': self.db_path, 'SECRET_KEY': 'test', 'SESSION_BACKEND': 'memory',
+                          'LOG_FILE': self.log_path, 'TESTING': True, 'API_TOKEN': 'secret'})
+        client = app.test_client()
+        self.assertEqual(client.get('/metrics').status_code, 401)
+        response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('smartlib_http_requests_total', response.get_data(as_text=True))
+
+    def test_slow_query_log(self):
+        """Test that statements over the threshold are logged without their parameters."""
+        client = self.client(SLOW_QUERY_THRESHOLD=0)
+        client.get('/dashboard')
+        with open(self.log_path) as f:
+            log = f.read()
+        self.assertIn('slow query', log)
+        self.assertIn('GET dashboard: SELECT COUNT(*) FROM books', log)
+        self.assertNotIn('admin123', log)
+
+    def test_disabled(self):
+        """Test that metrics can be turned off."""
+        client = self.client(REQUEST_METRICS=False)
+        self.assertNotIn('Server-Timing', client.get('/dashboard').headers)
+        self.assertEqual(client.get('/metrics').status_code, 404)
+
+    def test_traced_connection(self):
+        """Test statement, row and time counting through every fetch style."""
+        conn = sqlite3.connect(':memory:')
+        conn.execute("CREATE TABLE t (n INTEGER)")
+        conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(10)])
+        stats = RequestStats(slow_threshold=0)
+        traced = TracedConnection(conn, stats)
+        traced.row_factory = sqlite3.Row
+        self.assertIs(conn.row_factory, sqlite3.Row)
+
+        self.assertEqual(len(traced.execute("SELECT n FROM t").fetchall()), 10)
+        self.assertEqual(traced.execute("SELECT n FROM t WHERE n = 3").fetchone()['n'], 3)
+        self.assertEqual(sum(1 for _ in traced.execute("SELECT n FROM t WHERE n < 4")), 4)
+        cursor = traced.cursor()
+        cursor.execute("INSERT INTO t VALUES (?)", (99,))
+        self.assertIsNotNone(cursor.lastrowid)
+        stats.finish()
+
+        self.assertEqual(stats.statements, 4)
+        self.assertEqual(stats.rows, 15)
+        self.assertGreater(stats.sql_time, 0)
+        self.assertEqual([sql for sql, _elapsed in stats.slow][-1], "INSERT INTO t VALUES (?)")
+        conn.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import unittest
+import tempfile
+import shutil
+import os
+import json
+import sqlite3
+import time
+from datetime import datetime, timezone
+import circulation
+import database
+import rollups
+import test_api
+from test_analytics import local_timezone
+from benchmarks.datagen import generate
+
+def _rollup_rows(conn):
+    return (conn.execute("SELECT day, borrows, returns FROM daily_stats ORDER BY day").fetchall(),
+            conn.execute("SELECT book_title, day, borrows, returns FROM daily_book_stats "
+                         "ORDER BY book_title, day").fetchall())
+
+class RollupTests(unittest.TestCase):
+    """Test the daily rollup tables, their triggers and the backfill."""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.test_dir, 'rollups.db')
+        database.initialize_database(self.db_path)
+        self.conn = database.connect(self.db_path)
+        circulation.add_book(self.conn, 'Dune', 'Frank Herbert', None)
+        circulation.add_book(self.conn, 'Emma', 'Jane Austen', None)
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+        shutil.rmtree(self.test_dir)
+
+    def add_loan(self, title, borrow_date, return_date=None):
+        cursor = self.conn.execute("INSERT INTO borrowed (student_name, book_title, borrow_date, return_date) "
+                                   "VALUES ('Ada', ?, ?, ?)", (title, borrow_date, return_date))
+        self.conn.commit()
+        return cursor.lastrowid
+
+    def test_borrow_and_return(self):
+        """Test that the circulation operations are counted on their day."""
+        loan_id = circulation.borrow_book(self.conn, 'Ada', 'Dune')
+        self.conn.commit()
+        (day, borrows, returns), = rollups.daily_counts(self.conn)
+        self.assertEqual((borrows, returns), (1, 0))
+
+        circulation.return_book(self.conn, loan_id)
+        self.conn.commit()
+        self.assertEqual(rollups.daily_counts(self.conn, book_title='Dune'), [(day, 1, 1)])
+        self.assertEqual(rollups.daily_counts(self.conn, book_title='Emma'), [])
+
+    @unittest.skipUnless(hasattr(time, 'tzset'), "time.tzset is not available")
+    def test_return_counted_on_utc_day(self):
+        """Test that returns fall on the same UTC day as borrows, even past local midnight."""
+        # At any moment the local date differs from the UTC date in one of these zones
+        for zone in ('Etc/GMT-14', 'Etc/GMT+12'):
+            with self.subTest(zone=zone), local_timezone(zone):
+                self.conn.execute("DELETE FROM daily_stats")
+                before = datetime.now(timezone.utc).date()
+                loan_id = circulation.borrow_book(self.conn, 'Ada', 'Dune')
+                circulation.return_book(self.conn, loan_id)
+                self.conn.commit()
+                after = datetime.now(timezone.utc).date()
+                utc_days = {before.isoformat(), after.isoformat()}
+                for day, borrows, returns in rollups.daily_counts(self.conn):
+                    self.assertIn(day, utc_days)
+                self.assertEqual(sum(row[2] for row in rollups.daily_counts(self.conn)), 1)
+
+    def test_loaded_loans(self):
+        """Test that loans inserted with both dates count a borrow and a return."""
+        self.add_loan('Dune', '2024-03-01 09:00:00', '2024-03-10 17:00:00')
+        self.add_loan('Emma', '2024-03-01 11:00:00')
+        self.assertEqual(rollups.daily_counts(self.conn),
+                         [('2024-03-01', 2, 0), ('2024-03-10', 0, 1)])
+        self.assertEqual(rollups.daily_counts(self.conn, since='2024-03-02'), [('2024-03-10', 0, 1)])
+        self.assertEqual(rollups.daily_counts(self.conn, until='2024-03-09'), [('2024-03-01', 2, 0)])
+
+    def test_corrected_loan(self):
+        """Test that changing a loan's dates or title moves its counts."""
+        loan_id = self.add_loan('Dune', '2024-03-01 09:00:00', '2024-03-10 17:00:00')
+        self.conn.execute("UPDATE borrowed SET book_title = 'Emma', borrow_date = '2024-02-28 09:00:00', "
+                          "return_date = NULL WHERE id = ?", (loan_id,))
+        self.conn.commit()
+        self.assertEqual(rollups.daily_counts(self.conn), [('2024-02-28', 1, 0)])
+        self.assertEqual(rollups.daily_counts(self.conn, book_title='Dune'), [])
+        self.assertEqual(rollups.daily_counts(self.conn, book_title='Emma'), [('2024-02-28', 1, 0)])
+
+    def test_deleted_loans_stay_counted(self):
+        """Test that deleting (archiving) loans keeps their history in the rollups."""
+        loan_id = self.add_loan('Dune', '2024-03-01 09:00:00', '2024-03-10 17:00:00')
+        self.conn.execute("DELETE FROM borrowed WHERE id = ?", (loan_id,))
+        self.conn.commit()
+        self.assertEqual(len(rollups.daily_counts(self.conn)), 2)
+
+    def test_backfill_matches_triggers(self):
+        """Test that a backfill rebuilds exactly what the triggers maintained."""
+        first = self.add_loan('Dune', '2024-03-01 09:00:00', '2024-03-10 17:00:00')
+        self.add_loan('Emma', '2024-03-01 11:00:00')
+        self.add_loan('Dune', '2024-03-11 11:00:00')
+        self.conn.execute("UPDATE borrowed SET return_date = '2024-03-12 08:00:00' WHERE id = ?", (first + 2,))
+        self.conn.commit()
+        maintained = _rollup_rows(self.conn)
+        rollups.backfill(self.conn)
+        self.conn.commit()
+        self.assertEqual(_rollup_rows(self.conn), maintained)
+
+    def test_existing_loans_backfilled_on_upgrade(self):
+        """Test that a database predating the rollups gets them filled in at initialization."""
+        self.add_loan('Dune', '2024-03-01 09:00:00', '2024-03-10 17:00:00')
+        for name in ('borrowed_rollup_insert', 'borrowed_rollup_update'):
+            self.conn.execute(f"DROP TRIGGER {name}")
+        self.conn.execute("DROP TABLE daily_stats")
+        self.conn.execute("DROP TABLE daily_book_stats")
+        self.conn.commit()
+
+        database.initialize_database(self.db_path)
+        self.assertEqual(rollups.daily_counts(self.conn), [('2024-03-01', 1, 0), ('2024-03-10', 0, 1)])
+
+    def test_generated_library(self):
+        """Test that bulk-loaded libraries come with complete rollups."""
+        path = os.path.join(self.test_dir, 'generated.db')
+        generate(path, books=100, students=20, loans=2000, years=1)
+        conn = sqlite3.connect(path)
+        borrows = sum(row[1] for row in rollups.daily_counts(conn))
+        returns = sum(row[2] for row in rollups.daily_counts(conn))
+        self.assertEqual(borrows, 2000)
+        self.assertEqual(returns, conn.execute(
+            "SELECT COUNT(*) FROM borrowed WHERE return_date IS NOT NULL").fetchone()[0])
+        conn.close()
+
+class DailyEndpointTests(test_api.APITestCase):
+    """Test /api/v1/daily."""
+
+    def test_daily(self):
+        """Test daily counts over the API, for the library and for one title."""
+        rv, data = self.get_json('/api/v1/daily')
+        self.assertEqual(data['days'], [{'day': '2020-01-01', 'borrows': 1, 'returns': 0},
+                                        {'day': '2999-01-01', 'borrows': 1, 'returns': 0}])
+        rv, data = self.get_json('/api/v1/daily?title=Book+004&since=2021-01-01')
+        self.assertEqual([day['day'] for day in data['days']], ['2999-01-01'])
+
+    def test_bad_date(self):
+        """Test that malformed dates are refused."""
+        rv = self.client.get('/api/v1/daily?since=yesterday', headers=self.auth)
+        self.assertEqual(rv.status_code, 400)
+        self.assertIn('since', json.loads(rv.data)['error'])
+
+if __name__ == '__main__':
+    unittest.main()
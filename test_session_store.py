@@ -0,0 +1,129 @@
+import unittest
+from unittest import mock
+import tempfile
+import shutil
+import os
+import database
+from app import create_app
+from session_store import MemorySessionStore, SQLiteSessionStore
+
+class SessionBackendTests(unittest.TestCase):
+    """Test web sessions kept in the database."""
+
+    backend = 'sqlite'
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.test_db = os.path.join(self.test_dir, "library.db")
+        database.initialize_database(self.test_db)
+        self.app = create_app({'DATABASE': self.test_db, 'SECRET_KEY': 'test',
+                               'TESTING': True, 'SESSION_BACKEND': self.backend})
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        database.get_pool(self.test_db).close()
+        database.get_pool(self.test_db, role='sessions').close()
+        shutil.rmtree(self.test_dir)
+
+    def session_cookie(self):
+        cookie = self.client.get_cookie('session')
+        return cookie.value if cookie else None
+
+    def login(self):
+        return self.client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+
+    def test_cookie_holds_only_an_id(self):
+        """Test that login works and the cookie is a short opaque id."""
+        self.login()
+        self.assertEqual(self.client.get('/dashboard').status_code, 200)
+        sid = self.session_cookie()
+        self.assertLess(len(sid), 64)
+        self.assertNotIn('.', sid)
+
+    def test_single_connection_pool(self):
+        """Test that sessions never wait for the connection their own request holds."""
+        path = os.path.join(self.test_dir, "small.db")
+        database.initialize_database(path)
+        database.get_pool(path, size=1)  # the main pool, before anything else creates it
+        app = create_app({'DATABASE': path, 'DATABASE_POOL_SIZE': 1, 'SECRET_KEY': 'test',
+                          'TESTING': True, 'SESSION_BACKEND': self.backend})
+        client = app.test_client()
+        try:
+            with mock.patch('config.DATABASE_TIMEOUT', 1):
+                client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+                self.assertEqual(client.get('/dashboard').status_code, 200)
+        finally:
+            database.get_pool(path).close()
+            database.get_pool(path, role='sessions').close()
+
+    def test_login_and_logout_rotate_the_id(self):
+        """Test that the pre-login id is dropped and logout ends the session."""
+        self.client.post('/login', data={'username': 'admin', 'password': 'wrong'})
+        before = self.session_cookie()
+        self.login()
+        after = self.session_cookie()
+        self.assertNotEqual(before, after)
+
+        self.client.get('/logout')
+        self.client.set_cookie('session', after)
+        self.assertEqual(self.client.get('/dashboard').status_code, 302)
+
+    def test_sessions_are_shared_between_apps(self):
+        """Test that another app on the same database accepts the session."""
+        self.login()
+        other = create_app({'DATABASE': self.test_db, 'SECRET_KEY': 'test',
+                            'TESTING': True, 'SESSION_BACKEND': self.backend}).test_client()
+        other.set_cookie('session', self.session_cookie())
+        self.assertEqual(other.get('/dashboard').status_code, 200)
+
+class MemorySessionBackendTests(SessionBackendTests):
+    """Test web sessions kept in process memory."""
+
+    backend = 'memory'
+
+    def test_sessions_are_shared_between_apps(self):
+        """Memory sessions belong to one app; nothing to share."""
+
+class SessionStoreTests(unittest.TestCase):
+    """Test expiry and purging in the stores."""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.test_db = os.path.join(self.test_dir, "library.db")
+
+    def tearDown(self):
+        database.get_pool(self.test_db).close()
+        shutil.rmtree(self.test_dir)
+
+    def check_expiry(self, store):
+        store.save('a', '{}', expires_at=100)
+        store.save('b', '{}', expires_at=200)
+        self.assertEqual(store.load('a', now=50), ('{}', 100))
+        self.assertIsNone(store.load('a', now=150))
+        self.assertEqual(store.purge(now=250), 1 if isinstance(store, MemorySessionStore) else 2)
+
+    def test_memory_store(self):
+        """Test expiry and least-recently-used eviction in memory."""
+        store = MemorySessionStore(size=2)
+        self.check_expiry(store)
+        for sid in ('x', 'y', 'z'):
+            store.save(sid, '{}', expires_at=1000)
+        self.assertIsNone(store.load('x', now=0))
+        self.assertIsNotNone(store.load('z', now=0))
+
+    def test_sqlite_store_purges_in_batches(self):
+        """Test expiry and that purging removes every expired row in batches."""
+        store = SQLiteSessionStore(self.test_db, purge_interval=3600, purge_batch=10)
+        self.check_expiry(store)
+        with database.get_pool(self.test_db).connection() as conn:
+            conn.executemany("INSERT INTO sessions (id, data, expires_at) VALUES (?, '{}', ?)",
+                             ((f's{i}', i) for i in range(35)))
+            conn.commit()
+        self.assertEqual(store.purge(now=30), 31)
+        with database.get_pool(self.test_db).connection() as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0], 4)
+            plan = conn.execute("EXPLAIN QUERY PLAN SELECT id FROM sessions WHERE expires_at <= 1").fetchall()
+        self.assertIn('idx_sessions_expires_at', str(plan))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+import unittest
+from benchmarks.bench_startup import measure_import, parse_importtime
+
+class StartupTests(unittest.TestCase):
+    """Test that the imaging stack is only imported on first QR use."""
+    
+    def test_parse_importtime(self):
+        """Test parsing of -X importtime output."""
+        stderr = ("import time: self [us] | cumulative | imported package\n"
+                  "import time:       120 |        300 |   _io\n"
+                  "import time:       180 |        180 | app\n")
+        self.assertEqual(parse_importtime(stderr), [('  _io', 120, 300), ('app', 180, 180)])
+    
+    def test_flask_app_does_not_import_imaging(self):
+        """Test that importing app.py does not import qrcode or Pillow."""
+        result = measure_import('app', runs=1)
+        self.assertEqual(result['lazy_packages_loaded'], [])
+    
+    def test_tk_client_does_not_import_imaging(self):
+        """Test that importing main.py does not import qrcode or Pillow."""
+        result = measure_import('main', runs=1)
+        self.assertEqual(result['lazy_packages_loaded'], [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import sqlite3
+from tree_rows import TreeRows, select_by_ids
+
+class FakeTree:
+    """The part of ttk.Treeview that TreeRows uses, recording each call."""
+
+    def __init__(self):
+        self.items = []
+        self.values = {}
+        self.calls = []
+
+    def get_children(self):
+        return tuple(self.items)
+
+    def insert(self, parent, index, iid, values):
+        self.calls.append('insert')
+        self.items.insert(len(self.items) if index == "end" else index, iid)
+        self.values[iid] = values
+
+    def item(self, iid, values):
+        self.calls.append('item')
+        self.values[iid] = values
+
+    def delete(self, *iids):
+        self.calls.append('delete')
+        for iid in iids:
+            self.items.remove(iid)
+            del self.values[iid]
+
+class TreeRowsTests(unittest.TestCase):
+    """Test applying row changes to a tree item by item."""
+
+    def setUp(self):
+        self.tree = FakeTree()
+        self.rows = TreeRows(self.tree, sort_key=lambda values: values[0])
+        self.rows.reset([(3, ('Emma',)), (1, ('Dune',)), (2, ('Ivanhoe',))])
+        self.tree.calls = []
+
+    def titles(self):
+        return [self.tree.values[iid][0] for iid in self.tree.items]
+
+    def test_reset_orders_rows(self):
+        """Test that a full load is shown in sort order with row ids as iids."""
+        self.assertEqual(self.tree.items, ['1', '3', '2'])
+        self.assertEqual(len(self.rows), 3)
+
+    def test_update_in_place(self):
+        """Test that a change that keeps the order touches one item."""
+        self.rows.upsert(3, ('Emma',))
+        self.assertEqual(self.tree.calls, ['item'])
+
+    def test_insert_move_and_remove(self):
+        """Test inserting, re-sorting and removing single rows."""
+        self.rows.upsert(4, ('Beowulf',))
+        self.rows.upsert(2, ('Anna Karenina',))
+        self.rows.remove(1)
+        self.rows.remove(99)
+        self.assertEqual(self.titles(), ['Anna Karenina', 'Beowulf', 'Emma'])
+        self.assertNotIn(1, self.rows)
+
+    def test_descending_order(self):
+        """Test rows kept newest first, like ORDER BY ... DESC."""
+        tree = FakeTree()
+        rows = TreeRows(tree, sort_key=lambda values: values[0], reverse=True)
+        rows.reset([(1, ('2024-01-01',)), (2, ('2024-03-01',))])
+        rows.upsert(3, ('2024-02-01',))
+        rows.upsert(4, ('2024-04-01',))
+        self.assertEqual(tree.items, ['4', '2', '3', '1'])
+
+    def test_apply_removes_rows_that_no_longer_match(self):
+        """Test that changed ids without a row are removed."""
+        self.rows.apply([(1, ('Dune',))], {1, 2})
+        self.assertEqual(self.titles(), ['Dune', 'Emma'])
+
+    def test_select_by_ids(self):
+        """Test selecting more ids than fit in one query."""
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY)")
+        conn.executemany("INSERT INTO t VALUES (?)", ((i,) for i in range(1, 1201)))
+        rows = select_by_ids(conn, "SELECT id FROM t WHERE id IN ({ids})", range(0, 1300, 2))
+        self.assertEqual(len(rows), 600)
+        conn.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+import tempfile
+import shutil
+import os
+import sqlite3
+import threading
+import time
+import database
+import circulation
+from write_queue import WriteQueue
+
+class WriteQueueTests(unittest.TestCase):
+    """Test group commit through the write queue."""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.test_db = os.path.join(self.test_dir, "library.db")
+        database.initialize_database(self.test_db)
+        conn = sqlite3.connect(self.test_db)
+        conn.executemany("INSERT INTO books (title, author, isbn) VALUES (?, ?, ?)",
+                         [(f"Book {i:03d}", "Author", str(i)) for i in range(50)])
+        conn.commit()
+        conn.close()
+        self.queue = WriteQueue(self.test_db, max_delay=0.05)
+
+    def tearDown(self):
+        self.queue.close()
+        shutil.rmtree(self.test_dir)
+
+    def test_concurrent_writes_are_grouped(self):
+        """Test that simultaneous writers share commits."""
+        barrier = threading.Barrier(20)
+        results = []
+
+        def borrow(i):
+            barrier.wait()
+            results.append(self.queue.call(circulation.borrow_book, f"S{i}", f"Book {i:03d}"))
+
+        threads = [threading.Thread(target=borrow, args=(i,)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(set(results)), 20)
+        self.assertEqual(self.queue.jobs, 20)
+        self.assertLess(self.queue.batches, 20)
+
+        conn = sqlite3.connect(self.test_db)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM books WHERE available = 0").fetchone()[0], 20)
+        conn.close()
+
+    def test_failed_job_does_not_undo_others(self):
+        """Test that an exception only rolls back its own job."""
+        first = self.queue.submit(circulation.borrow_book, "Ann", "Book 001")
+        second = self.queue.submit(circulation.borrow_book, "Bob", "Book 001")
+        third = self.queue.submit(circulation.add_book, "New Book", "Author", "999")
+
+        self.assertIsInstance(first.result(5), int)
+        with self.assertRaises(circulation.CirculationError):
+            second.result(5)
+        self.assertIsInstance(third.result(5), int)
+
+        conn = sqlite3.connect(self.test_db)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM borrowed").fetchone()[0], 1)
+        conn.close()
+
+    def test_timed_out_job_is_withdrawn(self):
+        """Test that a write still queued at the timeout fails as busy and is never applied."""
+        started, release = threading.Event(), threading.Event()
+
+        def slow_job(conn):
+            started.set()
+            release.wait(5)
+        blocker = self.queue.submit(slow_job)
+        started.wait(5)
+        with self.assertRaises(sqlite3.OperationalError) as raised:
+            self.queue.call(circulation.borrow_book, "Ann", "Book 001", timeout=0.1)
+        self.assertIn('busy', str(raised.exception))
+        release.set()
+        blocker.result(5)
+        self.queue.close()
+
+        conn = sqlite3.connect(self.test_db)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM borrowed").fetchone()[0], 0)
+        conn.close()
+
+    def test_running_job_is_waited_for(self):
+        """Test that a write already being applied at the timeout returns its result."""
+        def slow_borrow(conn):
+            time.sleep(0.3)
+            return circulation.borrow_book(conn, "Ann", "Book 001")
+        self.assertIsInstance(self.queue.call(slow_borrow, timeout=0.1), int)
+
+    def test_close_flushes_pending_jobs(self):
+        """Test that queued writes are applied before the writer stops."""
+        futures = [self.queue.submit(circulation.borrow_book, f"S{i}", f"Book {i:03d}") for i in range(10)]
+        self.queue.close()
+        self.assertTrue(all(future.done() and future.exception() is None for future in futures))
+        with self.assertRaises(RuntimeError):
+            self.queue.submit(circulation.borrow_book, "Late", "Book 020")
+
+if __name__ == '__main__':
+    unittest.main()
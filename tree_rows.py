@@ -0,0 +1,114 @@
+# tree_rows.py
+"""
+Keep a Tk Treeview in step with a table without rebuilding it.
+
+The list windows used to delete every item and re-insert the whole table
+on each refresh. TreeRows instead uses the database id as the Treeview
+iid, so a change from the change feed becomes one insert, one item
+update, one move or one delete, and the rest of the view is untouched.
+Items are kept in the same order the window's SQL query sorts by.
+"""
+
+from bisect import bisect_left
+
+# Ids per "WHERE id IN (...)" query, well below SQLite's variable limit
+SELECT_CHUNK = 500
+
+def select_by_ids(conn, query, ids, row_factory=None):
+    """
+    Run a query for a set of row ids, in chunks.
+
+    Args:
+        conn (sqlite3.Connection): Open database connection
+        query (str): SELECT whose text contains "{ids}" where the id
+                     placeholders go, e.g. "... WHERE id IN ({ids})"
+        ids (iterable): Row ids to select
+        row_factory (callable): Row factory for the results, such as
+                                records.book_factory; None keeps the
+                                connection's
+
+    Returns:
+        list: Rows returned for all chunks
+    """
+    ids = sorted(ids)
+    rows = []
+    cursor = conn.cursor()
+    if row_factory is not None:
+        cursor.row_factory = row_factory
+    for start in range(0, len(ids), SELECT_CHUNK):
+        chunk = ids[start:start + SELECT_CHUNK]
+        rows.extend(cursor.execute(query.format(ids=', '.join('?' * len(chunk))), chunk).fetchall())
+    return rows
+
+class TreeRows:
+    """The rows of a Treeview, keyed by database id and kept in sort order."""
+
+    def __init__(self, tree, sort_key, reverse=False):
+        """
+        Args:
+            tree (ttk.Treeview): Tree to manage; its items' iids become row ids
+            sort_key (callable): Returns the sort value of a row's values tuple
+            reverse (bool): Sort descending, like ORDER BY ... DESC
+        """
+        self.tree = tree
+        self.sort_key = sort_key
+        self.reverse = reverse
+        self._order = []  # (sort value, row id), ascending
+        self._keys = {}   # row id -> (sort value, row id)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, row_id):
+        return row_id in self._keys
+
+    def reset(self, rows):
+        """Replace every item with rows of (row id, values)."""
+        self.tree.delete(*self.tree.get_children())
+        values_by_id = dict(rows)
+        self._keys = {row_id: (self.sort_key(values), row_id) for row_id, values in values_by_id.items()}
+        self._order = sorted(self._keys.values())
+        for _value, row_id in (reversed(self._order) if self.reverse else self._order):
+            self.tree.insert("", "end", iid=str(row_id), values=values_by_id[row_id])
+
+    def _index(self, position):
+        return len(self._order) - 1 - position if self.reverse else position
+
+    def upsert(self, row_id, values):
+        """Insert a row, or update it in place, re-placing it if its sort value changed."""
+        key = (self.sort_key(values), row_id)
+        old = self._keys.get(row_id)
+        if old == key:
+            self.tree.item(str(row_id), values=values)
+            return
+        if old is not None:
+            del self._order[bisect_left(self._order, old)]
+        position = bisect_left(self._order, key)
+        self._order.insert(position, key)
+        self._keys[row_id] = key
+        if old is not None:
+            # Re-inserting is unambiguous where move()'s index would count the item itself
+            self.tree.delete(str(row_id))
+        self.tree.insert("", self._index(position), iid=str(row_id), values=values)
+
+    def remove(self, row_id):
+        """Delete a row's item if it is shown."""
+        key = self._keys.pop(row_id, None)
+        if key is not None:
+            del self._order[bisect_left(self._order, key)]
+            self.tree.delete(str(row_id))
+
+    def apply(self, rows, changed_ids):
+        """
+        Bring changed rows up to date.
+
+        Args:
+            rows (iterable): (row id, values) for changed rows that should be shown
+            changed_ids (iterable): Every changed row id; ids without a row are removed
+        """
+        shown = set()
+        for row_id, values in rows:
+            self.upsert(row_id, values)
+            shown.add(row_id)
+        for row_id in set(changed_ids) - shown:
+            self.remove(row_id)
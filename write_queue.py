@@ -0,0 +1,183 @@
+# write_queue.py
+"""
+Group commit for database writes.
+
+Writes are submitted as functions to a single writer thread per database.
+The writer takes every job queued up while the previous batch was being
+committed (optionally waiting max_delay seconds for more), runs them all
+in one BEGIN IMMEDIATE transaction, each inside its own savepoint so one
+failing job does not undo the others, and commits once. Each caller gets
+a Future that resolves only after the commit, with the function's return
+value or exception.
+
+Because only the writer thread writes, requests in one process never
+contend for SQLite's write lock, and a burst of N writes costs one commit
+instead of N.
+
+Job functions take the connection as their first argument and must not
+commit; the functions in circulation.py follow that convention.
+"""
+
+import atexit
+import concurrent.futures
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+import config
+import database
+
+class WriteQueue:
+    """A writer thread applying submitted jobs in group-committed batches."""
+
+    def __init__(self, path, max_delay=config.WRITE_QUEUE_DELAY, max_batch=config.WRITE_QUEUE_MAX_BATCH):
+        self.path = path
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.batches = 0
+        self.jobs = 0
+        self._jobs = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='write-queue', daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args):
+        """
+        Queue func(conn, *args) for the next batch.
+
+        Returns:
+            concurrent.futures.Future: Resolved after the batch commits
+        """
+        if not self._thread.is_alive():
+            raise RuntimeError("Write queue is closed")
+        future = Future()
+        self._jobs.put((future, func, args))
+        return future
+
+    def call(self, func, *args, timeout=config.DATABASE_TIMEOUT):
+        """
+        Submit a job and wait for its committed result.
+
+        A job still queued after timeout seconds is withdrawn, so the writer
+        never applies a write its caller has given up on. A job the writer
+        has already started is waited for, as its batch may commit it.
+
+        Raises:
+            sqlite3.OperationalError: If the job was withdrawn ("database is
+                                      busy", answered with 503 by the web app)
+        """
+        future = self.submit(func, *args)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            if not future.cancel():
+                return future.result()
+            raise sqlite3.OperationalError(f"database is busy: write not started within {timeout} seconds")
+
+    def close(self):
+        """Apply all queued jobs, then stop the writer thread."""
+        if self._thread.is_alive():
+            self._jobs.put(None)
+            self._thread.join()
+
+    def _run(self):
+        conn = database.connect(self.path)
+        try:
+            stop = False
+            while not stop:
+                job = self._jobs.get()
+                if job is None:
+                    break
+                batch = [job]
+                deadline = time.monotonic() + self.max_delay
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        job = self._jobs.get(timeout=remaining) if remaining > 0 else self._jobs.get_nowait()
+                    except queue.Empty:
+                        break
+                    if job is None:
+                        stop = True
+                        break
+                    batch.append(job)
+                self._apply(conn, batch)
+        finally:
+            conn.close()
+
+    def _apply(self, conn, batch):
+        done = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for future, func, args in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT write_job")
+                try:
+                    result = func(conn, *args)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write_job")
+                    conn.execute("RELEASE write_job")
+                    future.set_exception(e)
+                else:
+                    conn.execute("RELEASE write_job")
+                    done.append((future, result))
+            conn.commit()
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            for future, _func, _args in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.jobs += len(done)
+        for future, result in done:
+            future.set_result(result)
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+def get_write_queue(path=config.DATABASE_NAME):
+    """Return this process's write queue for a database file, starting it if needed."""
+    with _queues_lock:
+        entry = _queues.get(path)
+        # A queue inherited through fork has no writer thread in this process
+        if entry is None or entry[0] != os.getpid():
+            entry = _queues[path] = (os.getpid(), WriteQueue(path))
+        return entry[1]
+
+def close_write_queues(path=None):
+    """Flush and stop the write queue of one database, or all of this process's queues."""
+    with _queues_lock:
+        if path is None:
+            entries = list(_queues.values())
+            _queues.clear()
+        else:
+            entries = [_queues.pop(path)] if path in _queues else []
+    for pid, write_queue in entries:
+        if pid == os.getpid():
+            write_queue.close()
+
+atexit.register(close_write_queues)
+
+def db_write(func, *args):
+    """
+    Run a write for the current Flask request through the write queue.
+
+    The time spent waiting for the commit is added to the request's
+    metrics when request_metrics measures it.
+
+    Returns:
+        The return value of func(conn, *args), once committed
+    """
+    from flask import current_app
+    from request_metrics import current_stats
+    start = time.perf_counter()
+    try:
+        return get_write_queue(current_app.config['DATABASE']).call(func, *args)
+    finally:
+        stats = current_stats()
+        if stats is not None:
+            stats.write_time += time.perf_counter() - start
@@ -0,0 +1,31 @@
+# wsgi.py
+"""
+WSGI entry point for running the web app under a multi-process server.
+
+    gunicorn --workers 4 --bind 0.0.0.0:8080 wsgi:application
+
+Safe with pre-forking (including gunicorn --preload): creating the app opens
+no database connection, the schema is created once under a file lock and
+that connection is closed before any worker forks, and every worker fills
+its own connection pool on first use. All workers share one WAL database.
+
+Settings can be overridden with environment variables:
+    SMARTLIB_DATABASE      path of the SQLite database
+    SMARTLIB_POOL_SIZE     connections per worker process
+    SMARTLIB_SECRET_KEY    session signing key shared by all workers
+"""
+
+import os
+
+import config
+from app import create_app, initialize_database
+
+settings = {
+    'DATABASE': os.environ.get('SMARTLIB_DATABASE', config.DATABASE_NAME),
+    'DATABASE_POOL_SIZE': int(os.environ.get('SMARTLIB_POOL_SIZE', config.DATABASE_POOL_SIZE)),
+}
+
+initialize_database(settings['DATABASE'])
+os.makedirs(config.QR_CODE_DIRECTORY, exist_ok=True)
+
+application = create_app(settings)